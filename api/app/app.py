@@ -1,6 +1,11 @@
 from flask import Flask
 from services.s3 import s3, create_buckets, clear_bucket
 from services.init_data import upload_data
+from services.jobs import jobs
+from services.try_on_cache import try_on_cache
+from services.avatar_cache import avatar_cache
+from services.avatar_sessions import avatar_sessions
+from services.garment_catalog import garment_catalog
 from routes import main
 from logger import setup_logger
 from config import Config
@@ -18,6 +23,12 @@ def create_app():
 
     setup_logger(app)  # Setup logger
 
+    jobs.init_app(app)  # Start job workers
+    try_on_cache.init_app(app)  # Configure try-on cache
+    avatar_cache.init_app(app)  # Configure avatar cache
+    avatar_sessions.init_app(app)  # Configure avatar sessions
+    garment_catalog.init_app(app, "./init_data/models")  # Build garment catalog
+
     app.register_blueprint(main)  # Register blueprint
 
     return app
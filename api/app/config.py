@@ -1,2 +1,18 @@
+import os
+
+
 class Config:
     BUCKETS = ["data", "clothes"]
+    AVATAR_INDEX_PREFIX = "index/avatars"
+    HP3D_ENDPOINT = os.getenv("HP3D_ENDPOINT", "http://hp3d:5000")
+    HP3D_TIMEOUT = int(os.getenv("HP3D_TIMEOUT", 600))
+    BLENDER_ENDPOINT = os.getenv("BLENDER_ENDPOINT", "http://blender:5001")
+    BLENDER_TIMEOUT = int(os.getenv("BLENDER_TIMEOUT", 1800))
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+    JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 32))
+    JOB_TTL = int(os.getenv("JOB_TTL", 3600))
+    TRY_ON_CACHE_BYTES = int(os.getenv("TRY_ON_CACHE_BYTES", 512 * 1024 * 1024))
+    AVATAR_CACHE_BYTES = int(os.getenv("AVATAR_CACHE_BYTES", 256 * 1024 * 1024))
+    AVATAR_SESSION_TTL = int(os.getenv("AVATAR_SESSION_TTL", 24 * 60 * 60))
+    GARMENT_CATALOG_TTL = int(os.getenv("GARMENT_CATALOG_TTL", 300))
+    MODEL_VERSION_TTL = int(os.getenv("MODEL_VERSION_TTL", 300))
@@ -2,11 +2,26 @@ import time
 import uuid
 import os
 import io
-import docker
-from flask import Blueprint, jsonify, send_file, request, current_app
+import json
+import hashlib
+from flask import (
+    Blueprint,
+    Response,
+    jsonify,
+    request,
+    current_app,
+    stream_with_context,
+    url_for,
+)
 from minio.error import S3Error
 from services.s3 import s3
-from services.generate_3d_model import generate_model, shape_obj_smooth
+from services.jobs import jobs, QueueFullError
+from services.tasks import generate_avatar, create_avatar, try_on as try_on_garment
+from services.try_on_cache import try_on_cache
+from services.avatar_cache import avatar_cache
+from services.avatar_sessions import avatar_sessions
+from services.garment_catalog import garment_catalog
+from services.generate_3d_model import get_model_version
 from services.generate_preview_images import (
     get_files_by_gender,
     find_missing_previews,
@@ -18,17 +33,17 @@ from services.validation import (
     validate_gender,
     validate_height,
     validate_image,
+    validate_bbox,
     validate_obj,
+    validate_avatar_id,
     validate_garment,
     validate_size,
     validate_quality,
     validate_color,
 )
-from services.simulate_cloth import simulate_cloth
 
 main = Blueprint("main", __name__)
 
-client = docker.from_env()  # Docker client
 server_start_time = time.time()  # Server start time
 
 
@@ -40,7 +55,14 @@ def index():
 
     status = "running"
 
-    return jsonify({"status": status, "uptime": uptime})
+    return jsonify(
+        {
+            "status": status,
+            "uptime": uptime,
+            "try_on_cache": try_on_cache.stats(),
+            "avatar_cache": avatar_cache.stats(),
+        }
+    )
 
 
 @main.route("/generate-3d-model", methods=["POST"])
@@ -62,51 +84,66 @@ def generate_3d_model():
             current_app.logger.error("Invalid image file provided")
             return jsonify({"error": "Invalid image file provided"})
 
+        # Optional person bounding box hint, skips the person detection of the hp3d service
+        bbox = None
+        if "bbox" in request.form or request.form.get("cropped") == "true":
+            bbox = validate_bbox(request.form)
+            if bbox is None:
+                current_app.logger.error("Invalid bounding box provided")
+                return jsonify({"error": "Invalid bounding box provided"}), 400
+
         # Generate UUID for folder
         folder_id = str(uuid.uuid4().hex)
         file_type = os.path.splitext(image_file.filename)[1]
         filename = f"image{file_type}"
         image_key = f"{folder_id}/{filename}"
+        image_bytes = image_file.read()
+
+        # Return cached avatar if the same image was submitted before
+        cache_key = None
+        model_version = get_model_version()
+        if model_version is not None:
+            cache_key = avatar_cache.make_key(
+                hashlib.sha256(image_bytes).hexdigest(),
+                gender,
+                height,
+                bbox,
+                model_version,
+            )
+            cached = avatar_cache.get(cache_key, folder_id)
+            if cached is not None:
+                result = create_avatar(folder_id, cached, gender, height)
+                job = jobs.complete("generate-3d-model", result)
+                return jsonify(job_response(job)), 200
 
         # Upload image to Minio
-        image_data = io.BytesIO(image_file.read())
+        image_data = io.BytesIO(image_bytes)
         s3.put_object(
             current_app.config["BUCKETS"][0],
             image_key,
             image_data,
-            len(image_data.getvalue()),
+            len(image_bytes),
         )
 
-        # Generate 3D-Model
-        if not generate_model(
-            client, s3, current_app.config["BUCKETS"][0], image_key, gender, height
-        ):
-            current_app.logger.error("Failed to generate 3D-Model")
-            return jsonify({"error": "Failed to generate 3D-Model"}), 400
-
-        # Shape obj smooth
-        obj_key = f"{folder_id}/model.obj"
-        if not shape_obj_smooth(client, s3, current_app.config["BUCKETS"][0], obj_key):
-            current_app.logger.error("Failed to shape smooth 3D-Model")
-            return jsonify({"error": "Failed to shape smooth 3D-Model"}), 400
-
-        smooth_obj_key = os.path.join(folder_id, "model_smooth.obj")
-        smooth_obj_path = f"/tmp/model_smooth.obj"
-        try:
-            # Get smooth obj from Minio
-            s3.fget_object(
-                current_app.config["BUCKETS"][0], smooth_obj_key, smooth_obj_path
-            )
-        except S3Error as e:
-            current_app.logger.error(f"Failed to download smooth obj: {e}")
-            return jsonify({"error": f"Failed to download smooth obj: {e}"}), 500
-
-        # Return smooth obj
-        return send_file(smooth_obj_path, as_attachment=True)
+        # Generate 3D-Model in the background
+        job = jobs.submit(
+            "generate-3d-model",
+            generate_avatar,
+            image_key,
+            gender,
+            height,
+            bbox,
+            cache_key,
+        )
+    except QueueFullError as e:
+        current_app.logger.error(f"Failed to queue 3D-Model generation: {e}")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         current_app.logger.error(f"Unexpected error occurred: {e}")
         return jsonify({"error": e}), 500
 
+    return jsonify(job_response(job)), 202
+
 
 @main.route("/generate-previews", methods=["POST"])
 def generate_previews():
@@ -118,9 +155,7 @@ def generate_previews():
 
     # Retrieve missing previews
     try:
-        blend_files, preview_files = get_files_by_gender(
-            current_app.config["BUCKETS"][1], gender, "L"
-        )
+        blend_files, preview_files = get_files_by_gender(garment_catalog, gender, "L")
         missing_previews = find_missing_previews(blend_files, preview_files)
     except Exception as e:
         current_app.logger.error(f"Failed to retrieve missing previews: {e}")
@@ -148,7 +183,6 @@ def generate_previews():
 
     # Generate preview images
     if not generate_preview_imgs(
-        client,
         current_app.config["BUCKETS"][1],
         missing_previews,
     ):
@@ -156,14 +190,8 @@ def generate_previews():
         return jsonify({"error": "Failed to generate previews"}), 500
 
     # Retrieve updated previews and generate presigned URLs
-    updated_objects = s3.list_objects(current_app.config["BUCKETS"][1], recursive=True)
-    previews = [
-        obj.object_name
-        for obj in updated_objects
-        if obj.object_name.startswith("previews")
-        and obj.object_name.endswith(".png")
-        and os.path.basename(obj.object_name) == f"{gender}.png"
-    ]
+    garment_catalog.refresh()
+    previews = garment_catalog.preview_keys(gender)
     presigned_urls = generate_presigned_urls(current_app.config["BUCKETS"][1], previews)
 
     return (
@@ -179,25 +207,38 @@ def generate_previews():
 
 @main.route("/try-on", methods=["POST"])
 def try_on():
-    # Form validation
-    obj_key = validate_obj(request.files, s3, current_app.config["BUCKETS"][0])
-    if obj_key is None:
-        current_app.logger.error("Invalid obj file provided")
-        return jsonify({"error": "Invalid obj file provided"}), 400
-
-    garment = validate_garment(request.form, s3, current_app.config["BUCKETS"][1])
+    # Form validation, generated avatars are referred to by their id, other avatars are uploaded
+    if "avatar_id" in request.form:
+        session = validate_avatar_id(request.form, avatar_sessions)
+        if session is None:
+            current_app.logger.error("Invalid or expired avatar id provided")
+            return jsonify({"error": "Invalid or expired avatar id provided"}), 400
+        obj_key = session["obj_key"]
+        avatar_hash = session["obj_sha256"]
+    else:
+        session = None
+        obj_key = validate_obj(request.files, s3, current_app.config["BUCKETS"][0])
+        if obj_key is None:
+            current_app.logger.error("Invalid obj file provided")
+            return jsonify({"error": "Invalid obj file provided"}), 400
+        obj_file = request.files["obj"]
+        obj_file.seek(0)
+        avatar_hash = hashlib.sha256(obj_file.read()).hexdigest()
+
+    garment = validate_garment(request.form, garment_catalog)
     if garment is None:
         current_app.logger.error("Invalid garment provided")
         return jsonify({"error": "Invalid garment provided"}), 400
 
-    gender = validate_gender(request.form)
+    if session is not None and "gender" not in request.form:
+        gender = session["gender"]
+    else:
+        gender = validate_gender(request.form)
     if gender is None:
         current_app.logger.error("Invalid gender provided")
         return jsonify({"error": "Invalid gender provided"}), 400
 
-    size = validate_size(
-        request.form, s3, current_app.config["BUCKETS"][1], garment, gender
-    )
+    size = validate_size(request.form, garment_catalog, garment, gender)
     if size is None:
         current_app.logger.error("Invalid size provided")
         return jsonify({"error": "Invalid size provided"}), 400
@@ -213,32 +254,95 @@ def try_on():
         return jsonify({"error": "Invalid color provided"}), 400
 
     # Get garment key
-    garment_upper_case = garment.replace("-", " ").title().replace(" ", "-")
-    garment_key = f"{garment}/{gender}/{size}_{garment_upper_case}.blend"
-
-    # Simulate cloth
-    if not simulate_cloth(
-        client,
-        current_app.config["BUCKETS"][0],
-        current_app.config["BUCKETS"][1],
-        obj_key,
-        garment_key,
-        gender,
-        quality,
-        color,
-    ):
-        current_app.logger.error("Failed to simulate cloth")
-        return jsonify({"error": "Failed to simulate cloth"}), 500
-
-    # Get avatar with fitted garment
-    obj_file_name = f"{os.path.splitext(os.path.basename(garment_key))[0]}.obj"
-    fit_obj_key = os.path.join(os.path.dirname(obj_key), obj_file_name)
-    mtl_file_name = f"{os.path.splitext(os.path.basename(garment_key))[0]}.mtl"
-    fit_mtl_key = os.path.join(os.path.dirname(obj_key), mtl_file_name)
+    garment_key = garment_catalog.blend_key(garment, gender, size)
+
+    # Return cached result if the same try-on was simulated before, only recolor it. If that
+    # fails or the entry was evicted in the meantime, the try-on is simulated again.
+    cache_key = try_on_cache.make_key(avatar_hash, garment_key, quality)
+    cached = try_on_cache.get(cache_key)
+    color_mtl_key = None
+    if cached is not None:
+        try:
+            color_mtl_key = try_on_cache.recolor(cache_key, color)
+        except (S3Error, ValueError) as e:
+            current_app.logger.error(f"Failed to recolor cached try-on: {e}")
+    if color_mtl_key is not None:
+        presigned_urls = generate_presigned_urls(
+            current_app.config["BUCKETS"][0], [cached["obj_key"], color_mtl_key]
+        )
+        job = jobs.complete(
+            "try-on", {"obj": presigned_urls[0], "mtl": presigned_urls[1]}
+        )
+        return jsonify(job_response(job)), 200
 
-    presigned_urls = generate_presigned_urls(
-        current_app.config["BUCKETS"][0], [fit_obj_key, fit_mtl_key]
+    # Simulate cloth in the background
+    try:
+        job = jobs.submit(
+            "try-on",
+            try_on_garment,
+            obj_key,
+            garment_key,
+            gender,
+            quality,
+            color,
+            cache_key,
+        )
+    except QueueFullError as e:
+        current_app.logger.error(f"Failed to queue try-on: {e}")
+        return jsonify({"error": str(e)}), 503
+
+    return jsonify(job_response(job)), 202
+
+
+@main.route("/jobs/<job_id>")
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(job.to_dict()), 200
+
+
+@main.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def stream():
+        version = -1
+        while True:
+            if not job.wait_for_update(version, timeout=15):
+                yield ": keep-alive\n\n"
+                continue
+            version = job.version
+            yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+            if job.finished:
+                return
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    # Return full obj and mtl of avatar and fitted garment
-    return jsonify({"obj": presigned_urls[0], "mtl": presigned_urls[1]}), 200
+
+def job_response(job):
+    """Builds the response for a queued job.
+
+    Args:
+        job (Job): The queued job.
+
+    Returns:
+        dict: The job id, its status and the URLs to poll or stream the job status.
+            Finished jobs also contain their result.
+    """
+    response = {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for("main.get_job", job_id=job.id),
+        "events_url": url_for("main.job_events", job_id=job.id),
+    }
+    if job.finished:
+        response["result"] = job.result
+    return response
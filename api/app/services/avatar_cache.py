@@ -0,0 +1,110 @@
+import os
+from minio.commonconfig import CopySource
+from minio.error import S3Error
+from services.s3 import s3
+from services.object_cache import ObjectCache
+
+CACHE_PREFIX = "cache/avatars"
+
+
+class AvatarCache(ObjectCache):
+    """LRU cache of generated avatars in front of the hp3d prediction service.
+
+    The hp3d service seeds its predictions, so the avatar only depends on the image, the gender,
+    the height, the person bounding box hint and the model version of the service. A result is
+    keyed by the SHA-256 of the image bytes and these arguments. The obj and the SMPL parameters
+    are copied to a content-addressed folder below 'cache/avatars/' in the data bucket (see
+    ObjectCache), the SHA-256 of the obj and the SMPL betas are kept with them in memory.
+
+    On a hit, the cached files are copied into the folder of the new avatar without running the
+    prediction.
+    """
+
+    prefix = CACHE_PREFIX
+    max_bytes_setting = "AVATAR_CACHE_BYTES"
+
+    @staticmethod
+    def make_key(image_hash, gender, height, bbox, model_version):
+        """Builds the cache key of an avatar.
+
+        Args:
+            image_hash (str): The SHA-256 hex digest of the image bytes.
+            gender (str): The gender of the person.
+            height (float): The height of the person in meters.
+            bbox (list): The person bounding box hint, or None.
+            model_version (str): The model version of the hp3d service.
+
+        Returns:
+            tuple: The cache key.
+        """
+        return (
+            image_hash,
+            gender,
+            float(height),
+            tuple(bbox) if bbox is not None else None,
+            model_version,
+        )
+
+    def get(self, key, folder_id):
+        """Looks up an avatar and copies its files into the folder of the new avatar.
+
+        Args:
+            key (tuple): The cache key, see make_key.
+            folder_id (str): The folder of the new avatar in the data bucket.
+
+        Returns:
+            dict: The key ('obj_key') and the SHA-256 ('sha256') of the copied obj, the key of the
+                copied SMPL parameters ('params_key') and the SMPL shape parameters ('betas'), like
+                the prediction of the hp3d service, or None on a miss.
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+
+        copied_keys = {}
+        try:
+            for name in ("obj_key", "params_key"):
+                if entry[name] is None:
+                    copied_keys[name] = None
+                    continue
+                copied_keys[name] = f"{folder_id}/{os.path.basename(entry[name])}"
+                s3.copy_object(
+                    self.bucket_name,
+                    copied_keys[name],
+                    CopySource(self.bucket_name, entry[name]),
+                )
+        except S3Error:
+            # Cached files are gone, forget the entry and predict again
+            self._forget(key, entry)
+            return None
+
+        self._count_hit()
+        return {
+            "obj_key": copied_keys["obj_key"],
+            "sha256": entry["sha256"],
+            "params_key": copied_keys["params_key"],
+            "betas": entry["betas"],
+        }
+
+    def put(self, key, prediction):
+        """Copies a generated avatar to its content-addressed folder and adds it to the cache.
+
+        Args:
+            key (tuple): The cache key, see make_key.
+            prediction (dict): The prediction of the hp3d service, with the key ('obj_key') and
+                the SHA-256 ('sha256') of the obj, the key of the SMPL parameters ('params_key')
+                and the SMPL shape parameters ('betas').
+
+        Raises:
+            S3Error: If copying the files failed.
+        """
+        entry = self._copy_objects(
+            key,
+            {name: prediction.get(name) for name in ("obj_key", "params_key")},
+        )
+        entry["sha256"] = prediction["sha256"]
+        entry["betas"] = prediction["betas"]
+        self._insert(key, entry)
+
+
+avatar_cache = AvatarCache()
@@ -0,0 +1,80 @@
+import time
+import threading
+
+
+class AvatarSessionStore:
+    """Server-side store of generated avatars, so clients refer to an avatar by its id.
+
+    The avatar id is the folder id the avatar was generated in. A session holds the key and the
+    SHA-256 of the obj together with the gender, height and SMPL betas of the avatar and
+    expires after the configured TTL.
+    """
+
+    def __init__(self, app=None):
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.ttl = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configures the TTL of the sessions.
+
+        Args:
+            app: The Flask app.
+        """
+        self.ttl = app.config["AVATAR_SESSION_TTL"]
+
+    def create(self, avatar_id, obj_key, obj_sha256, gender, height, betas):
+        """Stores a generated avatar.
+
+        Args:
+            avatar_id (str): The id of the avatar (its folder id).
+            obj_key (str): The key of the obj in the data bucket.
+            obj_sha256 (str): The SHA-256 hex digest of the obj.
+            gender (str): The gender of the avatar.
+            height (float): The height of the avatar in meters.
+            betas (list): The predicted SMPL shape parameters.
+
+        Returns:
+            dict: The stored session.
+        """
+        self._prune()
+        session = {
+            "avatar_id": avatar_id,
+            "obj_key": obj_key,
+            "obj_sha256": obj_sha256,
+            "gender": gender,
+            "height": height,
+            "betas": betas,
+            "expires_at": time.time() + self.ttl,
+        }
+        with self.lock:
+            self.sessions[avatar_id] = session
+        return session
+
+    def get(self, avatar_id):
+        """Returns the session of an avatar, or None if it is unknown or expired."""
+        with self.lock:
+            session = self.sessions.get(avatar_id)
+            if session is None:
+                return None
+            if session["expires_at"] < time.time():
+                del self.sessions[avatar_id]
+                return None
+            return session
+
+    def _prune(self):
+        """Forgets expired sessions."""
+        now = time.time()
+        with self.lock:
+            expired = [
+                avatar_id
+                for avatar_id, session in self.sessions.items()
+                if session["expires_at"] < now
+            ]
+            for avatar_id in expired:
+                del self.sessions[avatar_id]
+
+
+avatar_sessions = AvatarSessionStore()
@@ -0,0 +1,34 @@
+import requests
+from flask import current_app
+
+
+def run_blender_job(path, payload):
+    """Runs a job on the resident Blender worker pool.
+
+    Args:
+        path (str): The path of the job endpoint, e.g. '/try-on' or '/generate-previews'.
+        payload (dict): The arguments of the job.
+
+    Returns:
+        dict: The result of the job, or None if the job failed.
+
+    Notes:
+        - The worker pool is reached at the configured BLENDER_ENDPOINT.
+        - The pool fetches its inputs from and uploads its outputs to Minio itself.
+    """
+    try:
+        response = requests.post(
+            f"{current_app.config['BLENDER_ENDPOINT']}{path}",
+            json=payload,
+            timeout=current_app.config["BLENDER_TIMEOUT"],
+        )
+        if not response.ok:
+            current_app.logger.error(
+                f"Blender job {path} failed ({response.status_code}): {response.text}"
+            )
+            return None
+
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        current_app.logger.error(f"Blender worker pool unreachable: {e}")
+        return None
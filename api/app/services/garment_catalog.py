@@ -0,0 +1,188 @@
+import os
+import time
+import threading
+from minio.error import S3Error
+from services.s3 import s3
+
+PREVIEW_PREFIX = "previews"
+LISTEN_RETRY_MIN = 1  # Seconds before reconnecting to the bucket notifications, doubled per failure
+LISTEN_RETRY_MAX = 300
+
+
+class GarmentCatalog:
+    """In-memory index of the garments in the clothes bucket.
+
+    Maps garment -> gender -> size -> blend key and garment -> gender -> preview key, so validating
+    a try-on or looking up previews is a dictionary lookup instead of a listing of the bucket.
+
+    The catalog is built from the init data on startup (which is uploaded to the bucket before) and
+    from a listing of the bucket. It is rebuilt from the bucket once it is older than the
+    configured TTL, or on the next lookup after a bucket notification reported a changed object.
+    Only the first lookup after that lists the bucket, concurrent lookups keep using the current
+    catalog until it is rebuilt.
+    """
+
+    def __init__(self, app=None):
+        self.garments = {}
+        self.previews = {}
+        self.lock = threading.Lock()
+        self.app = None
+        self.bucket_name = None
+        self.ttl = 0
+        self.expires_at = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, data_path="./init_data/models"):
+        """Builds the catalog and starts listening for changes of the clothes bucket.
+
+        Args:
+            app: The Flask app.
+            data_path (str, optional): The path to the init data uploaded to the clothes bucket.
+        """
+        self.app = app
+        self.bucket_name = app.config["BUCKETS"][1]
+        self.ttl = app.config["GARMENT_CATALOG_TTL"]
+
+        keys = []
+        for root, dirs, files in os.walk(data_path):
+            for file in files:
+                keys.append(os.path.relpath(os.path.join(root, file), data_path))
+        self._build(keys)
+        self.refresh()
+
+        threading.Thread(
+            target=self._listen, name="garment-catalog-listener", daemon=True
+        ).start()
+        app.logger.info(
+            f"Garment catalog contains {len(self.garments)} garments, refreshing every {self.ttl}s"
+        )
+
+    def _build(self, keys):
+        garments = {}
+        previews = {}
+        for key in keys:
+            parts = key.split("/")
+            if len(parts) != 3:
+                continue
+            if parts[0] == PREVIEW_PREFIX and key.endswith(".png"):
+                garment, file_name = parts[1:]
+                gender = os.path.splitext(file_name)[0]
+                previews.setdefault(garment, {})[gender] = key
+            elif key.endswith(".blend"):
+                garment, gender, file_name = parts
+                size = file_name.split("_")[0]
+                garments.setdefault(garment, {}).setdefault(gender, {})[size] = key
+
+        with self.lock:
+            self.garments = garments
+            self.previews = previews
+
+    def refresh(self):
+        """Rebuilds the catalog from a listing of the clothes bucket.
+
+        Returns:
+            bool: True if the catalog was rebuilt, False if listing the bucket failed.
+        """
+        with self.lock:
+            self.expires_at = time.time() + self.ttl
+        return self._rebuild()
+
+    def _rebuild(self):
+        # The expiry is pushed forward before listing, so an invalidation during the listing
+        # isn't lost and a failed listing is retried after the TTL
+        try:
+            keys = [
+                obj.object_name
+                for obj in s3.list_objects(self.bucket_name, recursive=True)
+            ]
+        except S3Error as e:
+            self.app.logger.error(f"Failed to refresh garment catalog: {e}")
+            return False
+        self._build(keys)
+        return True
+
+    def invalidate(self):
+        """Marks the catalog as stale, it is rebuilt on the next lookup."""
+        with self.lock:
+            self.expires_at = 0
+
+    def _ensure_fresh(self):
+        # The first caller after the expiry claims the refresh by pushing the expiry forward
+        with self.lock:
+            now = time.time()
+            if self.expires_at > now:
+                return
+            self.expires_at = now + self.ttl
+        self._rebuild()
+
+    def _listen(self):
+        # Bucket notifications are optional, the TTL keeps the catalog up-to-date without them
+        delay = LISTEN_RETRY_MIN
+        while True:
+            connected = False
+            try:
+                with s3.listen_bucket_notification(
+                    self.bucket_name,
+                    events=["s3:ObjectCreated:*", "s3:ObjectRemoved:*"],
+                ) as events:
+                    connected = True
+                    for event in events:
+                        delay = LISTEN_RETRY_MIN
+                        self.invalidate()
+            except Exception as e:
+                self.app.logger.warning(
+                    "Garment catalog not listening for bucket notifications, "
+                    f"reconnecting in {delay}s: {e}"
+                )
+            if connected:
+                self.invalidate()  # Changes may have been missed while reconnecting
+            time.sleep(delay)
+            delay = min(delay * 2, LISTEN_RETRY_MAX)
+
+    def sizes(self, garment, gender):
+        """Returns the available sizes of a garment for a gender.
+
+        Args:
+            garment (str): The name of the garment, e.g. 't-shirt'.
+            gender (str): The gender. Must be 'male' or 'female'.
+
+        Returns:
+            dict: The blend keys by size, empty if the garment is not available.
+        """
+        self._ensure_fresh()
+        with self.lock:
+            return dict(self.garments.get(garment, {}).get(gender, {}))
+
+    def has_garment(self, garment):
+        """Returns whether a garment is available for any gender."""
+        self._ensure_fresh()
+        with self.lock:
+            return garment in self.garments
+
+    def blend_key(self, garment, gender, size):
+        """Returns the key of the blend file of a garment, or None if it is not available."""
+        return self.sizes(garment, gender).get(size)
+
+    def blend_keys(self, gender, size):
+        """Returns the keys of the blend files of all garments in the given gender and size."""
+        self._ensure_fresh()
+        with self.lock:
+            return [
+                genders[gender][size]
+                for genders in self.garments.values()
+                if size in genders.get(gender, {})
+            ]
+
+    def preview_keys(self, gender):
+        """Returns the keys of the preview images of all garments for the given gender."""
+        self._ensure_fresh()
+        with self.lock:
+            return [
+                genders[gender]
+                for genders in self.previews.values()
+                if gender in genders
+            ]
+
+
+garment_catalog = GarmentCatalog()
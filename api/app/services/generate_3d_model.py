@@ -1,29 +1,39 @@
-import os
-import docker
-import docker.errors
-import docker.types
+import time
+import threading
+import requests
 from minio.error import S3Error
 from flask import current_app
 
+HEALTH_TIMEOUT = 5  # The health check doesn't wait for running predictions
 
-def generate_model(docker_client, s3_client, bucket_name, image_key, gender, height):
-    """Generates a 3D model using the HP3D Docker container.
+_model_version_lock = threading.Lock()
+_model_version = {"value": None, "expires_at": 0}
+
+
+def generate_model(s3_client, bucket_name, image_key, gender, height, bbox=None):
+    """Generates a 3D model using the resident HP3D prediction service.
 
     Args:
-        docker_client: A docker client instance used to interact with the Docker daemon.
         s3_client: A Minio client instance used to interact with the Minio object storage.
         bucket_name (str): The name of the Minio bucket where the image file is stored.
         image_key (str): The key of the image file in the Minio bucket.
         gender (str): The gender of the person for which the 3D model is generated. Must be 'male' or 'female'.
         height (float): The height of the person for which the 3D model is generated.
+        bbox (list, optional): The person bounding box hint [x1, y1, x2, y2] as fractions of the
+            image size. If given, the service skips the person detection unless its 2D joint
+            confidences are low.
 
     Returns:
-        bool: True if the 3D model generation was successful, False otherwise.
+        dict: The key ('obj_key') and the SHA-256 ('sha256') of the generated obj, the key of the
+            predicted SMPL parameters ('params_key'), the predicted SMPL shape parameters ('betas')
+            and the model version of the service ('model_version'), or None if the 3D model
+            generation failed.
 
     Notes:
-        - The Docker container runs with GPU support, which requires a compatible environment.
-        - The environment variables MINIO_ENDPOINT, MINIO_ACCESS_KEY, and MINIO_SECRET_KEY must be set.
-        - The container has to connect to a configured network named 'virtualfit_app-network'.
+        - The HP3D service keeps its models loaded and is reached at the configured HP3D_ENDPOINT.
+        - The service uploads the generated model as 'model.obj' and the SMPL parameters as
+          'params.npz' next to the image.
+        - The model is exported with vertex normals and shaded smooth, so it needs no post-processing.
     """
     try:
         try:
@@ -32,121 +42,77 @@ def generate_model(docker_client, s3_client, bucket_name, image_key, gender, hei
             current_app.logger.error(
                 f"Image file {image_key} no found in bucket {bucket_name}: {e}"
             )
-            return False
-
-        docker_client.containers.run(
-            "hp3d:latest",
-            device_requests=[
-                docker.types.DeviceRequest(count=-1, capabilities=[["gpu"]])
-            ],
-            command=(
-                f"python3 fetch_and_predict.py {bucket_name} {image_key} {gender} {height}"
-            ),
-            network="virtualfit_app-network",
-            remove=True,
-            environment={
-                "MINIO_ENDPOINT": os.getenv("MINIO_ENDPOINT"),
-                "MINIO_ACCESS_KEY": os.getenv("MINIO_ACCESS_KEY"),
-                "MINIO_SECRET_KEY": os.getenv("MINIO_SECRET_KEY"),
+            return None
+
+        response = requests.post(
+            f"{current_app.config['HP3D_ENDPOINT']}/predict",
+            json={
+                "bucket_name": bucket_name,
+                "image_key": image_key,
+                "gender": gender,
+                "height": height,
+                "bbox": bbox,
             },
+            timeout=current_app.config["HP3D_TIMEOUT"],
         )
-
-        return True
-    except docker.errors.ImageNotFound:
-        current_app.logger.error(
-            "The specified Docker image 'smplify-x' was not found."
-        )
-        return False
-    except docker.errors.NotFound as e:
-        current_app.logger.error(f"Resource not found: {e}")
-        return False
-    except docker.errors.APIError as e:
-        current_app.logger.error(f"Docker API error: {e}")
-        return False
+        if not response.ok:
+            current_app.logger.error(
+                f"HP3D prediction failed ({response.status_code}): {response.text}"
+            )
+            return None
+
+        prediction = response.json()
+        _set_model_version(prediction.get("model_version"))
+        return prediction
+    except requests.exceptions.RequestException as e:
+        current_app.logger.error(f"HP3D service unreachable: {e}")
+        return None
     except Exception as e:
         current_app.logger.error(f"An unexpected error occurred: {e}")
-        return False
+        return None
 
 
-def shape_obj_smooth(docker_client, s3_client, bucket_name, obj_key):
-    """Smoothens an OBJ file using the Blender Docker container
+def get_model_version():
+    """Returns the model version of the resident HP3D prediction service.
 
-    Args:
-        docker_client: A docker client instance used to interact with the Docker daemon.
-        s3_client: A Minio client instance used to interact with the Minio object storage.
-        bucket_name (str): The name of the Minio bucket where the OBJ file is stored.
-        obj_key (str): The key of the OBJ file in the Minio bucket.
+    Predictions are deterministic for a model version, so it identifies cached avatars (see
+    services.avatar_cache). The version is kept in memory for MODEL_VERSION_TTL seconds and
+    replaced earlier if a prediction reports a different one, so only expired lookups ask the
+    service's health check.
 
     Returns:
-        bool: True if the smoothing was successful, False otherwise.
-
-    Notes:
-        - The Docker container runs with GPU support, which requires a compatible environment.
-        - The environment variables MINIO_ENDPOINT, MINIO_ACCESS_KEY, and MINIO_SECRET_KEY must be set.
-        - The container has to connect to a configured network named 'virtualfit_app-network'.
-        - The volume created by the blender container gets removed after the process is finished.
+        str: The model version, i.e. the model bundle version or a hash of the weight files, or
+            None if the service is unreachable.
     """
+    with _model_version_lock:
+        if _model_version["expires_at"] > time.time():
+            return _model_version["value"]
+
     try:
-        try:
-            s3_client.stat_object(bucket_name, obj_key)
-        except S3Error as e:
+        response = requests.get(
+            f"{current_app.config['HP3D_ENDPOINT']}/health",
+            timeout=HEALTH_TIMEOUT,
+        )
+        if not response.ok:
             current_app.logger.error(
-                f"OBJ file {obj_key} not found in bucket {bucket_name}: {e}"
+                f"HP3D health check failed ({response.status_code}): {response.text}"
             )
-            return False
-
-        initial_volumes = set(docker_client.volumes.list())
-
-        container = docker_client.containers.run(
-            "blender:latest",
-            device_requests=[
-                docker.types.DeviceRequest(count=-1, capabilities=[["gpu"]])
-            ],
-            entrypoint="/bin/bash",
-            command=(
-                f"-c 'python3 ./minio_helpers/fetch_shade_smooth.py {bucket_name} {obj_key}'"
-            ),
-            network="virtualfit_app-network",
-            detach=True,
-            environment={
-                "MINIO_ENDPOINT": os.getenv("MINIO_ENDPOINT"),
-                "MINIO_ACCESS_KEY": os.getenv("MINIO_ACCESS_KEY"),
-                "MINIO_SECRET_KEY": os.getenv("MINIO_SECRET_KEY"),
-            },
+            return None
+        model_version = response.json().get("model_version")
+    except requests.exceptions.RequestException as e:
+        current_app.logger.error(f"HP3D service unreachable: {e}")
+        return None
+
+    _set_model_version(model_version)
+    return model_version
+
+
+def _set_model_version(model_version):
+    # Unreachable services and versionless responses are asked again on the next lookup
+    if model_version is None:
+        return
+    with _model_version_lock:
+        _model_version["value"] = model_version
+        _model_version["expires_at"] = (
+            time.time() + current_app.config["MODEL_VERSION_TTL"]
         )
-
-        container.wait()
-
-        post_volumes = set(docker_client.volumes.list())
-        new_volumes = post_volumes - initial_volumes
-
-        container.remove(force=True)
-
-        for volume in new_volumes:
-            volume_name = volume.name
-            if volume_name != "virtualfit_minio-data":
-                try:
-                    volume.remove()
-                    current_app.logger.info(f"Volume {volume_name} removed.")
-                except Exception as e:
-                    current_app.logger.error(
-                        f"Failed to remove volume {volume_name}: {e}"
-                    )
-            else:
-                current_app.logger.info(
-                    f"Skipping removal of volume '{volume_name}' as it is 'virtualfit_data'."
-                )
-
-        return True
-    except docker.errors.ImageNotFound:
-        current_app.ogger.error("The specified Docker image 'blender' was not found.")
-        return False
-    except docker.errors.NotFound as e:
-        current_app.logger.error(f"Resource not found: {e}")
-        return False
-    except docker.errors.APIError as e:
-        current_app.logger.error(f"Docker API error: {e}")
-        return False
-    except Exception as e:
-        current_app.logger.error(f"An unexpected error occurred: {e}")
-        return False
@@ -1,15 +1,17 @@
 import os
-import docker
 from datetime import timedelta
 from services.s3 import s3
+from services.blender import run_blender_job
 from flask import current_app
 
 
-def get_files_by_gender(bucket_name, gender, garment_size):
+def get_files_by_gender(catalog, gender, garment_size):
     """Retrieves all blend files and preview files for a given gender.
 
     Args:
+        catalog (GarmentCatalog): The catalog of the garments in the clothes bucket.
         gender (str): The gender for which the files are retrieved. Must be 'male' or 'female'.
+        garment_size (str): The size of the blend files to retrieve.
 
     Returns:
         tuple: A tuple containing two lists:
@@ -19,22 +21,7 @@ def get_files_by_gender(bucket_name, gender, garment_size):
     Notes:
         - Only gets the L-sized garment for the given gender since the previews are only generated for L-sized garments.
     """
-    objects = list(s3.list_objects(bucket_name, recursive=True))
-    blend_files = [
-        obj.object_name
-        for obj in objects
-        if obj.object_name.endswith(".blend")
-        and os.path.basename(obj.object_name).startswith(f"{garment_size}_")
-        and obj.object_name.split("/")[1] == gender
-    ]
-    preview_files = [
-        obj.object_name
-        for obj in objects
-        if obj.object_name.startswith("previews")
-        and obj.object_name.endswith(".png")
-        and os.path.basename(obj.object_name) == f"{gender}.png"
-    ]
-    return blend_files, preview_files
+    return catalog.blend_keys(gender, garment_size), catalog.preview_keys(gender)
 
 
 def find_missing_previews(blend_files, preview_files):
@@ -57,11 +44,10 @@ def find_missing_previews(blend_files, preview_files):
     return missing_previews
 
 
-def generate_preview_imgs(docker_client, bucket_name, missing_previews):
-    """Generates preview images for missing blend files using a Blender Docker container.
+def generate_preview_imgs(bucket_name, missing_previews):
+    """Generates preview images for missing blend files on the Blender worker pool.
 
     Args:
-        docker_client: A docker client instance used to interact with the Docker daemon.
         bucket_name (str): The name of the Minio bucket where the blend files are stored.
         missing_previews (list): A list of blend file paths that do not have a corresponding preview image.
 
@@ -69,68 +55,15 @@ def generate_preview_imgs(docker_client, bucket_name, missing_previews):
         bool: True if the preview images were generated successfully, False otherwise.
 
     Notes:
-        - The Docker container runs with GPU support, which requires a compatible environment.
-        - The environment variables MINIO_ENDPOINT, MINIO_ACCESS_KEY, and MINIO_SECRET_KEY must be set.
-        - The container has to connect to a configured network named 'virtualfit_app-network'.
-        - The volume created by the blender container gets removed after the process is finished.
+        - The previews are rendered in parallel on all workers of the pool.
+        - The worker pool uploads the previews as 'previews/{clothing}/{gender}.png'.
     """
     try:
-        missing_previews_string = ",".join(missing_previews)
-
-        initial_volumes = set(docker_client.volumes.list())
-
-        container = docker_client.containers.run(
-            "blender:latest",
-            device_requests=[
-                docker.types.DeviceRequest(count=-1, capabilities=[["gpu"]])
-            ],
-            entrypoint="/bin/bash",  # Overriding entrypoint since env doesn't get set without
-            command=(
-                f"-c 'python3 ./minio_helpers/fetch_generate_preview.py {bucket_name} {missing_previews_string}'"
-            ),
-            network="virtualfit_app-network",
-            detach=True,
-            environment={
-                "MINIO_ENDPOINT": os.getenv("MINIO_ENDPOINT"),
-                "MINIO_ACCESS_KEY": os.getenv("MINIO_ACCESS_KEY"),
-                "MINIO_SECRET_KEY": os.getenv("MINIO_SECRET_KEY"),
-            },
-        )
-
-        container.wait()
-
-        post_volumes = set(docker_client.volumes.list())
-        new_volumes = post_volumes - initial_volumes
-
-        container.remove(force=True)
-
-        for volume in new_volumes:
-            volume_name = volume.name
-            if volume_name != "virtualfit_minio-data":
-                try:
-                    volume.remove()
-                    current_app.logger.info(f"Volume {volume_name} removed.")
-                except Exception as e:
-                    current_app.logger.error(
-                        f"Failed to remove volume {volume_name}: {e}"
-                    )
-            else:
-                current_app.logger.info(
-                    f"Skipping removal of volume '{volume_name}' as it is 'virtualfit_data'."
-                )
-
-        return True
-    except docker.errors.ImageNotFound:
-        current_app.logger.error(
-            "The specified Docker image 'smplify-x' was not found."
+        result = run_blender_job(
+            "/generate-previews",
+            {"bucket_name": bucket_name, "blend_keys": missing_previews},
         )
-        return False
-    except docker.errors.NotFound as e:
-        current_app.logger.error(f"Resource not found: {e}")
-        return False
-    except docker.errors.APIError as e:
-        current_app.logger.error(f"Docker API error: {e}")
-        return False
+        return result is not None
     except Exception as e:
         current_app.logger.error(f"An unexpected error occurred: {e}")
         return False
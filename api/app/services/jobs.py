@@ -0,0 +1,190 @@
+import queue
+import threading
+import time
+import uuid
+
+
+class JobError(Exception):
+    """Raised by a job function to fail the job with a message for the client."""
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the job queue is full."""
+
+
+class Job:
+    """A unit of work that is executed by the job queue.
+
+    Args:
+        kind (str): The kind of the job, e.g. 'generate-3d-model' or 'try-on'.
+    """
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.stage = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.version = 0
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def _update(self, **fields):
+        with self._condition:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.updated_at = time.time()
+            self.version += 1
+            self._condition.notify_all()
+
+    def set_stage(self, stage):
+        """Sets the stage the job is currently in.
+
+        Args:
+            stage (str): The stage, e.g. 'predicting', 'simulating' or 'uploading'.
+        """
+        self._update(status="running", stage=stage)
+
+    def wait_for_update(self, version, timeout):
+        """Blocks until the job changed after the given version or the timeout expired.
+
+        Args:
+            version (int): The last version of the job the caller has seen.
+            timeout (float): The maximum time to wait in seconds.
+
+        Returns:
+            bool: True if the job was updated, False if the timeout expired.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self.version > version, timeout)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobQueue:
+    """A bounded in-process job queue that is processed by a pool of worker threads.
+
+    Job functions are called as func(job, *args) inside the Flask app context. They report their
+    progress with job.set_stage, return the job result and raise JobError to fail the job.
+    """
+
+    def __init__(self, app=None):
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.queue = None
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Creates the queue and starts the worker threads.
+
+        Args:
+            app: The Flask app.
+        """
+        self.app = app
+        self.queue = queue.Queue(maxsize=app.config["JOB_QUEUE_SIZE"])
+        self.ttl = app.config["JOB_TTL"]
+        for i in range(app.config["JOB_WORKERS"]):
+            worker = threading.Thread(
+                target=self._work, name=f"job-worker-{i}", daemon=True
+            )
+            worker.start()
+        app.logger.info(
+            f"Started {app.config['JOB_WORKERS']} job workers with queue size {app.config['JOB_QUEUE_SIZE']}"
+        )
+
+    def submit(self, kind, func, *args):
+        """Enqueues a new job.
+
+        Args:
+            kind (str): The kind of the job.
+            func (callable): The job function, called as func(job, *args).
+
+        Raises:
+            QueueFullError: If the queue is full.
+
+        Returns:
+            Job: The queued job.
+        """
+        self._prune()
+        job = Job(kind)
+        with self.lock:
+            self.jobs[job.id] = job
+        try:
+            self.queue.put_nowait((job, func, args))
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job.id]
+            raise QueueFullError("The job queue is full")
+        return job
+
+    def complete(self, kind, result):
+        """Registers a job that is already done, e.g. for a result served from a cache.
+
+        Args:
+            kind (str): The kind of the job.
+            result: The result of the job.
+
+        Returns:
+            Job: The finished job.
+        """
+        self._prune()
+        job = Job(kind)
+        job._update(status="done", stage="done", result=result)
+        with self.lock:
+            self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        """Returns the job with the given id, or None if it is unknown."""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _prune(self):
+        """Forgets finished jobs that are older than the configured TTL."""
+        now = time.time()
+        with self.lock:
+            expired = [
+                job_id
+                for job_id, job in self.jobs.items()
+                if job.finished and now - job.updated_at > self.ttl
+            ]
+            for job_id in expired:
+                del self.jobs[job_id]
+
+    def _work(self):
+        while True:
+            job, func, args = self.queue.get()
+            with self.app.app_context():
+                try:
+                    result = func(job, *args)
+                    job._update(status="done", stage="done", result=result)
+                except JobError as e:
+                    self.app.logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+                    job._update(status="failed", error=str(e))
+                except Exception as e:
+                    self.app.logger.error(
+                        f"Unexpected error in job {job.id} ({job.kind}): {e}"
+                    )
+                    job._update(status="failed", error="Unexpected error occurred")
+            self.queue.task_done()
+
+
+jobs = JobQueue()
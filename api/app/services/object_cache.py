@@ -0,0 +1,161 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from minio.commonconfig import CopySource
+from minio.error import S3Error
+from services.s3 import s3
+
+
+class ObjectCache:
+    """Base class of the LRU caches of results stored as objects in the data bucket.
+
+    The objects of an entry are copied to a content-addressed folder below the prefix of the
+    cache, named by the SHA-256 of the cache key. The index mapping cache keys to entries is kept
+    in memory. The data bucket is cleared on startup, so both start out empty together.
+
+    An entry is a dict with the total size of its objects ('size') and their keys ('objects'),
+    which are removed from the bucket when it is evicted. Entries are evicted least recently used
+    first once the objects exceed the size budget. Subclasses define the cache key and what is
+    stored with the objects.
+
+    Attributes:
+        prefix (str): The prefix of the cached objects in the data bucket.
+        max_bytes_setting (str): The config setting of the size budget in bytes.
+    """
+
+    prefix = None
+    max_bytes_setting = None
+
+    def __init__(self, app=None):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.bucket_name = None
+        self.max_bytes = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configures the bucket and the size budget of the cache.
+
+        Args:
+            app: The Flask app.
+        """
+        self.bucket_name = app.config["BUCKETS"][0]
+        self.max_bytes = app.config[self.max_bytes_setting]
+
+    def _lookup(self, key):
+        """Returns the entry of a key and marks it as recently used, or None on a miss.
+
+        Misses are counted, hits are counted by the caller with _count_hit once the entry was used.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def _count_hit(self):
+        with self.lock:
+            self.hits += 1
+
+    def _forget(self, key, entry):
+        """Drops an entry whose objects are gone and counts the lookup as a miss."""
+        with self.lock:
+            if self.entries.get(key) is entry:
+                del self.entries[key]
+                self.size -= entry["size"]
+            self.misses += 1
+
+    def _copy_objects(self, key, source_keys):
+        """Copies objects to the content-addressed folder of a cache key.
+
+        Args:
+            key (tuple): The cache key.
+            source_keys (dict): The keys of the objects in the data bucket by name, None values
+                are kept as None.
+
+        Raises:
+            S3Error: If copying the objects failed.
+
+        Returns:
+            dict: A new entry with the keys of the copied objects by name.
+        """
+        digest = hashlib.sha256("\0".join(map(str, key)).encode("utf-8")).hexdigest()
+        entry = {"size": 0, "objects": []}
+        for name, source_key in source_keys.items():
+            if source_key is None:
+                entry[name] = None
+                continue
+            cache_key = f"{self.prefix}/{digest}/{os.path.basename(source_key)}"
+            s3.copy_object(
+                self.bucket_name, cache_key, CopySource(self.bucket_name, source_key)
+            )
+            entry[name] = cache_key
+            entry["objects"].append(cache_key)
+            entry["size"] += s3.stat_object(self.bucket_name, cache_key).size
+        return entry
+
+    def _insert(self, key, entry):
+        """Adds an entry, replacing a previous one of the key, and evicts entries over the budget.
+
+        The newest entry is kept even if it exceeds the budget on its own.
+        """
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous["size"]
+            self.entries[key] = entry
+            self.size += entry["size"]
+
+            evicted = []
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, old_entry = self.entries.popitem(last=False)
+                self.size -= old_entry["size"]
+                self.evictions += 1
+                evicted.append(old_entry)
+
+        for old_entry in evicted:
+            self._remove(old_entry)
+
+    def _add_object(self, key, entry, object_name, size):
+        """Accounts an object written for a cached entry.
+
+        Returns:
+            bool: False if the entry was evicted or replaced in the meantime, or already has the
+                object.
+        """
+        with self.lock:
+            if self.entries.get(key) is not entry or object_name in entry["objects"]:
+                return False
+            entry["objects"].append(object_name)
+            entry["size"] += size
+            self.size += size
+            return True
+
+    def _remove(self, entry):
+        for object_name in entry["objects"]:
+            try:
+                s3.remove_object(self.bucket_name, object_name)
+            except S3Error:
+                pass
+
+    def stats(self):
+        """Returns the hit/miss counters and the size of the cache."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
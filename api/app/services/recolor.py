@@ -0,0 +1,52 @@
+GARMENT_MATERIAL = "Garment"  # Name of the garment material exported by fit_clothes.py
+
+
+def hex_to_rgb(color):
+    """Converts a Hex color code to RGB values between 0 and 1.
+
+    Args:
+        color (str): The color as Hex color code, e.g. '#C2C2C2' or '#CCC'.
+
+    Returns:
+        tuple: The red, green and blue value.
+    """
+    color = color.lstrip("#")
+    if len(color) == 3:
+        color = "".join(c * 2 for c in color)
+    return tuple(int(color[i : i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+def recolor_mtl(mtl, color, material=GARMENT_MATERIAL):
+    """Sets the diffuse color of a material in the content of an mtl file.
+
+    Args:
+        mtl (str): The content of the mtl file.
+        color (str): The new color as Hex color code.
+        material (str, optional): The name of the material to recolor. Defaults to the garment material.
+
+    Raises:
+        ValueError: If the material is not defined in the mtl file.
+
+    Returns:
+        str: The content of the recolored mtl file.
+
+    Notes:
+        - The color is written the same way Blender's set_color does, i.e. without color space conversion.
+    """
+    kd = "Kd {:.6f} {:.6f} {:.6f}".format(*hex_to_rgb(color))
+
+    lines = mtl.splitlines()
+    in_material = False
+    found = False
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith("newmtl "):
+            in_material = stripped[len("newmtl ") :].strip() == material
+            found = found or in_material
+        elif in_material and stripped.startswith("Kd "):
+            lines[i] = kd
+
+    if not found:
+        raise ValueError(f"Material {material} not found in mtl")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,177 @@
+import io
+import os
+from flask import current_app
+from minio.error import S3Error
+from services.s3 import s3
+from services.recolor import recolor_mtl
+from services.jobs import JobError
+from services.generate_3d_model import generate_model
+from services.generate_preview_images import generate_presigned_urls
+from services.simulate_cloth import simulate_cloth
+from services.try_on_cache import try_on_cache
+from services.avatar_sessions import avatar_sessions
+from services.avatar_cache import avatar_cache
+
+
+def generate_avatar(job, image_key, gender, height, bbox=None, cache_key=None):
+    """Job function that generates the 3D model for an uploaded image.
+
+    Args:
+        job (Job): The job the function runs in.
+        image_key (str): The key of the uploaded image in the data bucket.
+        gender (str): The gender of the person. Must be 'male' or 'female'.
+        height (float): The height of the person in meters.
+        bbox (list, optional): The person bounding box hint [x1, y1, x2, y2] as fractions of the
+            image size. If given, the person detection is skipped.
+        cache_key (tuple, optional): The key the avatar is stored under in the avatar cache. Not
+            cached if the model version of the prediction differs from the one in the key.
+
+    Raises:
+        JobError: If generating the 3D model failed.
+
+    Returns:
+        dict: The presigned URL of the obj and the avatar id with the avatar's metadata.
+    """
+    bucket_name = current_app.config["BUCKETS"][0]
+    folder_id = image_key.split("/")[0]
+
+    # Generate 3D-Model
+    job.set_stage("predicting")
+    prediction = generate_model(s3, bucket_name, image_key, gender, height, bbox)
+    if prediction is None:
+        raise JobError("Failed to generate 3D-Model")
+
+    # Cache result for re-submissions of the same image
+    job.set_stage("uploading")
+    if cache_key is not None and prediction.get("model_version") == cache_key[-1]:
+        try:
+            avatar_cache.put(cache_key, prediction)
+        except S3Error as e:
+            current_app.logger.error(f"Failed to cache avatar: {e}")
+
+    return create_avatar(folder_id, prediction, gender, height)
+
+
+def create_avatar(folder_id, prediction, gender, height):
+    """Remembers a generated or cached avatar, so try-ons can refer to it by its id.
+
+    Args:
+        folder_id (str): The folder of the avatar in the data bucket, used as avatar id.
+        prediction (dict): The key ('obj_key') and the SHA-256 ('sha256') of the obj and the
+            SMPL shape parameters ('betas').
+        gender (str): The gender of the avatar.
+        height (float): The height of the avatar in meters.
+
+    Returns:
+        dict: The presigned URL of the obj and the avatar id with the avatar's metadata.
+    """
+    session = avatar_sessions.create(
+        folder_id,
+        prediction["obj_key"],
+        prediction["sha256"],
+        gender,
+        height,
+        prediction["betas"],
+    )
+    presigned_urls = generate_presigned_urls(
+        current_app.config["BUCKETS"][0], [prediction["obj_key"]]
+    )
+
+    return {
+        "obj": presigned_urls[0],
+        "avatar_id": session["avatar_id"],
+        "gender": session["gender"],
+        "height": session["height"],
+        "betas": session["betas"],
+    }
+
+
+def try_on(job, obj_key, garment_key, gender, quality, color, cache_key):
+    """Job function that fits a garment to an avatar.
+
+    Args:
+        job (Job): The job the function runs in.
+        obj_key (str): The key of the avatar obj in the data bucket.
+        garment_key (str): The key of the garment blend file in the clothes bucket.
+        gender (str): The gender of the avatar. Must be 'male' or 'female'.
+        quality (int): The quality of the cloth simulation. Must be between 1 and 10.
+        color (str): The color of the garment as Hex color code.
+        cache_key (tuple): The key the uncolored result is stored under in the try-on cache.
+
+    Raises:
+        JobError: If the cloth simulation or applying the color failed.
+
+    Returns:
+        dict: The presigned URLs of the fitted obj and mtl.
+    """
+    # Simulate cloth
+    job.set_stage("simulating")
+    fitted = simulate_cloth(
+        current_app.config["BUCKETS"][0],
+        current_app.config["BUCKETS"][1],
+        obj_key,
+        garment_key,
+        gender,
+        quality,
+    )
+    if fitted is None:
+        raise JobError("Failed to simulate cloth")
+
+    # Cache result for repeated try-ons and apply the color. If that fails, or the entry was
+    # evicted right away, the uncached result of the simulation is recolored instead
+    job.set_stage("uploading")
+    bucket_name = current_app.config["BUCKETS"][0]
+    result_keys = None
+    try:
+        cached = try_on_cache.put(cache_key, fitted["obj_key"], fitted["mtl_key"])
+        color_mtl_key = try_on_cache.recolor(cache_key, color)
+        if color_mtl_key is not None:
+            result_keys = [cached["obj_key"], color_mtl_key]
+    except (S3Error, ValueError) as e:
+        current_app.logger.error(f"Failed to cache try-on: {e}")
+
+    if result_keys is None:
+        try:
+            color_mtl_key = recolor_fitted_mtl(bucket_name, fitted["mtl_key"], color)
+        except (S3Error, ValueError) as e:
+            current_app.logger.error(f"Failed to recolor try-on: {e}")
+            raise JobError("Failed to apply garment color")
+        result_keys = [fitted["obj_key"], color_mtl_key]
+
+    presigned_urls = generate_presigned_urls(bucket_name, result_keys)
+
+    return {"obj": presigned_urls[0], "mtl": presigned_urls[1]}
+
+
+def recolor_fitted_mtl(bucket_name, mtl_key, color):
+    """Writes the mtl of a fitted garment in the given color next to it.
+
+    Args:
+        bucket_name (str): The name of the bucket of the mtl.
+        mtl_key (str): The key of the fitted mtl.
+        color (str): The color of the garment as Hex color code.
+
+    Raises:
+        S3Error: If reading or uploading the mtl failed.
+        ValueError: If the mtl has no garment material.
+
+    Returns:
+        str: The key of the recolored mtl.
+    """
+    response = s3.get_object(bucket_name, mtl_key)
+    try:
+        mtl = response.read().decode("utf-8")
+    finally:
+        response.close()
+        response.release_conn()
+
+    data = recolor_mtl(mtl, color).encode("utf-8")
+    color_key = f"{os.path.splitext(mtl_key)[0]}_{color.lower().lstrip('#')}.mtl"
+    s3.put_object(
+        bucket_name,
+        color_key,
+        io.BytesIO(data),
+        len(data),
+        content_type="text/plain",
+    )
+    return color_key
@@ -0,0 +1,119 @@
+import io
+import os
+from services.s3 import s3
+from services.object_cache import ObjectCache
+from services.recolor import recolor_mtl
+
+CACHE_PREFIX = "cache/try-on"
+
+
+class TryOnCache(ObjectCache):
+    """LRU cache of try-on results in front of the cloth simulation.
+
+    A result is keyed by the SHA-256 of the avatar obj, the garment key (which includes the size)
+    and the quality. The fitted obj and mtl are copied to content-addressed keys below
+    'cache/try-on/' in the data bucket (see ObjectCache).
+
+    The color is not part of the key: the geometry doesn't depend on it, so each color gets its
+    own mtl which is written from the cached mtl without running Blender (see recolor).
+    """
+
+    prefix = CACHE_PREFIX
+    max_bytes_setting = "TRY_ON_CACHE_BYTES"
+
+    @staticmethod
+    def make_key(avatar_hash, garment_key, quality):
+        """Builds the cache key of a try-on.
+
+        Args:
+            avatar_hash (str): The SHA-256 hex digest of the avatar obj.
+            garment_key (str): The key of the garment blend file in the clothes bucket.
+            quality (int): The quality of the cloth simulation.
+
+        Returns:
+            tuple: The cache key.
+        """
+        return (avatar_hash, garment_key, int(quality))
+
+    def get(self, key):
+        """Looks up a try-on result and marks it as recently used.
+
+        Args:
+            key (tuple): The cache key, see make_key.
+
+        Returns:
+            dict: The keys of the cached obj and mtl, or None on a miss.
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        self._count_hit()
+        return {"obj_key": entry["obj_key"], "mtl_key": entry["mtl_key"]}
+
+    def put(self, key, obj_key, mtl_key):
+        """Copies a fitted obj and mtl to their content-addressed keys and adds them to the cache.
+
+        Args:
+            key (tuple): The cache key, see make_key.
+            obj_key (str): The key of the fitted obj in the data bucket.
+            mtl_key (str): The key of the fitted mtl in the data bucket.
+
+        Raises:
+            S3Error: If copying the objects failed.
+
+        Returns:
+            dict: The keys of the cached obj and mtl.
+        """
+        entry = self._copy_objects(key, {"obj_key": obj_key, "mtl_key": mtl_key})
+        entry["colors"] = {}
+
+        response = s3.get_object(self.bucket_name, mtl_key)
+        try:
+            entry["mtl"] = response.read().decode("utf-8")
+        finally:
+            response.close()
+            response.release_conn()
+
+        self._insert(key, entry)
+        return {"obj_key": entry["obj_key"], "mtl_key": entry["mtl_key"]}
+
+    def recolor(self, key, color):
+        """Returns the mtl of a cached try-on in the given color, writing it on first use.
+
+        Args:
+            key (tuple): The cache key, see make_key.
+            color (str): The color of the garment as Hex color code.
+
+        Raises:
+            S3Error: If uploading the recolored mtl failed.
+            ValueError: If the cached mtl has no garment material.
+
+        Returns:
+            str: The key of the recolored mtl, or None if the try-on is not cached.
+        """
+        color = color.lower()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if color in entry["colors"]:
+                return entry["colors"][color]
+            mtl = entry["mtl"]
+            base_key = os.path.splitext(entry["mtl_key"])[0]
+
+        data = recolor_mtl(mtl, color).encode("utf-8")
+        color_key = f"{base_key}_{color.lstrip('#')}.mtl"
+        s3.put_object(
+            self.bucket_name,
+            color_key,
+            io.BytesIO(data),
+            len(data),
+            content_type="text/plain",
+        )
+
+        if self._add_object(key, entry, color_key, len(data)):
+            entry["colors"][color] = color_key
+        return color_key
+
+
+try_on_cache = TryOnCache()
@@ -1,5 +1,5 @@
-import os
 import re
+import hashlib
 from minio.error import S3Error
 from flask import current_app
 
@@ -55,6 +55,33 @@ def validate_image(files):
     return image
 
 
+def validate_bbox(form):
+    """Validates the provided person bounding box hint in the given form.
+
+    Args:
+        form: The form containing the bbox field as 'x1,y1,x2,y2', given as fractions of the
+            image width and height, or the cropped field set to 'true' for an image already
+            cropped around the person.
+
+    Returns:
+        list: The validated bounding box [x1, y1, x2, y2], or None if the validation failed.
+    """
+    if form.get("cropped") == "true":
+        return [0.0, 0.0, 1.0, 1.0]
+    if "bbox" not in form:
+        return None
+    try:
+        bbox = [float(coordinate) for coordinate in form["bbox"].split(",")]
+    except ValueError:
+        return None
+    if len(bbox) != 4:
+        return None
+    x1, y1, x2, y2 = bbox
+    if not (0.0 <= x1 < x2 <= 1.0 and 0.0 <= y1 < y2 <= 1.0):
+        return None
+    return bbox
+
+
 def validate_obj(files, s3, bucket_name):
     """Validates the provided obj file in the given form files.
 
@@ -65,34 +92,54 @@ def validate_obj(files, s3, bucket_name):
 
     Returns:
         str: The key of the obj file in the Minio bucket, or None if the validation failed.
+
+    Notes:
+        - The obj is looked up by its SHA-256 in the avatar index, which is written by the hp3d and
+          Blender services when they upload an avatar.
     """
+    if "obj" not in files:
+        return None
     file_content = files["obj"]
     if not file_content:
         return None
 
-    obj_content = file_content.read()
+    digest = hashlib.sha256(file_content.read()).hexdigest()
+    index_key = f"{current_app.config['AVATAR_INDEX_PREFIX']}/{digest}"
     try:
-        objects = s3.list_objects(bucket_name, recursive=True)
-        for obj in objects:
-            if obj.object_name.endswith(".obj"):
-                data = s3.get_object(bucket_name, obj.object_name)
-                stored_content = data.read()
-
-                if obj_content == stored_content:
-                    return obj.object_name
+        response = s3.get_object(bucket_name, index_key)
+        try:
+            obj_key = response.read().decode("utf-8")
+        finally:
+            response.close()
+            response.release_conn()
     except S3Error as e:
-        current_app.logger.error(f"Error occuredd while listing objects: {e}")
+        if e.code != "NoSuchKey":
+            current_app.logger.error(f"Error occurred while reading avatar index: {e}")
         return None
-    return None
+    return obj_key
+
 
+def validate_avatar_id(form, sessions):
+    """Validates the provided avatar id in the given form.
+
+    Args:
+        form: The form containing the avatar_id field.
+        sessions (AvatarSessionStore): The store of generated avatars.
 
-def validate_garment(form, s3, bucket_name):
+    Returns:
+        dict: The session of the avatar, or None if the validation failed or the session expired.
+    """
+    if "avatar_id" not in form:
+        return None
+    return sessions.get(form["avatar_id"])
+
+
+def validate_garment(form, catalog):
     """Validates the provided garment in the given form.
 
     Args:
         form: The form containing the garment field.
-        s3: The Minio client instance used to interact with the Minio object storage.
-        bucket_name (string): The name of the Minio bucket where the garment blend file is stored.
+        catalog (GarmentCatalog): The catalog of the garments in the clothes bucket.
 
     Returns:
         str: The name of the garment, or None if the validation failed.
@@ -101,30 +148,18 @@ def validate_garment(form, s3, bucket_name):
         return None
     garment = form["garment"]
 
-    available_garments = []
-    try:
-        objects = s3.list_objects(bucket_name, recursive=True)
-        for obj in objects:
-            if obj.object_name.endswith(".blend") and "previews" not in obj.object_name:
-                folder_name = obj.object_name.split("/")[0]
-                available_garments.append(folder_name)
-    except S3Error as e:
-        current_app.logger.error(f"Error occuredd while listing objects: {e}")
-        return None
-
-    if garment not in available_garments:
+    if not catalog.has_garment(garment):
         return None
 
     return garment
 
 
-def validate_size(form, s3, bucket_name, garment, gender):
+def validate_size(form, catalog, garment, gender):
     """Validates the provided size in the given form.
 
     Args:
         form: The form containing the size field.
-        s3: The Minio client instance used to interact with the Minio object storage.
-        bucket_name (string): The name of the Minio bucket where the garment blend file is stored.
+        catalog (GarmentCatalog): The catalog of the garments in the clothes bucket.
         garment (string): The name of the garment.
         gender (string): The gender of the person. Must be 'male' or 'female'.
 
@@ -135,24 +170,7 @@ def validate_size(form, s3, bucket_name, garment, gender):
         return None
     size = form["size"]
 
-    available_sizes = []
-
-    try:
-        objects = s3.list_objects(bucket_name, recursive=True)
-        for obj in objects:
-            if (
-                obj.object_name.endswith(".blend")
-                and garment in obj.object_name
-                and gender in obj.object_name
-            ):
-                file_name = os.path.basename(obj.object_name)
-                file_size = file_name.split("_")[0]
-                available_sizes.append(file_size)
-    except S3Error as e:
-        current_app.logger.error(f"Error occurred while listing objects: {e}")
-        return None
-
-    if size not in available_sizes:
+    if size not in catalog.sizes(garment, gender):
         return None
 
     return size
@@ -14,6 +14,42 @@ def clear_scene():
             bpy.data.collections.remove(collection)
 
 
+def reset_scene(frame=1):
+    """Resets the scene of a long-running Blender process to the state of a fresh start.
+
+    Clears the scene, removes all remaining data blocks (objects, meshes, materials, actions, ...)
+    and appended libraries, so names of appended objects don't get a numeric suffix in the next job.
+
+    Args:
+        frame (int, optional): The frame to reset the scene to. Defaults to 1.
+    """
+    if bpy.context.mode != "OBJECT":
+        bpy.ops.object.mode_set(mode="OBJECT")
+
+    clear_scene()
+
+    for data in (
+        bpy.data.objects,
+        bpy.data.meshes,
+        bpy.data.materials,
+        bpy.data.actions,
+        bpy.data.cameras,
+        bpy.data.lights,
+        bpy.data.images,
+        bpy.data.textures,
+        bpy.data.node_groups,
+        bpy.data.libraries,
+    ):
+        for block in list(data):
+            data.remove(block)
+
+    bpy.ops.outliner.orphans_purge(
+        do_local_ids=True, do_linked_ids=True, do_recursive=True
+    )
+
+    bpy.context.scene.frame_set(frame)
+
+
 def setup_scene(camera_location, camera_rotation, light_rotation):
     """Sets up the scene with a camera and light.
 
@@ -0,0 +1,81 @@
+import bpy
+import os
+import sys
+import json
+import traceback
+
+
+# Add all subdirectories of the script directory to the system path so Blender can find the modules
+def add_subdirs_to_sys_path(root_dir):
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        if os.path.basename(dirpath) == "__pycache__" or dirpath in sys.path:
+            continue
+        sys.path.append(dirpath)
+
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+add_subdirs_to_sys_path(script_dir)
+
+from _helpers.scene import reset_scene
+from fit_clothes import fit_clothes
+from generate_preview import generate_preview
+
+# Prefix of the lines the worker answers with, everything else on stdout is Blender output
+RESULT_PREFIX = "VF_RESULT "
+
+TASKS = {
+    "fit_clothes": fit_clothes,
+    "generate_preview": generate_preview,
+}
+
+
+def respond(result):
+    """Writes a result line for the worker pool to stdout.
+
+    Args:
+        result (dict): The result of the job.
+    """
+    print(f"{RESULT_PREFIX}{json.dumps(result)}", flush=True)
+
+
+def run_job(job):
+    """Runs a single job on a freshly reset scene.
+
+    Args:
+        job (dict): The job with the name of the task and its keyword arguments,
+            e.g. {"task": "generate_preview", "args": {"blend": "/data/L_Hoodie.blend", "output": "/data/male.png"}}.
+
+    Raises:
+        ValueError: If the task is unknown.
+
+    Returns:
+        list: The paths of the files written by the task.
+    """
+    task = TASKS.get(job.get("task"))
+    if task is None:
+        raise ValueError(f"Unknown task {job.get('task')}")
+
+    reset_scene()
+    return task(**job.get("args", {}))
+
+
+def main():
+    """Reads jobs as JSON lines from stdin and answers each with a result line until stdin is closed."""
+    # Disable the Blender splash screen
+    bpy.context.preferences.view.show_splash = False
+
+    respond({"ok": True, "ready": True})
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+
+        try:
+            outputs = run_job(json.loads(line))
+            respond({"ok": True, "outputs": outputs})
+        except Exception as e:
+            traceback.print_exc()
+            respond({"ok": False, "error": f"{type(e).__name__}: {e}"})
+
+
+main()
@@ -0,0 +1,317 @@
+import os
+import json
+import queue
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from minio import Minio
+from minio.error import S3Error
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = "/data"
+RESULT_PREFIX = "VF_RESULT "  # Must match blender_worker.py
+
+client = Minio(
+    endpoint=os.getenv("MINIO_ENDPOINT"),
+    access_key=os.getenv("MINIO_ACCESS_KEY"),
+    secret_key=os.getenv("MINIO_SECRET_KEY"),
+    secure=False,
+)
+
+
+class WorkerError(Exception):
+    """Raised when a Blender worker fails a job, times out or dies."""
+
+
+class BlenderWorker:
+    """A resident `blender -b` process running the job loop of blender_worker.py.
+
+    Args:
+        index (int): The index of the worker in the pool, used to prefix its log output.
+        startup_timeout (float): The maximum time in seconds to wait for Blender to start.
+    """
+
+    def __init__(self, index, startup_timeout=120):
+        self.index = index
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.results = None
+        self.start()
+
+    def start(self):
+        """Starts the Blender process and waits until its job loop is ready."""
+        self.process = subprocess.Popen(
+            ["blender", "-b", "-P", os.path.join(SCRIPT_DIR, "blender_worker.py")],
+            cwd=SCRIPT_DIR,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        self.results = queue.Queue()
+        threading.Thread(
+            target=self._read_stdout,
+            args=(self.process, self.results),
+            name=f"blender-{self.index}-stdout",
+            daemon=True,
+        ).start()
+        self._wait_for_result(self.startup_timeout)
+        print(f"Blender worker {self.index} ready (pid {self.process.pid})")
+
+    def stop(self):
+        """Kills the Blender process."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def _read_stdout(self, process, results):
+        # Result lines are passed to the waiting job, everything else is Blender's own log output
+        for line in process.stdout:
+            if line.startswith(RESULT_PREFIX):
+                results.put(json.loads(line[len(RESULT_PREFIX) :]))
+            else:
+                print(f"[blender-{self.index}] {line}", end="")
+        results.put(None)
+
+    def _wait_for_result(self, timeout):
+        try:
+            result = self.results.get(timeout=timeout)
+        except queue.Empty:
+            self.stop()
+            raise WorkerError(f"Blender worker {self.index} timed out")
+        if result is None:
+            raise WorkerError(
+                f"Blender worker {self.index} exited with code {self.process.wait()}"
+            )
+        return result
+
+    def run(self, task, args, timeout):
+        """Runs a task in the Blender process and restarts the process if it is not alive anymore.
+
+        Args:
+            task (str): The task, e.g. 'fit_clothes' or 'generate_preview'.
+            args (dict): The keyword arguments of the task.
+            timeout (float): The maximum time in seconds the task may take.
+
+        Raises:
+            WorkerError: If the task failed, timed out or the process died.
+
+        Returns:
+            list: The paths of the files written by the task.
+        """
+        if self.process.poll() is not None:
+            print(f"Blender worker {self.index} is not running, restarting...")
+            self.start()
+
+        try:
+            self.process.stdin.write(json.dumps({"task": task, "args": args}) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.stop()
+            raise WorkerError(f"Failed to send job to Blender worker {self.index}: {e}")
+
+        result = self._wait_for_result(timeout)
+        if not result["ok"]:
+            raise WorkerError(result["error"])
+        return result["outputs"]
+
+
+class WorkerPool:
+    """A fixed number of Blender workers, each job is run on the next idle worker.
+
+    Args:
+        size (int): The number of Blender processes.
+        timeout (float): The maximum time in seconds a single job may take.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.idle = queue.Queue()
+        for i in range(size):
+            self.idle.put(BlenderWorker(i))
+
+    def run(self, task, args):
+        """Runs a task on the next idle worker, blocks until a worker is available.
+
+        Args:
+            task (str): The task to run.
+            args (dict): The keyword arguments of the task.
+
+        Returns:
+            list: The paths of the files written by the task.
+        """
+        worker = self.idle.get()
+        try:
+            return worker.run(task, args, self.timeout)
+        finally:
+            self.idle.put(worker)
+
+
+def job_dir():
+    """Creates a temporary working directory for a single job below DATA_DIR."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return tempfile.TemporaryDirectory(dir=DATA_DIR)
+
+
+def try_on(
+    pool,
+    obj_bucket_name,
+    garment_bucket_name,
+    obj_key,
+    garment_key,
+    gender,
+    quality,
+    color="#C2C2C2",
+):
+    """Fetches an avatar and a garment, fits the garment and uploads the obj/mtl next to the avatar.
+
+    The uploaded keys include the quality, so concurrent try-ons of the same avatar and garment at
+    different qualities don't overwrite each other's results.
+
+    Returns:
+        dict: The keys of the uploaded obj and mtl.
+    """
+    with job_dir() as data_dir:
+        obj_filepath = os.path.join(data_dir, os.path.basename(obj_key))
+        client.fget_object(obj_bucket_name, obj_key, obj_filepath)
+        garment_filepath = os.path.join(data_dir, os.path.basename(garment_key))
+        client.fget_object(garment_bucket_name, garment_key, garment_filepath)
+
+        file_name = f"{os.path.splitext(os.path.basename(garment_key))[0]}.obj"
+        output_path, mtl_path = pool.run(
+            "fit_clothes",
+            {
+                "gender": gender,
+                "obj": obj_filepath,
+                "garment": garment_filepath,
+                "output": os.path.join(data_dir, file_name),
+                "quality": int(quality),
+                "color": color,
+            },
+        )
+
+        upload_name = f"{os.path.splitext(file_name)[0]}_q{int(quality)}"
+        upload_path_obj = os.path.join(obj_key.split("/")[0], f"{upload_name}.obj")
+        upload_path_mtl = os.path.join(obj_key.split("/")[0], f"{upload_name}.mtl")
+        client.fput_object(obj_bucket_name, upload_path_obj, output_path)
+        client.fput_object(obj_bucket_name, upload_path_mtl, mtl_path)
+        print(f"Fit {os.path.basename(garment_key)} to {obj_key}")
+
+    return {"obj_key": upload_path_obj, "mtl_key": upload_path_mtl}
+
+
+def generate_previews(pool, bucket_name, blend_keys):
+    """Fetches garments and renders their previews in parallel on all workers.
+
+    Returns:
+        dict: The keys of the uploaded previews.
+    """
+
+    def generate_preview(blend_key):
+        clothing, gender = blend_key.split("/")[:2]
+        with job_dir() as data_dir:
+            blend_filepath = os.path.join(data_dir, os.path.basename(blend_key))
+            client.fget_object(bucket_name, blend_key, blend_filepath)
+
+            (preview_path,) = pool.run(
+                "generate_preview",
+                {
+                    "blend": blend_filepath,
+                    "output": os.path.join(data_dir, f"{gender}.png"),
+                },
+            )
+
+            upload_path = f"previews/{clothing}/{gender}.png"
+            client.fput_object(bucket_name, upload_path, preview_path)
+            print(f"Generated preview for {blend_key}")
+        return upload_path
+
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        preview_keys = list(executor.map(generate_preview, blend_keys))
+
+    return {"preview_keys": preview_keys}
+
+
+class WorkerPoolRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the Blender worker pool.
+    GET /health: readiness of the pool and its size.
+    POST /try-on: {"obj_bucket_name", "garment_bucket_name", "obj_key", "garment_key", "gender", "quality", "color"} -> {"obj_key", "mtl_key"}
+    POST /generate-previews: {"bucket_name", "blend_keys"} -> {"preview_keys"}
+    """
+
+    pool = None
+    routes = {
+        "/try-on": try_on,
+        "/generate-previews": generate_previews,
+    }
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        self._send_json(200, {"status": "ready", "workers": self.pool.size})
+
+    def do_POST(self):
+        handler = self.routes.get(self.path)
+        if handler is None:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = json.loads(self.rfile.read(length))
+            result = handler(self.pool, **job)
+        except (TypeError, ValueError) as e:
+            self._send_json(400, {"error": f"Invalid job: {e}"})
+            return
+        except S3Error as e:
+            self._send_json(502, {"error": f"MinIO transfer failed: {e}"})
+            return
+        except WorkerError as e:
+            self._send_json(500, {"error": f"Blender job failed: {e}"})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"Unexpected error: {e}"})
+            return
+
+        self._send_json(200, result)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", "-P", type=int, default=5001)
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=int(os.getenv("BLENDER_WORKERS", 2)),
+        help="Number of resident Blender processes.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=float(os.getenv("BLENDER_JOB_TIMEOUT", 900)),
+        help="Maximum time in seconds a single job may take.",
+    )
+    args = parser.parse_args()
+
+    print(f"Starting {args.workers} Blender workers...")
+    WorkerPoolRequestHandler.pool = WorkerPool(args.workers, args.timeout)
+
+    server = ThreadingHTTPServer((args.host, args.port), WorkerPoolRequestHandler)
+    print(f"\nServing Blender jobs on {args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,94 @@
+"""
+Measures the cold start of the prediction service, i.e. loading all models in a fresh process, from the separate
+weight files, SMPL .pkl files, regressor .npy files and the torch hub (before) and from the model bundle written by
+pack_model_bundle.py (after).
+
+Run from api/hp3d:
+python -m benchmarks.benchmark_cold_start --model_bundle ./model_files/hp3d_inference.safetensors
+"""
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+
+def load_models(device, genders, pose2D_hrnet_weights_path, pose_shape_weights_template, pose_shape_cfg_path=None,
+                model_bundle_path=None):
+    """
+    Loads the models like serve_predict.PredictionService.
+    :return: time to load all models in seconds, excluding imports
+    """
+    import torch
+    from run_predict import load_shared_models, load_gendered_models
+    from utils.model_bundle import ModelBundle
+
+    start = time.perf_counter()
+    model_bundle = None
+    if model_bundle_path is not None:
+        model_bundle = ModelBundle(model_bundle_path)
+    shared_models = load_shared_models(device=device,
+                                       pose2D_hrnet_weights_path=pose2D_hrnet_weights_path,
+                                       pose_shape_cfg_path=pose_shape_cfg_path,
+                                       model_bundle=model_bundle)
+    for gender in genders:
+        load_gendered_models(device=device,
+                             pose_shape_cfg=shared_models['pose_shape_cfg'],
+                             pose_shape_weights_path=pose_shape_weights_template.format(gender=gender),
+                             gender=gender,
+                             model_bundle=model_bundle)
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    return time.perf_counter() - start
+
+
+def run_benchmark(args):
+    results = {}
+    for source in ('files', 'bundle'):
+        # Fresh process per source, so neither benefits from modules or weights loaded by the other
+        command = [sys.executable, '-m', 'benchmarks.benchmark_cold_start',
+                   '--load', source,
+                   '--model_bundle', args.model_bundle,
+                   '--pose2D_hrnet_weights', args.pose2D_hrnet_weights,
+                   '--pose_shape_weights_template', args.pose_shape_weights_template,
+                   '--gpu', str(args.gpu),
+                   '--genders'] + args.genders
+        if args.pose_shape_cfg is not None:
+            command += ['--pose_shape_cfg', args.pose_shape_cfg]
+        start = time.perf_counter()
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        process_seconds = time.perf_counter() - start
+        load_seconds = json.loads(output.strip().splitlines()[-1])['load_seconds']
+        results[source] = (load_seconds, process_seconds)
+
+    print('\n{:8s} {:>12s} {:>14s}'.format('Source', 'Load (s)', 'Process (s)'))
+    for source, (load_seconds, process_seconds) in results.items():
+        print('{:8s} {:12.2f} {:14.2f}'.format(source, load_seconds, process_seconds))
+    print('Model loading speedup: {:.2f}x'.format(results['files'][0] / results['bundle'][0]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_bundle', type=str, default='./model_files/hp3d_inference.safetensors')
+    parser.add_argument('--pose2D_hrnet_weights', '-W2D', type=str, default='./model_files/pose_hrnet_w48_384x288.pth')
+    parser.add_argument('--pose_shape_weights_template', type=str,
+                        default='./model_files/poseMF_shapeGaussian_net_weights_{gender}.tar')
+    parser.add_argument('--pose_shape_cfg', type=str, default=None)
+    parser.add_argument('--genders', '-G', type=str, nargs='+', default=['male', 'female'])
+    parser.add_argument('--gpu', type=int, default=0)
+    parser.add_argument('--load', type=str, default=None, choices=['files', 'bundle'],
+                        help='Only load the models from the given source in this process and print the load time as JSON.')
+    args = parser.parse_args()
+
+    if args.load is not None:
+        import torch
+        device = torch.device("cuda:{}".format(args.gpu) if torch.cuda.is_available() else "cpu")
+        load_seconds = load_models(device=device,
+                                   genders=args.genders,
+                                   pose2D_hrnet_weights_path=args.pose2D_hrnet_weights,
+                                   pose_shape_weights_template=args.pose_shape_weights_template,
+                                   pose_shape_cfg_path=args.pose_shape_cfg,
+                                   model_bundle_path=args.model_bundle if args.load == 'bundle' else None)
+        print(json.dumps({'load_seconds': load_seconds}))
+    else:
+        run_benchmark(args)
@@ -0,0 +1,77 @@
+"""
+Benchmarks writing an SMPL mesh with the previous save_mesh_as_obj, which formatted every line with np.savetxt and
+re-encoded the faces on every call (before), and with utils.mesh_writer (after), into an in-memory buffer.
+Also checks that both write the same obj.
+
+Run from api/hp3d:
+python -m benchmarks.benchmark_mesh_writer --num_repeats 20
+"""
+import io
+import time
+import argparse
+import numpy as np
+
+from configs import paths
+from models.smpl_official import SMPL
+from utils.mesh_writer import MESH_FORMATS, get_mesh_writer, compute_vertex_normals
+
+
+def save_mesh_as_obj_savetxt(fp, vertices, faces, smooth=False):
+    """
+    Previous implementation of save_mesh_as_obj, writing to an open text file.
+    """
+    np.savetxt(fp, vertices, fmt='v %f %f %f')
+    if smooth:
+        np.savetxt(fp, compute_vertex_normals(vertices, faces), fmt='vn %.4f %.4f %.4f')
+        fp.write('s 1\n')
+        np.savetxt(fp, np.repeat(faces + 1, 2, axis=1), fmt='f %d//%d %d//%d %d//%d')
+    else:
+        np.savetxt(fp, faces + 1, fmt='f %d %d %d')
+
+
+def time_write(write, num_repeats):
+    """
+    :return: mean time of a write in milliseconds
+    """
+    write()  # Warm-up
+    start = time.perf_counter()
+    for _ in range(num_repeats):
+        write()
+    return (time.perf_counter() - start) / num_repeats * 1000.0
+
+
+def run_benchmark(num_repeats):
+    smpl_model = SMPL(paths.SMPL, batch_size=1)
+    faces = smpl_model.faces.astype(np.int64)
+    vertices = smpl_model.v_template.numpy() * 1.8 / 1.7  # Height-scaled like the exported meshes
+
+    def savetxt_obj(smooth):
+        fp = io.StringIO()
+        save_mesh_as_obj_savetxt(fp, vertices, faces, smooth=smooth)
+        return fp.getvalue().encode('ascii')
+
+    def mesh_writer_write(file_format, smooth):
+        fp = io.BytesIO()
+        get_mesh_writer(faces).write(fp, vertices, file_format=file_format, smooth=smooth)
+        return fp.getvalue()
+
+    print('\nSMPL mesh: {} vertices, {} faces'.format(vertices.shape[0], faces.shape[0]))
+    print('{:20s} {:>14s} {:>12s} {:>12s}'.format('Writer', 'Write (ms)', 'Size (KB)', 'Speedup'))
+    for smooth in (False, True):
+        assert savetxt_obj(smooth) == mesh_writer_write('obj', smooth), 'Mesh writer obj differs from np.savetxt'
+        savetxt_ms = time_write(lambda: savetxt_obj(smooth), num_repeats)
+        suffix = ' smooth' if smooth else ''
+        print('{:20s} {:14.2f} {:12.1f}'.format('np.savetxt obj' + suffix, savetxt_ms, len(savetxt_obj(smooth)) / 1024))
+        for file_format in MESH_FORMATS:
+            write_ms = time_write(lambda: mesh_writer_write(file_format, smooth), num_repeats)
+            print('{:20s} {:14.2f} {:12.1f} {:11.2f}x'.format(file_format + suffix, write_ms,
+                                                              len(mesh_writer_write(file_format, smooth)) / 1024,
+                                                              savetxt_ms / write_ms))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_repeats', '-N', type=int, default=20)
+    args = parser.parse_args()
+
+    run_benchmark(num_repeats=args.num_repeats)
@@ -0,0 +1,111 @@
+"""
+Compares the CPU latency of HRNet and of the distribution predictor in eager PyTorch (before) and with the graphs
+exported by export_onnx.py in ONNX Runtime (after), for a range of thread counts. The distribution predictor is timed
+as a whole, i.e. including the FC pose networks and SVDs which stay in PyTorch in both cases.
+With --quantized, the INT8 graphs written by quantize_onnx.py are timed instead.
+
+Run from api/hp3d, after export_onnx.py:
+python -m benchmarks.benchmark_onnxruntime --onnx_dir ./model_files/onnx --num_threads 1 2 4 8
+"""
+import os
+import time
+import argparse
+import torch
+
+from run_predict import load_shared_models, load_gendered_models
+from models.onnx_models import ONNXRuntimeHRNet, ONNXRuntimePoseMFShapeGaussianNet, ONNX_HRNET_FNAME, \
+    ONNX_POSE_SHAPE_ENCODER_FNAME, get_onnx_path
+from utils.model_bundle import ModelBundle
+
+
+def time_forward(forward, input, num_repeats):
+    """
+    :return: mean time of a forward pass in milliseconds
+    """
+    with torch.no_grad():
+        forward(input)  # Warm-up
+        start = time.perf_counter()
+        for _ in range(num_repeats):
+            forward(input)
+    return (time.perf_counter() - start) / num_repeats * 1000.0
+
+
+def run_benchmark(onnx_dir,
+                  num_threads,
+                  batch_sizes,
+                  num_repeats,
+                  gender,
+                  pose2D_hrnet_weights_path,
+                  pose_shape_weights_path,
+                  pose_shape_cfg_path=None,
+                  model_bundle_path=None,
+                  quantized=False):
+    device = torch.device('cpu')
+    model_bundle = None
+    if model_bundle_path is not None:
+        model_bundle = ModelBundle(model_bundle_path)
+    shared_models = load_shared_models(device=device,
+                                       pose2D_hrnet_weights_path=pose2D_hrnet_weights_path,
+                                       pose_shape_cfg_path=pose_shape_cfg_path,
+                                       already_cropped_images=True,
+                                       model_bundle=model_bundle)
+    hrnet_cfg = shared_models['hrnet_cfg']
+    pose_shape_cfg = shared_models['pose_shape_cfg']
+    pose_shape_model = load_gendered_models(device=device,
+                                            pose_shape_cfg=pose_shape_cfg,
+                                            pose_shape_weights_path=pose_shape_weights_path,
+                                            gender=gender,
+                                            model_bundle=model_bundle)['pose_shape_model']
+    eager_models = {'HRNet': shared_models['hrnet_model'].eval(),
+                    'Distribution Predictor': pose_shape_model.eval()}
+    input_shapes = {'HRNet': (3, hrnet_cfg.MODEL.IMAGE_SIZE[1], hrnet_cfg.MODEL.IMAGE_SIZE[0]),
+                    'Distribution Predictor': (pose_shape_cfg.MODEL.NUM_IN_CHANNELS,
+                                               pose_shape_cfg.DATA.PROXY_REP_SIZE,
+                                               pose_shape_cfg.DATA.PROXY_REP_SIZE)}
+
+    onnx_column = 'ONNX Runtime {}(ms)'.format('INT8 ' if quantized else '')
+    print('\n{:24s} {:>6s} {:>8s} {:>11s} {:>22s} {:>8s}'.format('Model', 'Batch', 'Threads', 'Torch (ms)',
+                                                                 onnx_column, 'Speedup'))
+    for threads in num_threads:
+        torch.set_num_threads(threads)
+        onnx_models = {'HRNet': ONNXRuntimeHRNet(get_onnx_path(onnx_dir, ONNX_HRNET_FNAME, quantized=quantized),
+                                                 num_threads=threads),
+                       'Distribution Predictor': ONNXRuntimePoseMFShapeGaussianNet(
+                           get_onnx_path(onnx_dir, ONNX_POSE_SHAPE_ENCODER_FNAME.format(gender=gender),
+                                         quantized=quantized),
+                           pose_shape_model=pose_shape_model,
+                           num_threads=threads)}
+        for name, eager_model in eager_models.items():
+            for batch_size in batch_sizes:
+                input = torch.rand(batch_size, *input_shapes[name])
+                torch_ms = time_forward(eager_model, input, num_repeats)
+                onnx_ms = time_forward(onnx_models[name], input, num_repeats)
+                print('{:24s} {:6d} {:8d} {:11.1f} {:22.1f} {:7.2f}x'.format(name, batch_size, threads, torch_ms,
+                                                                             onnx_ms, torch_ms / onnx_ms))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--onnx_dir', type=str, default='./model_files/onnx')
+    parser.add_argument('--num_threads', '-T', type=int, nargs='+', default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument('--batch_sizes', '-B', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--num_repeats', '-N', type=int, default=10)
+    parser.add_argument('--gender', '-G', type=str, default='male', choices=['neutral', 'male', 'female'])
+    parser.add_argument('--pose2D_hrnet_weights', '-W2D', type=str, default='./model_files/pose_hrnet_w48_384x288.pth')
+    parser.add_argument('--pose_shape_weights', '-W3D', type=str,
+                        default='./model_files/poseMF_shapeGaussian_net_weights_male.tar')
+    parser.add_argument('--pose_shape_cfg', type=str, default=None)
+    parser.add_argument('--model_bundle', type=str, default=None)
+    parser.add_argument('--quantized', action='store_true', help='Time the INT8 graphs written by quantize_onnx.py.')
+    args = parser.parse_args()
+
+    run_benchmark(onnx_dir=args.onnx_dir,
+                  num_threads=sorted(set(args.num_threads)),
+                  batch_sizes=args.batch_sizes,
+                  num_repeats=args.num_repeats,
+                  gender=args.gender,
+                  pose2D_hrnet_weights_path=args.pose2D_hrnet_weights,
+                  pose_shape_weights_path=args.pose_shape_weights,
+                  pose_shape_cfg_path=args.pose_shape_cfg,
+                  model_bundle_path=args.model_bundle,
+                  quantized=args.quantized)
@@ -0,0 +1,142 @@
+"""
+Compares the person detectors of predict.person_detectors on SSP-3D: time per image and agreement of the selected
+(centre-most) person bounding box with the SSP-3D bounding box and with the box of the reference detector
+(the first one given, Mask R-CNN by default), measured by IoU.
+
+Run from api/hp3d:
+python -m benchmarks.benchmark_person_detectors --ssp3d_dir /path/to/ssp_3d
+"""
+import os
+import cv2
+import time
+import argparse
+import numpy as np
+import torch
+
+from configs import paths
+from configs.pose2D_hrnet_config import get_pose2D_hrnet_cfg_defaults
+from configs.poseMF_shapeGaussian_net_config import get_poseMF_shapeGaussian_cfg_defaults
+from models.pose2D_hrnet import PoseHighResolutionNet
+from predict.person_detectors import build_person_detector, PERSON_DETECTORS
+from predict.predict_hrnet import get_person_bbox
+
+
+def bbox_centre_hw_to_corners_torch(centre, height, width):
+    """
+    :param centre: (2,) bounding box centre in (vertical, horizontal) coordinates
+    :return: (4,) bounding box corners [y1, x1, y2, x2]
+    """
+    return torch.stack([centre[0] - height / 2.0, centre[1] - width / 2.0,
+                        centre[0] + height / 2.0, centre[1] + width / 2.0])
+
+
+def bbox_iou(corners_a, corners_b):
+    """
+    :param corners_a: (4,) bounding box corners [y1, x1, y2, x2]
+    :param corners_b: (4,) bounding box corners [y1, x1, y2, x2]
+    :return: intersection over union
+    """
+    top_left = torch.max(corners_a[:2], corners_b[:2])
+    bot_right = torch.min(corners_a[2:], corners_b[2:])
+    intersection = torch.clamp(bot_right - top_left, min=0).prod()
+    area_a = (corners_a[2:] - corners_a[:2]).prod()
+    area_b = (corners_b[2:] - corners_b[:2]).prod()
+    return (intersection / (area_a + area_b - intersection)).item()
+
+
+def run_benchmark(device,
+                  ssp3d_dir_path,
+                  detector_names,
+                  pose2D_hrnet_weights_path,
+                  bbox_threshold,
+                  num_images=None):
+    # SSP-3D images and tight (square) bounding boxes
+    data = np.load(os.path.join(ssp3d_dir_path, 'labels.npz'))
+    frame_fnames = data['fnames'][:num_images]
+    bbox_centres = data['bbox_centres']  # (vert, hor) coordinates
+    bbox_whs = data['bbox_whs']
+    print('\nComparing {} on {} SSP-3D images, person score threshold {}'.format(', '.join(detector_names),
+                                                                                   len(frame_fnames),
+                                                                                   bbox_threshold))
+
+    hrnet_cfg = get_pose2D_hrnet_cfg_defaults()
+    hrnet_model = PoseHighResolutionNet(hrnet_cfg).to(device)
+    hrnet_model.load_state_dict(torch.load(pose2D_hrnet_weights_path, map_location=device), strict=False)
+    hrnet_model.eval()
+
+    results = {}
+    for name in detector_names:
+        detector = build_person_detector(name=name,
+                                         device=device,
+                                         hrnet_model=hrnet_model,
+                                         hrnet_config=hrnet_cfg)
+        detector.eval()
+
+        times, corners, num_missed = [], [], 0
+        for fname in frame_fnames:
+            image = cv2.cvtColor(cv2.imread(os.path.join(ssp3d_dir_path, 'images', fname)), cv2.COLOR_BGR2RGB)
+            image = torch.from_numpy(image.transpose(2, 0, 1)).float().to(device) / 255.0
+            with torch.no_grad():
+                if device.type == 'cuda':
+                    torch.cuda.synchronize()
+                start = time.perf_counter()
+                object_pred = detector([image])[0]
+                if device.type == 'cuda':
+                    torch.cuda.synchronize()
+                times.append(time.perf_counter() - start)
+
+            is_person = (object_pred['labels'] == 1) & (object_pred['scores'] > bbox_threshold)
+            if not is_person.any():
+                num_missed += 1  # get_person_bbox falls back to the entire image
+            centre, height, width = get_person_bbox(image=image,
+                                                    object_pred=object_pred,
+                                                    object_detect_threshold=bbox_threshold)
+            corners.append(bbox_centre_hw_to_corners_torch(centre.cpu(), height.cpu(), width.cpu()))
+        results[name] = {'ms_per_image': np.mean(times[1:] if len(times) > 1 else times) * 1000.0,  # First image is warm-up
+                         'num_missed': num_missed,
+                         'corners': corners}
+        del detector
+
+    reference_name = detector_names[0]
+    print('\n{:36s} {:>10s} {:>8s} {:>12s} {:>16s}'.format('Detector', 'ms/image', 'missed',
+                                                           'IoU SSP-3D', 'IoU ' + reference_name[:12]))
+    for name in detector_names:
+        ious_gt, ious_reference = [], []
+        for i in range(len(frame_fnames)):
+            gt_corners = bbox_centre_hw_to_corners_torch(torch.from_numpy(bbox_centres[i]).float(),
+                                                         torch.tensor(float(bbox_whs[i])),
+                                                         torch.tensor(float(bbox_whs[i])))
+            ious_gt.append(bbox_iou(results[name]['corners'][i], gt_corners))
+            ious_reference.append(bbox_iou(results[name]['corners'][i], results[reference_name]['corners'][i]))
+        print('{:36s} {:10.1f} {:8d} {:12.3f} {:16.3f}'.format(name,
+                                                                results[name]['ms_per_image'],
+                                                                results[name]['num_missed'],
+                                                                np.mean(ious_gt),
+                                                                np.mean(ious_reference)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ssp3d_dir', type=str, default=paths.SSP3D_PATH)
+    parser.add_argument('--detectors', '-D', type=str, nargs='+', default=list(PERSON_DETECTORS), choices=PERSON_DETECTORS,
+                        help='Detectors to compare, the first one is the reference.')
+    parser.add_argument('--pose2D_hrnet_weights', '-W2D', type=str, default='./model_files/pose_hrnet_w48_384x288.pth')
+    parser.add_argument('--bbox_threshold', type=float, default=None,
+                        help='Person score threshold, defaults to DATA.BBOX_THRESHOLD of the config.')
+    parser.add_argument('--num_images', '-N', type=int, default=None)
+    parser.add_argument('--gpu', type=int, default=0)
+    args = parser.parse_args()
+
+    device = torch.device("cuda:{}".format(args.gpu) if torch.cuda.is_available() else "cpu")
+    print('\nDevice: {}'.format(device))
+
+    bbox_threshold = args.bbox_threshold
+    if bbox_threshold is None:
+        bbox_threshold = get_poseMF_shapeGaussian_cfg_defaults().DATA.BBOX_THRESHOLD
+
+    run_benchmark(device=device,
+                  ssp3d_dir_path=args.ssp3d_dir,
+                  detector_names=args.detectors,
+                  pose2D_hrnet_weights_path=args.pose2D_hrnet_weights,
+                  bbox_threshold=bbox_threshold,
+                  num_images=args.num_images)
@@ -0,0 +1,221 @@
+"""
+Benchmarks the pose distribution prediction of PoseMFShapeGaussianNet, i.e. everything after the image encoder,
+against the previous implementation, which looped over the 23 joints with one CPU SVD each.
+Also checks that both implementations predict the same distributions, and checks the analytic SVD of
+MODEL.ANALYTIC_SVD against torch.svd on the same Matrix-Fisher parameters.
+
+Run from api/hp3d:
+python -m benchmarks.benchmark_poseMF_shapeGaussian_net --batch_sizes 1 32
+"""
+import time
+import argparse
+import torch
+from torch.distributions import Normal
+
+from configs import paths
+from configs.poseMF_shapeGaussian_net_config import get_poseMF_shapeGaussian_cfg_defaults
+from models.smpl_official import SMPL
+from models.poseMF_shapeGaussian_net import PoseMFShapeGaussianNet
+from utils.rigid_transform_utils import batch_svd_3x3
+
+
+def forward_per_joint(model, input_feats):
+    """
+    Previous implementation of PoseMFShapeGaussianNet.forward (given image features), one joint at a time.
+    """
+    batch_size = input_feats.shape[0]
+    device = input_feats.device
+
+    x = model.activation(model.fc1(input_feats))
+
+    shape_params = model.fc_shape(x)
+    shape_mean = shape_params[:, :model.num_shape_params]
+    shape_log_std = shape_params[:, model.num_shape_params:]
+    shape_dist = Normal(loc=shape_mean, scale=torch.exp(shape_log_std))
+
+    glob = model.fc_glob(x) + model.init_glob
+    cam = model.fc_cam(x) + model.init_cam
+
+    embed = model.activation(model.fc_embed(torch.cat([input_feats, shape_params, glob, cam], dim=1)))
+
+    pose_F = torch.zeros(batch_size, model.num_joints, 3, 3, device=device)
+    pose_U = torch.zeros(batch_size, model.num_joints, 3, 3, device=device)
+    pose_S = torch.zeros(batch_size, model.num_joints, 3, device=device)
+    pose_V = torch.zeros(batch_size, model.num_joints, 3, 3, device=device)
+    pose_U_proper = torch.zeros(batch_size, model.num_joints, 3, 3, device=device)
+    pose_S_proper = torch.zeros(batch_size, model.num_joints, 3, device=device)
+    pose_rotmats_mode = torch.zeros(batch_size, model.num_joints, 3, 3, device=device)
+
+    for joint in range(model.num_joints):
+        parents = model.parents_dict[joint]
+        fc_joint = model.fc_pose[joint]
+
+        if len(parents) > 0:
+            parents_U_proper = pose_U_proper[:, parents, :, :].view(batch_size, -1)
+            parents_S_proper = pose_S_proper[:, parents, :].view(batch_size, -1)
+            parents_mode = pose_rotmats_mode[:, parents, :, :].view(batch_size, -1)
+
+            joint_F = fc_joint(torch.cat([embed, parents_U_proper, parents_S_proper, parents_mode], dim=1)).view(-1, 3, 3)
+        else:
+            joint_F = fc_joint(embed).view(-1, 3, 3)
+
+        if model.config.MODEL.DELTA_I:
+            joint_F = joint_F + model.config.MODEL.DELTA_I_WEIGHT * torch.eye(3, device=device)[None, :, :].expand_as(joint_F)
+
+        joint_U, joint_S, joint_V = torch.svd(joint_F.cpu())
+        with torch.no_grad():
+            det_joint_U, det_joint_V = torch.det(joint_U).to(device), torch.det(joint_V).to(device)
+        joint_U, joint_S, joint_V = joint_U.to(device), joint_S.to(device), joint_V.to(device)
+
+        joint_U_proper = joint_U.clone()
+        joint_S_proper = joint_S.clone()
+        joint_V_proper = joint_V.clone()
+        joint_U_proper[:, :, 2] *= det_joint_U.unsqueeze(-1)
+        joint_S_proper[:, 2] *= det_joint_U * det_joint_V
+        joint_V_proper[:, :, 2] *= det_joint_V.unsqueeze(-1)
+
+        joint_rotmat_mode = torch.matmul(joint_U_proper, joint_V_proper.transpose(dim0=-1, dim1=-2))
+
+        pose_F[:, joint, :, :] = joint_F
+        pose_U[:, joint, :, :] = joint_U
+        pose_S[:, joint, :] = joint_S
+        pose_V[:, joint, :, :] = joint_V
+        pose_U_proper[:, joint, :, :] = joint_U_proper
+        pose_S_proper[:, joint, :] = joint_S_proper
+        pose_rotmats_mode[:, joint, :, :] = joint_rotmat_mode
+
+    return pose_F, pose_U, pose_S, pose_V, pose_rotmats_mode, shape_dist, glob, cam
+
+
+def time_forward(forward, input_feats, num_repeats):
+    """
+    :return: mean time of a forward pass in milliseconds
+    """
+    with torch.no_grad():
+        forward(input_feats)  # Warm-up
+        if input_feats.is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        for _ in range(num_repeats):
+            forward(input_feats)
+        if input_feats.is_cuda:
+            torch.cuda.synchronize()
+    return (time.perf_counter() - start) / num_repeats * 1000.0
+
+
+def mode_rotation(U, V):
+    """
+    :return: U_proper V_proper^T, the mode of the Matrix-Fisher distribution, which does not depend on the signs of the
+        singular vectors
+    """
+    U_proper = U.clone()
+    V_proper = V.clone()
+    U_proper[:, :, 2] *= torch.det(U).unsqueeze(-1)
+    V_proper[:, :, 2] *= torch.det(V).unsqueeze(-1)
+    return torch.matmul(U_proper, V_proper.transpose(-1, -2))
+
+
+def check_svd_parity(F, tolerance=1e-4):
+    """
+    Compares batch_svd_3x3 with torch.svd on the same matrices, on everything that is invariant to the signs of the
+    singular vectors: the singular values, the reconstruction U diag(S) V^T and the mode rotation of each joint.
+    :param F: (N, 3, 3) Matrix-Fisher parameters
+    :param tolerance: max abs difference, relative to the largest singular value
+    :return: dict of max abs differences, and whether all are within the tolerance
+    """
+    U, S, V = torch.svd(F.cpu().double())
+    analytic_U, analytic_S, analytic_V = (x.cpu().double() for x in batch_svd_3x3(F))
+    F = F.cpu().double()
+    scale = S[:, :1].clamp(min=1.0)
+
+    diffs = {'S': ((analytic_S - S).abs() / scale).max().item(),
+             'USV^T': ((torch.matmul(analytic_U * analytic_S[:, None, :], analytic_V.transpose(-1, -2)) - F).abs()
+                       / scale[:, :, None]).max().item(),
+             'mode': (mode_rotation(analytic_U, analytic_V) - mode_rotation(U, V)).abs().max().item()}
+    diffs['within_tolerance'] = all(diff <= tolerance for diff in diffs.values())
+    # Not sign-invariant: differing signs change the inputs of the child joints and with them their predictions
+    diffs['sign_flipped_U_columns'] = ((analytic_U * U).sum(dim=1) < 0).float().mean().item()
+    return diffs
+
+
+def run_benchmark(device,
+                  batch_sizes,
+                  num_repeats,
+                  pose_shape_weights_path=None,
+                  pose_shape_cfg_path=None):
+    pose_shape_cfg = get_poseMF_shapeGaussian_cfg_defaults()
+    if pose_shape_cfg_path is not None:
+        pose_shape_cfg.merge_from_file(pose_shape_cfg_path)
+
+    smpl_model = SMPL(paths.SMPL,
+                      batch_size=1,
+                      num_betas=pose_shape_cfg.MODEL.NUM_SMPL_BETAS)
+    pose_shape_model = PoseMFShapeGaussianNet(smpl_parents=smpl_model.parents.tolist(),
+                                              config=pose_shape_cfg).to(device)
+    if pose_shape_weights_path is not None:
+        checkpoint = torch.load(pose_shape_weights_path, map_location=device)
+        pose_shape_model.load_state_dict(checkpoint['best_model_state_dict'])
+        print('Loaded Distribution Predictor weights from', pose_shape_weights_path)
+    else:
+        print('Using randomly initialised Distribution Predictor weights.')
+    pose_shape_model.eval()
+    num_image_features = pose_shape_model.fc1.in_features
+
+    def forward_per_depth(input_feats):
+        pose_shape_model.config.MODEL.ANALYTIC_SVD = False
+        return pose_shape_model(input=None, input_feats=input_feats)
+
+    def forward_per_depth_analytic_svd(input_feats):
+        pose_shape_model.config.MODEL.ANALYTIC_SVD = True
+        return pose_shape_model(input=None, input_feats=input_feats)
+
+    print('\nDevice: {}, joints by depth: {}'.format(device, pose_shape_model.joints_by_depth))
+    for batch_size in batch_sizes:
+        input_feats = torch.randn(batch_size, num_image_features, device=device)
+
+        with torch.no_grad():
+            expected = forward_per_joint(pose_shape_model, input_feats)
+            predicted = forward_per_depth(input_feats)
+            predicted_analytic_svd = forward_per_depth_analytic_svd(input_feats)
+        max_diffs = [(p - e).abs().max().item() for p, e in zip(predicted[:5], expected[:5])]
+        svd_parity = check_svd_parity(predicted[0].reshape(-1, 3, 3))
+        analytic_svd_mode_diffs = (predicted_analytic_svd[4] - predicted[4]).abs().amax(dim=(0, 2, 3))  # (23,)
+        first_depth_joints = pose_shape_model.joints_by_depth[0]
+        child_joints = [joint for joint in range(pose_shape_model.num_joints) if joint not in first_depth_joints]
+
+        per_joint_ms = time_forward(lambda x: forward_per_joint(pose_shape_model, x), input_feats, num_repeats)
+        per_depth_ms = time_forward(forward_per_depth, input_feats, num_repeats)
+        analytic_svd_ms = time_forward(forward_per_depth_analytic_svd, input_feats, num_repeats)
+        pose_shape_model.config.MODEL.ANALYTIC_SVD = pose_shape_cfg.MODEL.ANALYTIC_SVD
+
+        print('\nBatch size {}'.format(batch_size))
+        print('Max abs diff to per-joint F/U/S/V/mode: {}'.format(', '.join('{:.2e}'.format(d) for d in max_diffs)))
+        print('Analytic SVD vs torch.svd on the same F: S {:.2e}, USV^T {:.2e}, mode {:.2e} -> {}, '
+              '{:.0%} of the U columns differ in sign'.format(svd_parity['S'], svd_parity['USV^T'], svd_parity['mode'],
+                                                              'OK' if svd_parity['within_tolerance'] else 'FAILED',
+                                                              svd_parity['sign_flipped_U_columns']))
+        print('Analytic SVD model vs torch.svd model, max abs diff of the mode (the children differ, see '
+              'MODEL.ANALYTIC_SVD): first depth {:.2e}, children {:.2e}'.format(
+                  analytic_svd_mode_diffs[first_depth_joints].max().item(),
+                  analytic_svd_mode_diffs[child_joints].max().item()))
+        print('Per joint:                    {:8.2f} ms'.format(per_joint_ms))
+        print('Per depth, CPU SVD:           {:8.2f} ms ({:.2f}x)'.format(per_depth_ms, per_joint_ms / per_depth_ms))
+        print('Per depth, analytic SVD:      {:8.2f} ms ({:.2f}x)'.format(analytic_svd_ms, per_joint_ms / analytic_svd_ms))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_sizes', '-B', type=int, nargs='+', default=[1, 32])
+    parser.add_argument('--num_repeats', '-N', type=int, default=50)
+    parser.add_argument('--pose_shape_weights', '-W3D', type=str, default=None)
+    parser.add_argument('--pose_shape_cfg', type=str, default=None)
+    parser.add_argument('--gpu', type=int, default=0)
+    args = parser.parse_args()
+
+    device = torch.device("cuda:{}".format(args.gpu) if torch.cuda.is_available() else "cpu")
+
+    run_benchmark(device=device,
+                  batch_sizes=args.batch_sizes,
+                  num_repeats=args.num_repeats,
+                  pose_shape_weights_path=args.pose_shape_weights,
+                  pose_shape_cfg_path=args.pose_shape_cfg)
@@ -0,0 +1,133 @@
+"""
+Measures how much of the per-request time the proxy representation cache saves on a gender switch: each image is
+predicted with the first gender (cold cache) and then with the second gender, without (before) and with (after) the
+cache. With the cache, the second request only runs the distribution predictor and SMPL. Also checks that both give
+the same meshes.
+
+Run from api/hp3d:
+python -m benchmarks.benchmark_proxy_rep_cache --image_dir ./demo/ --genders male female
+"""
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import numpy as np
+import torch
+
+from run_predict import load_shared_models, load_gendered_models
+from predict.predict_poseMF_shapeGaussian_net import predict_poseMF_shapeGaussian_net
+from predict.proxy_rep_cache import ProxyRepCache
+from utils.model_bundle import ModelBundle
+
+
+def predict_request(image_dir, shared_models, gendered_models, device, proxy_rep_cache):
+    """
+    Predicts the mesh of a single image, like a prediction job of serve_predict.py.
+    :return: the obj bytes and the time of the request in milliseconds
+    """
+    torch.manual_seed(0)
+    np.random.seed(0)
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    predictions = predict_poseMF_shapeGaussian_net(pose_shape_model=gendered_models['pose_shape_model'],
+                                                   pose_shape_cfg=shared_models['pose_shape_cfg'],
+                                                   smpl_model=gendered_models['smpl_model'],
+                                                   hrnet_model=shared_models['hrnet_model'],
+                                                   hrnet_cfg=shared_models['hrnet_cfg'],
+                                                   edge_detect_model=shared_models['edge_detect_model'],
+                                                   device=device,
+                                                   image_dir=image_dir,
+                                                   save_dir=image_dir,
+                                                   height=1.75,
+                                                   object_detect_model=shared_models['object_detect_model'],
+                                                   outputs=('mesh',),
+                                                   mesh_in_memory=True,
+                                                   proxy_rep_cache=proxy_rep_cache)
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    return list(predictions.values())[0]['mesh'], elapsed_ms
+
+
+def run_benchmark(device,
+                  image_dir,
+                  genders,
+                  pose2D_hrnet_weights_path,
+                  pose_shape_weights_template,
+                  pose_shape_cfg_path=None,
+                  model_bundle_path=None):
+    model_bundle = None
+    if model_bundle_path is not None:
+        model_bundle = ModelBundle(model_bundle_path)
+    shared_models = load_shared_models(device=device,
+                                       pose2D_hrnet_weights_path=pose2D_hrnet_weights_path,
+                                       pose_shape_cfg_path=pose_shape_cfg_path,
+                                       model_bundle=model_bundle)
+    all_gendered_models = {gender: load_gendered_models(device=device,
+                                                        pose_shape_cfg=shared_models['pose_shape_cfg'],
+                                                        pose_shape_weights_path=pose_shape_weights_template.format(
+                                                            gender=gender),
+                                                        gender=gender,
+                                                        model_bundle=model_bundle)
+                           for gender in genders}
+    image_fnames = sorted([f for f in os.listdir(image_dir) if f.endswith(('.jpg', '.png'))])
+
+    proxy_rep_cache = ProxyRepCache()
+    first_ms, switch_ms, cached_switch_ms, same_meshes = [], [], [], True
+    with tempfile.TemporaryDirectory() as request_dir:
+        # Warm-up
+        shutil.copy(os.path.join(image_dir, image_fnames[0]), request_dir)
+        predict_request(request_dir, shared_models, all_gendered_models[genders[0]], device, None)
+        os.remove(os.path.join(request_dir, image_fnames[0]))
+
+        for image_fname in image_fnames:
+            shutil.copy(os.path.join(image_dir, image_fname), request_dir)
+            _, elapsed_ms = predict_request(request_dir, shared_models, all_gendered_models[genders[0]], device,
+                                            proxy_rep_cache)
+            first_ms.append(elapsed_ms)
+            mesh, elapsed_ms = predict_request(request_dir, shared_models, all_gendered_models[genders[1]], device,
+                                               None)
+            switch_ms.append(elapsed_ms)
+            cached_mesh, elapsed_ms = predict_request(request_dir, shared_models, all_gendered_models[genders[1]],
+                                                      device, proxy_rep_cache)
+            cached_switch_ms.append(elapsed_ms)
+            same_meshes = same_meshes and mesh == cached_mesh
+            os.remove(os.path.join(request_dir, image_fname))
+
+    stats = proxy_rep_cache.stats()
+    print('\nDevice: {}, {} images, gender switch {} -> {}'.format(device, len(image_fnames), *genders))
+    print('{:34s} {:>10.1f} ms'.format('First request (cold cache)', np.mean(first_ms)))
+    print('{:34s} {:>10.1f} ms'.format('Gender switch, no cache', np.mean(switch_ms)))
+    print('{:34s} {:>10.1f} ms'.format('Gender switch, cached', np.mean(cached_switch_ms)))
+    print('{:34s} {:>10.1f} ms ({:.0f}% of the request)'.format(
+        'Saved per gender switch', np.mean(switch_ms) - np.mean(cached_switch_ms),
+        100.0 * (1.0 - np.mean(cached_switch_ms) / np.mean(switch_ms))))
+    print('{:34s} {:>10.1f} ms'.format('Cached stage time per hit', 1000.0 * stats['saved_seconds'] / max(stats['hits'], 1)))
+    print('{:34s} {:>10.2f} MB'.format('Cache size per image', stats['bytes'] / max(stats['entries'], 1) / 2**20))
+    print('Same meshes: {}'.format(same_meshes))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--image_dir', '-I', type=str, required=True)
+    parser.add_argument('--genders', '-G', type=str, nargs=2, default=['male', 'female'],
+                        choices=['neutral', 'male', 'female'])
+    parser.add_argument('--pose2D_hrnet_weights', '-W2D', type=str, default='./model_files/pose_hrnet_w48_384x288.pth')
+    parser.add_argument('--pose_shape_weights_template', type=str,
+                        default='./model_files/poseMF_shapeGaussian_net_weights_{gender}.tar')
+    parser.add_argument('--pose_shape_cfg', type=str, default=None)
+    parser.add_argument('--model_bundle', type=str, default=None)
+    parser.add_argument('--gpu', type=int, default=0)
+    args = parser.parse_args()
+
+    device = torch.device("cuda:{}".format(args.gpu) if torch.cuda.is_available() else "cpu")
+
+    run_benchmark(device=device,
+                  image_dir=args.image_dir,
+                  genders=args.genders,
+                  pose2D_hrnet_weights_path=args.pose2D_hrnet_weights,
+                  pose_shape_weights_template=args.pose_shape_weights_template,
+                  pose_shape_cfg_path=args.pose_shape_cfg,
+                  model_bundle_path=args.model_bundle)
@@ -0,0 +1,104 @@
+"""
+Benchmarks the SMPL evaluations of a prediction with SMPL.forward (before) and SMPL.forward_cached (after):
+    - Mode + reposed mean: posed vertices of the mode and T-pose vertices of the mean shape, as in
+      predict_poseMF_shapeGaussian_net with mesh export.
+    - Uncertainty samples: pose samples with the mean shape, as in
+      compute_vertex_uncertainties_by_poseMF_shapeGaussian_sampling.
+Also checks that both give the same vertices.
+
+Run from api/hp3d:
+python -m benchmarks.benchmark_smpl --batch_sizes 1 8 --num_samples 50
+"""
+import time
+import argparse
+import torch
+
+from configs import paths
+from models.smpl_official import SMPL
+from utils.rigid_transform_utils import rot6d_to_rotmat
+
+
+def time_forward(forward, device, num_repeats):
+    """
+    :return: mean time of a forward pass in milliseconds
+    """
+    with torch.no_grad():
+        forward()  # Warm-up
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        for _ in range(num_repeats):
+            forward()
+        if device.type == 'cuda':
+            torch.cuda.synchronize()
+    return (time.perf_counter() - start) / num_repeats * 1000.0
+
+
+def random_rotmats(num_rotmats, device):
+    return rot6d_to_rotmat(torch.randn(num_rotmats, 6, device=device))
+
+
+def run_benchmark(device,
+                  batch_sizes,
+                  num_samples,
+                  num_repeats):
+    smpl_model = SMPL(paths.SMPL, batch_size=1).to(device)
+
+    print('\nDevice: {}'.format(device))
+    print('{:22s} {:>6s} {:>14s} {:>14s} {:>9s} {:>14s}'.format('Evaluation', 'Batch', 'Forward (ms)', 'Cached (ms)',
+                                                                  'Speedup', 'Max abs diff'))
+    for batch_size in batch_sizes:
+        betas = torch.randn(batch_size, 10, device=device)
+        pose_rotmats = random_rotmats(batch_size * 23, device).view(batch_size, 23, 3, 3)
+        glob_rotmats = random_rotmats(batch_size, device).view(batch_size, 1, 3, 3)
+
+        def mode_and_reposed_forward():
+            posed = smpl_model(body_pose=pose_rotmats, global_orient=glob_rotmats, betas=betas, pose2rot=False)
+            reposed = smpl_model(body_pose=torch.zeros(batch_size, 69, device=device),
+                                 global_orient=torch.zeros(batch_size, 3, device=device),
+                                 betas=betas)
+            return posed.vertices, reposed.vertices
+
+        def mode_and_reposed_cached():
+            smpl_model._shape_blend_cache.clear()  # Cache hits only within a prediction
+            posed = smpl_model.forward_cached(betas=betas, body_pose=pose_rotmats, global_orient=glob_rotmats,
+                                              pose2rot=False, return_joints=False)
+            reposed = smpl_model.forward_cached(betas=betas, return_joints=False)
+            return posed.vertices, reposed.vertices
+
+        sample_rotmats = random_rotmats(num_samples * 23, device).view(num_samples, 23, 3, 3)
+        sample_glob_rotmats = glob_rotmats[:1].expand(num_samples, -1, -1, -1)
+
+        def samples_forward():
+            return smpl_model(body_pose=sample_rotmats, global_orient=sample_glob_rotmats,
+                              betas=betas[:1].expand(num_samples, -1), pose2rot=False).vertices,
+
+        def samples_cached():
+            return smpl_model.forward_cached(betas=betas[:1], body_pose=sample_rotmats,
+                                             global_orient=sample_glob_rotmats, pose2rot=False).vertices,
+
+        for name, batch, forward, cached in [('Mode + reposed mean', batch_size,
+                                              mode_and_reposed_forward, mode_and_reposed_cached),
+                                             ('Uncertainty samples', num_samples, samples_forward, samples_cached)]:
+            with torch.no_grad():
+                max_diff = max((c - f).abs().max().item() for c, f in zip(cached(), forward()))
+            forward_ms = time_forward(forward, device, num_repeats)
+            cached_ms = time_forward(cached, device, num_repeats)
+            print('{:22s} {:6d} {:14.2f} {:14.2f} {:8.2f}x {:14.2e}'.format(name, batch, forward_ms, cached_ms,
+                                                                          forward_ms / cached_ms, max_diff))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_sizes', '-B', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--num_samples', '-S', type=int, default=50)
+    parser.add_argument('--num_repeats', '-N', type=int, default=50)
+    parser.add_argument('--gpu', type=int, default=0)
+    args = parser.parse_args()
+
+    device = torch.device("cuda:{}".format(args.gpu) if torch.cuda.is_available() else "cpu")
+
+    run_benchmark(device=device,
+                  batch_sizes=args.batch_sizes,
+                  num_samples=args.num_samples,
+                  num_repeats=args.num_repeats)
@@ -0,0 +1,88 @@
+"""
+Benchmarks rendering the views of the visualisation figure of predict_poseMF_shapeGaussian_net one renderer call per
+view with a batch size of 1, each copied to the host separately (before), and all views in one call of
+render_body_views with a single host transfer (after). Also checks that both render the same images.
+
+Run from api/hp3d:
+python -m benchmarks.benchmark_vis_render --num_repeats 20
+"""
+import time
+import argparse
+import numpy as np
+import torch
+
+from configs import paths
+from models.smpl_official import SMPL
+from predict.predict_poseMF_shapeGaussian_net import NUM_VIS_VIEWS, setup_body_vis_renderer, render_body_views
+from renderers.pytorch3d_textured_renderer import TexturedIUVRenderer
+
+
+def time_render(render, device, num_repeats):
+    """
+    :return: mean time of a render in milliseconds
+    """
+    render()  # Warm-up
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(num_repeats):
+        render()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / num_repeats * 1000.0
+
+
+def run_benchmark(device, num_repeats, visualise_wh):
+    smpl_model = SMPL(paths.SMPL, batch_size=1).to(device)
+    vis_setup = setup_body_vis_renderer(device=device, visualise_wh=visualise_wh)
+    single_view_renderer = TexturedIUVRenderer(device=device,
+                                               batch_size=1,
+                                               img_wh=visualise_wh,
+                                               projection_type='orthographic',
+                                               render_rgb=True,
+                                               bin_size=32)
+
+    with torch.no_grad():
+        vertices = smpl_model.forward_cached(betas=torch.zeros(1, 10, device=device), return_joints=False).vertices
+    view_rotmats = vis_setup['view_rotmats'][[0, 1, 2, 3, 0, 1]]
+    vis_vertices = torch.einsum('bij,bkj->bki', view_rotmats, vertices.expand(NUM_VIS_VIEWS, -1, -1))
+    cam_t = vis_setup['fixed_cam_t'].expand(NUM_VIS_VIEWS, -1)
+    orthographic_scale = vis_setup['fixed_orthographic_scale'].expand(NUM_VIS_VIEWS, -1)
+    verts_features = torch.full_like(vis_vertices, 0.7)
+
+    def render_per_view():
+        return np.stack([single_view_renderer(vertices=vis_vertices[[view]],
+                                              cam_t=cam_t[[view]],
+                                              orthographic_scale=orthographic_scale[[view]],
+                                              lights_rgb_settings=vis_setup['lights_rgb_settings'],
+                                              verts_features=verts_features[[view]])['rgb_images'].cpu().numpy()[0]
+                         for view in range(NUM_VIS_VIEWS)], axis=0)
+
+    def render_batched():
+        return render_body_views(vis_setup,
+                                 vertices=vis_vertices,
+                                 cam_t=cam_t,
+                                 orthographic_scale=orthographic_scale,
+                                 verts_features=verts_features)['rgb_images'].cpu().numpy()
+
+    with torch.no_grad():
+        per_view_ms = time_render(render_per_view, device, num_repeats)
+        batched_ms = time_render(render_batched, device, num_repeats)
+        max_diff = np.abs(render_per_view() - render_batched()).max()
+
+    print('\nDevice: {}, {} views of {}x{}'.format(device, NUM_VIS_VIEWS, visualise_wh, visualise_wh))
+    print('{:20s} {:>10.1f} ms'.format('One call per view', per_view_ms))
+    print('{:20s} {:>10.1f} ms ({:.1f}x)'.format('Batched', batched_ms, per_view_ms / batched_ms))
+    print('Max abs difference: {:.2e}'.format(max_diff))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_repeats', type=int, default=20)
+    parser.add_argument('--visualise_wh', type=int, default=512)
+    parser.add_argument('--gpu', type=int, default=0)
+    args = parser.parse_args()
+
+    device = torch.device("cuda:{}".format(args.gpu) if torch.cuda.is_available() else "cpu")
+
+    run_benchmark(device=device, num_repeats=args.num_repeats, visualise_wh=args.visualise_wh)
@@ -10,12 +10,15 @@ _C.MODEL.NUM_RESNET_LAYERS = 18
 _C.MODEL.EMBED_DIM = 256
 _C.MODEL.DELTA_I = True
 _C.MODEL.DELTA_I_WEIGHT = 1.0
+_C.MODEL.ANALYTIC_SVD = False  # Closed-form SVD of the MF parameters on the model's device instead of torch.svd on the CPU. Singular vector signs differ from torch.svd, which changes the predicted poses of non-root joints, so loading weights which were not trained with it raises an error.
 _C.MODEL.NUM_SMPL_BETAS = 10
 
 # Input Data
 _C.DATA = CfgNode()
+_C.DATA.BBOX_DETECTOR = 'maskrcnn_resnet50_fpn'  # Person detector, one of predict.person_detectors.PERSON_DETECTORS
 _C.DATA.BBOX_THRESHOLD = 0.95
 _C.DATA.BBOX_SCALE_FACTOR = 1.2
+_C.DATA.BBOX_HINT_MIN_JOINT_CONF = 0.5  # Person detector is run if the mean HRNet joint confidence with a bbox hint is lower
 _C.DATA.PROXY_REP_SIZE = 256
 _C.DATA.HEATMAP_GAUSSIAN_STD = 4.0
 _C.DATA.EDGE_NMS = True
@@ -9,10 +9,13 @@ from renderers.pytorch3d_textured_renderer import TexturedIUVRenderer
 
 from metrics.eval_metrics_tracker import EvalMetricsTracker
 
+from predict.predict_hrnet import predict_hrnet_batch, get_image_joints2D
+
 from utils.cam_utils import orthographic_project_torch
 from utils.rigid_transform_utils import rot6d_to_rotmat, aa_rotate_translate_points_pytorch3d, aa_rotate_rotmats
 from utils.joints2d_utils import undo_keypoint_normalisation
-from utils.label_conversions import convert_multiclass_to_binary_labels, ALL_JOINTS_TO_COCO_MAP, ALL_JOINTS_TO_H36M_MAP, H36M_TO_J14
+from utils.label_conversions import convert_multiclass_to_binary_labels, convert_2Djoints_to_gaussian_heatmaps_torch, \
+    ALL_JOINTS_TO_COCO_MAP, ALL_JOINTS_TO_H36M_MAP, H36M_TO_J14
 from utils.sampling_utils import pose_matrix_fisher_sampling_torch
 
 
@@ -30,7 +33,15 @@ def evaluate_pose_MF_shapeGaussian_net(pose_shape_model,
                                        pin_memory=True,
                                        save_per_frame_metrics=True,
                                        num_samples_for_metrics=10,
-                                       sample_on_cpu=False):
+                                       sample_on_cpu=False,
+                                       hrnet_model=None,
+                                       hrnet_cfg=None,
+                                       joints2Dvisib_threshold=0.75):
+    """
+    :param hrnet_model: if given, the input 2D joint heatmaps are created from the 2D joints predicted by HRNet on the
+        input image (as in run_predict.py with cropped images) instead of the labelled 2D joints
+    :return: dict of the final metrics
+    """
 
     eval_dataloader = DataLoader(eval_dataset,
                                  batch_size=1,
@@ -61,11 +72,25 @@ def evaluate_pose_MF_shapeGaussian_net(pose_shape_model,
         cam_per_frame = []
 
     pose_shape_model.eval()
+    if hrnet_model is not None:
+        hrnet_model.eval()
     for batch_num, samples_batch in enumerate(tqdm(eval_dataloader)):
         with torch.no_grad():
             # ------------------ INPUTS ------------------
             image = samples_batch['image'].to(device)
-            heatmaps = samples_batch['heatmaps'].to(device)
+            if hrnet_model is None:
+                heatmaps = samples_batch['heatmaps'].to(device)
+            else:
+                hrnet_output = predict_hrnet_batch(hrnet_model=hrnet_model,
+                                                   hrnet_config=hrnet_cfg,
+                                                   images=list(image),
+                                                   bbox_scale_factor=1.0)
+                heatmaps = convert_2Djoints_to_gaussian_heatmaps_torch(joints2D=get_image_joints2D(hrnet_output, hrnet_cfg, bbox_scale_factor=1.0),
+                                                                       img_wh=pose_shape_cfg.DATA.PROXY_REP_SIZE,
+                                                                       std=pose_shape_cfg.DATA.HEATMAP_GAUSSIAN_STD)
+                joints2Dvisib = hrnet_output['joints2Dconfs'] > joints2Dvisib_threshold
+                joints2Dvisib[:, [0, 1, 2, 3, 4, 5, 6, 11, 12]] = True  # Only removing joints [7, 8, 9, 10, 13, 14, 15, 16] if occluded
+                heatmaps = heatmaps * joints2Dvisib[:, :, None, None]
             edge_detector_output = edge_detect_model(image)
             proxy_rep_img = edge_detector_output['thresholded_thin_edges'] if pose_shape_cfg.DATA.EDGE_NMS else edge_detector_output['thresholded_grad_magnitude']
             proxy_rep_input = torch.cat([proxy_rep_img, heatmaps], dim=1)
@@ -90,15 +115,15 @@ def evaluate_pose_MF_shapeGaussian_net(pose_shape_model,
             target_pose[:, :3] = target_glob_vecs
 
             if target_gender == 'm':
-                target_smpl_output = smpl_model_male(body_pose=target_pose[:, 3:],
-                                                     global_orient=target_pose[:, :3],
-                                                     betas=target_shape)
-                target_reposed_smpl_output = smpl_model_male(betas=target_shape)
+                target_smpl_output = smpl_model_male.forward_cached(betas=target_shape,
+                                                                    body_pose=target_pose[:, 3:],
+                                                                    global_orient=target_pose[:, :3])
+                target_reposed_smpl_output = smpl_model_male.forward_cached(betas=target_shape, return_joints=False)
             elif target_gender == 'f':
-                target_smpl_output = smpl_model_female(body_pose=target_pose[:, 3:],
-                                                       global_orient=target_pose[:, :3],
-                                                       betas=target_shape)
-                target_reposed_smpl_output = smpl_model_female(betas=target_shape)
+                target_smpl_output = smpl_model_female.forward_cached(betas=target_shape,
+                                                                      body_pose=target_pose[:, 3:],
+                                                                      global_orient=target_pose[:, :3])
+                target_reposed_smpl_output = smpl_model_female.forward_cached(betas=target_shape, return_joints=False)
 
             target_vertices = target_smpl_output.vertices
             target_reposed_vertices = target_reposed_smpl_output.vertices
@@ -119,16 +144,16 @@ def evaluate_pose_MF_shapeGaussian_net(pose_shape_model,
             elif pred_glob.shape[-1] == 6:
                 pred_glob_rotmats = rot6d_to_rotmat(pred_glob)  # (1, 3, 3)
 
-            pred_smpl_output_mode = smpl_model(body_pose=pred_pose_rotmats_mode,
-                                               global_orient=pred_glob_rotmats.unsqueeze(1),
-                                               betas=pred_shape_dist.loc,
-                                               pose2rot=False)
+            pred_smpl_output_mode = smpl_model.forward_cached(betas=pred_shape_dist.loc,
+                                                              body_pose=pred_pose_rotmats_mode,
+                                                              global_orient=pred_glob_rotmats.unsqueeze(1),
+                                                              pose2rot=False)
             pred_vertices_mode = pred_smpl_output_mode.vertices  # (1, 6890, 3)
             pred_joints_all_mode = pred_smpl_output_mode.joints
             pred_joints_h36mlsp_mode = pred_joints_all_mode[:, ALL_JOINTS_TO_H36M_MAP, :][:, H36M_TO_J14, :]  # (1, 14, 3)
             pred_joints_coco_mode = pred_joints_all_mode[:, ALL_JOINTS_TO_COCO_MAP, :]
 
-            pred_reposed_smpl_output_mean = smpl_model(betas=pred_shape_dist.loc)
+            pred_reposed_smpl_output_mean = smpl_model.forward_cached(betas=pred_shape_dist.loc, return_joints=False)
             pred_reposed_vertices_mean = pred_reposed_smpl_output_mean.vertices  # (1, 6890, 3)
 
             # Pose targets were flipped such that they are right way up in 3D space - i.e. wrong way up when projected
@@ -164,18 +189,19 @@ def evaluate_pose_MF_shapeGaussian_net(pose_shape_model,
                                                                               oversampling_ratio=8,
                                                                               sample_on_cpu=sample_on_cpu)  # (1, num samples, 23, 3, 3)
                 pred_shape_samples = pred_shape_dist.rsample([num_samples_for_metrics]).transpose(0, 1)  # (1, num_samples, num_smpl_betas)
-                pred_smpl_output_samples = smpl_model(body_pose=pred_pose_rotmats_samples[0, :, :, :, :],
-                                                      global_orient=pred_glob_rotmats.unsqueeze(1).expand(num_samples_for_metrics, -1, -1, -1),
-                                                      betas=pred_shape_samples[0, :, :],
-                                                      pose2rot=False)
+                pred_smpl_output_samples = smpl_model.forward_cached(betas=pred_shape_samples[0, :, :],
+                                                                     body_pose=pred_pose_rotmats_samples[0, :, :, :, :],
+                                                                     global_orient=pred_glob_rotmats.unsqueeze(1).expand(num_samples_for_metrics, -1, -1, -1),
+                                                                     pose2rot=False,
+                                                                     cache_shape=False)
                 pred_vertices_samples = pred_smpl_output_samples.vertices
                 pred_vertices_samples[0] = pred_vertices_mode[0]  # (num samples, 6890, 3) - Including mode as one of the samples for 3D samples min metrics
                 pred_joints_h36mlsp_samples = pred_smpl_output_samples.joints[:, ALL_JOINTS_TO_H36M_MAP, :][:, H36M_TO_J14, :]
                 pred_joints_h36mlsp_samples[0] = pred_joints_h36mlsp_mode[0]  # (num samples, 14, 3) - Including mode as one of the samples for 3D samples min metrics
 
-                pred_reposed_vertices_samples = smpl_model(body_pose=torch.zeros(num_samples_for_metrics, 69, device=device).float(),
-                                                           global_orient=torch.zeros(num_samples_for_metrics, 3, device=device).float(),
-                                                           betas=pred_shape_samples[0, :, :]).vertices
+                pred_reposed_vertices_samples = smpl_model.forward_cached(betas=pred_shape_samples[0, :, :],
+                                                                          return_joints=False,
+                                                                          cache_shape=False).vertices
                 pred_reposed_vertices_samples[0] = pred_reposed_vertices_mean[0]   # (num samples, 6890, 3) - Including mode as one of the samples for 3D samples min metrics
 
                 if 'joints2Dsamples-L2E' in metrics:
@@ -242,7 +268,7 @@ def evaluate_pose_MF_shapeGaussian_net(pose_shape_model,
                 cam_per_frame.append(pred_cam_wp.cpu().detach().numpy())
 
     # ------------------------------- DISPLAY METRICS AND SAVE PER-FRAME METRICS -------------------------------
-    metrics_tracker.compute_final_metrics()
+    final_metrics = metrics_tracker.compute_final_metrics()
 
     if save_per_frame_metrics:
         fname_per_frame = np.concatenate(fname_per_frame, axis=0)
@@ -256,3 +282,5 @@ def evaluate_pose_MF_shapeGaussian_net(pose_shape_model,
 
         cam_per_frame = np.concatenate(cam_per_frame, axis=0)
         np.save(os.path.join(save_path, 'cam_per_frame.npy'), cam_per_frame)
+
+    return final_metrics
@@ -0,0 +1,208 @@
+import os
+import argparse
+import torch
+
+from run_predict import load_shared_models, load_gendered_models
+from models.onnx_models import (
+    PoseMFShapeGaussianEncoder,
+    ONNXRuntimeHRNet,
+    ONNXRuntimePoseMFShapeGaussianNet,
+    ONNX_HRNET_FNAME,
+    ONNX_POSE_SHAPE_ENCODER_FNAME,
+    ONNX_POSE_SHAPE_ENCODER_OUTPUTS,
+    get_onnx_path,
+)
+from utils.model_bundle import ModelBundle
+
+
+def export_onnx_graph(model, example_input, onnx_path, output_names):
+    """
+    Exports model (with a single input) to ONNX, with a dynamic batch size.
+    :param example_input: (B, C, H, W) tensor, B > 1 so that the batch size is not specialised.
+    """
+    torch.onnx.export(
+        model,
+        (example_input,),
+        onnx_path,
+        input_names=["input"],
+        output_names=list(output_names),
+        dynamic_shapes=({0: torch.export.Dim("batch")},),
+        external_data=False,  # Weights are well below the 2GB protobuf limit
+        dynamo=True,
+    )
+    print("Wrote", onnx_path)
+
+
+def check_parity(name, eager_outputs, onnx_outputs, rtol=1e-3, atol=1e-4):
+    """
+    Compares the outputs of an eager model and its ONNX Runtime replacement.
+    :param eager_outputs: dict of tensors.
+    :param onnx_outputs: dict of tensors, with the same keys as eager_outputs.
+    :return: dict of the maximum absolute difference per output.
+    :raises AssertionError: if any output differs by more than rtol/atol.
+    """
+    max_diffs = {}
+    for key, eager_output in eager_outputs.items():
+        max_diffs[key] = (onnx_outputs[key] - eager_output).abs().max().item()
+        print("{} {}: max abs diff {:.2e}".format(name, key, max_diffs[key]))
+        torch.testing.assert_close(
+            onnx_outputs[key],
+            eager_output,
+            rtol=rtol,
+            atol=atol,
+            msg=lambda msg: "ONNX {} {} does not match the eager model: {}".format(
+                name, key, msg
+            ),
+        )
+    return max_diffs
+
+
+def pose_shape_outputs(pose_shape_model, input):
+    """
+    :return: dict of the outputs of PoseMFShapeGaussianNet which do not depend on the SVD sign
+    convention.
+    """
+    pose_F, _, _, _, pose_rotmats_mode, shape_dist, glob, cam = pose_shape_model(input)
+    return {
+        "pose_F": pose_F,
+        "pose_rotmats_mode": pose_rotmats_mode,
+        "shape_mean": shape_dist.loc,
+        "shape_std": shape_dist.scale,
+        "glob": glob,
+        "cam": cam,
+    }
+
+
+def export_onnx(
+    onnx_dir,
+    pose2D_hrnet_weights_path,
+    pose_shape_weights_template,
+    genders,
+    pose_shape_cfg_path=None,
+    model_bundle_path=None,
+    parity_batch_size=2,
+):
+    """
+    Exports HRNet and the image encoder + FC heads of the distribution predictor of every gender to
+    ONNX, for run_predict.py --backend onnxruntime. The FC pose networks and the SVDs of their
+    outputs are interleaved along the kinematic tree and stay in PyTorch.
+    Every graph is checked against its eager model on random inputs after export.
+    :param pose_shape_weights_template: checkpoint path with a {gender} placeholder.
+    """
+    device = torch.device("cpu")
+    if not os.path.exists(onnx_dir):
+        os.makedirs(onnx_dir)
+    model_bundle = None
+    if model_bundle_path is not None:
+        model_bundle = ModelBundle(model_bundle_path)
+
+    torch.manual_seed(0)
+    shared_models = load_shared_models(
+        device=device,
+        pose2D_hrnet_weights_path=pose2D_hrnet_weights_path,
+        pose_shape_cfg_path=pose_shape_cfg_path,
+        already_cropped_images=True,
+        model_bundle=model_bundle,
+    )
+    hrnet_cfg = shared_models["hrnet_cfg"]
+    pose_shape_cfg = shared_models["pose_shape_cfg"]
+
+    # HRNet
+    hrnet_model = shared_models["hrnet_model"].eval()
+    hrnet_input = torch.randn(
+        parity_batch_size,
+        3,
+        hrnet_cfg.MODEL.IMAGE_SIZE[1],
+        hrnet_cfg.MODEL.IMAGE_SIZE[0],
+    )
+    hrnet_onnx_path = get_onnx_path(onnx_dir, ONNX_HRNET_FNAME)
+    with torch.no_grad():
+        export_onnx_graph(hrnet_model, hrnet_input, hrnet_onnx_path, ["heatmaps"])
+        check_parity(
+            "HRNet",
+            {"heatmaps": hrnet_model(hrnet_input)},
+            {"heatmaps": ONNXRuntimeHRNet(hrnet_onnx_path)(hrnet_input)},
+        )
+
+    # Distribution predictor image encoder + FC heads
+    for gender in genders:
+        pose_shape_model = load_gendered_models(
+            device=device,
+            pose_shape_cfg=pose_shape_cfg,
+            pose_shape_weights_path=pose_shape_weights_template.format(gender=gender),
+            gender=gender,
+            model_bundle=model_bundle,
+        )["pose_shape_model"].eval()
+        proxy_rep_input = torch.rand(
+            parity_batch_size,
+            pose_shape_cfg.MODEL.NUM_IN_CHANNELS,
+            pose_shape_cfg.DATA.PROXY_REP_SIZE,
+            pose_shape_cfg.DATA.PROXY_REP_SIZE,
+        )
+        encoder_onnx_path = get_onnx_path(
+            onnx_dir, ONNX_POSE_SHAPE_ENCODER_FNAME.format(gender=gender)
+        )
+        with torch.no_grad():
+            export_onnx_graph(
+                PoseMFShapeGaussianEncoder(pose_shape_model).eval(),
+                proxy_rep_input,
+                encoder_onnx_path,
+                ONNX_POSE_SHAPE_ENCODER_OUTPUTS,
+            )
+            onnx_pose_shape_model = ONNXRuntimePoseMFShapeGaussianNet(
+                encoder_onnx_path, pose_shape_model=pose_shape_model
+            )
+            check_parity(
+                "Distribution Predictor ({})".format(gender),
+                pose_shape_outputs(pose_shape_model, proxy_rep_input),
+                pose_shape_outputs(onnx_pose_shape_model, proxy_rep_input),
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--out_dir",
+        "-O",
+        type=str,
+        default="./model_files/onnx",
+        help="Directory to write the ONNX graphs to.",
+    )
+    parser.add_argument(
+        "--pose2D_hrnet_weights",
+        "-W2D",
+        type=str,
+        default="./model_files/pose_hrnet_w48_384x288.pth",
+    )
+    parser.add_argument(
+        "--pose_shape_weights_template",
+        type=str,
+        default="./model_files/poseMF_shapeGaussian_net_weights_{gender}.tar",
+        help="Checkpoint path with a {gender} placeholder.",
+    )
+    parser.add_argument(
+        "--genders",
+        "-G",
+        type=str,
+        nargs="+",
+        default=["male", "female"],
+        choices=["neutral", "male", "female"],
+    )
+    parser.add_argument("--pose_shape_cfg", type=str, default=None)
+    parser.add_argument(
+        "--model_bundle",
+        type=str,
+        default=None,
+        help="Inference weight bundle written by pack_model_bundle.py, "
+        "replaces the weight and SMPL files.",
+    )
+    args = parser.parse_args()
+
+    export_onnx(
+        onnx_dir=args.out_dir,
+        pose2D_hrnet_weights_path=args.pose2D_hrnet_weights,
+        pose_shape_weights_template=args.pose_shape_weights_template,
+        genders=args.genders,
+        pose_shape_cfg_path=args.pose_shape_cfg,
+        model_bundle_path=args.model_bundle,
+    )
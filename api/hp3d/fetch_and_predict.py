@@ -1,5 +1,7 @@
+import io
 import os
 import sys
+import hashlib
 import subprocess
 import shutil
 from minio import Minio
@@ -18,6 +20,7 @@ HEIGHT = sys.argv[4]
 
 IMAGE_DIR = "/data/images"
 SAVE_DIR = "/data/output"
+AVATAR_INDEX_PREFIX = "index/avatars"  # Must match the API config
 
 client = Minio(
     endpoint=os.getenv("MINIO_ENDPOINT"),
@@ -69,7 +72,8 @@ try:
             SAVE_DIR,
             "--height",
             HEIGHT,
-            "--export_obj",
+            "--outputs",
+            "mesh",
         ],
         check=True,
     )
@@ -87,6 +91,17 @@ print(f"Uploading obj to {BUCKET_NAME}/{output_path}")
 try:
     client.fput_object(BUCKET_NAME, upload_path, output_path)
     print(f"Uploaded obj to {BUCKET_NAME}/{upload_path}")
+
+    # Index the obj by its SHA-256 so the API can find it when it is uploaded again
+    with open(output_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    index_data = upload_path.encode("utf-8")
+    client.put_object(
+        BUCKET_NAME,
+        f"{AVATAR_INDEX_PREFIX}/{digest}",
+        io.BytesIO(index_data),
+        len(index_data),
+    )
 except S3Error as e:
     print(f"Failed to upload obj: {e}")
     sys.exit(1)
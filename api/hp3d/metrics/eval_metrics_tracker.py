@@ -359,10 +359,13 @@ class EvalMetricsTracker:
                     num_per_sample = 17
                 final_metrics[metric_type] = self.metric_sums[metric_type] / (self.total_samples * num_per_sample)
 
-            print(metric_type, '{:.2f}'.format(final_metrics[metric_type] * mult))
+            final_metrics[metric_type] *= mult
+            print(metric_type, '{:.2f}'.format(final_metrics[metric_type]))
 
         if self.save_per_frame_metrics:
             for metric_type in self.metrics_to_track:
                 if 'samples' not in metric_type:
                     per_frame = np.concatenate(self.per_frame_metrics[metric_type], axis=0)
-                    np.save(os.path.join(self.save_path, metric_type+'_per_frame.npy'), per_frame)
\ No newline at end of file
+                    np.save(os.path.join(self.save_path, metric_type+'_per_frame.npy'), per_frame)
+
+        return final_metrics
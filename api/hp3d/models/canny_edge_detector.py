@@ -2,13 +2,17 @@
 Canny edge detection adapted from https://github.com/DCurro/CannyEdgePytorch
 """
 
+from typing import Dict
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import numpy as np
 from scipy.signal.windows import gaussian
 
 
 class CannyEdgeDetector(nn.Module):
+    __constants__ = ['non_max_suppression']
+
     def __init__(self,
                  non_max_suppression=True,
                  gaussian_filter_std=1.0,
@@ -101,25 +105,32 @@ class CannyEdgeDetector(nn.Module):
             # self.directional_filter.weight[:] = torch.from_numpy(all_filters[:, None, ...])
             self.directional_filter.weight.data = torch.from_numpy(all_filters[:, None, :, :]).float()
 
-    def forward(self, img):
+    def forward(self, img) -> Dict[str, torch.Tensor]:
         """
+        All colour channels are filtered at once by grouped convolutions (one group per channel).
         :param img: (batch_size, num_channels, img_wh, img_wh)
         :return:
         """
-        batch_size = img.shape[0]
         num_channels = img.shape[1]
 
-        blurred_img = torch.zeros_like(img)  # (batch_size, num_channels, img_wh, img_wh)
-        grad_x = torch.zeros((batch_size, 1, *img.shape[2:]), device=img.device)  # (batch_size, 1, img_wh, img_wh)
-        grad_y = torch.zeros((batch_size, 1, *img.shape[2:]), device=img.device)  # (batch_size, 1, img_wh, img_wh)
-        for c in range(num_channels):
-            # Gaussian smoothing
-            blurred = self.gaussian_filter_vertical(self.gaussian_filter_horizontal(img[:, [c], :, :]))   # (batch_size, 1, img_wh, img_wh)
-            blurred_img[:, [c]] = blurred
-
-            # Gradient
-            grad_x += self.sobel_filter_horizontal(blurred)  # (batch_size, 1, img_wh, img_wh)
-            grad_y += self.sobel_filter_vertical(blurred)  # (batch_size, 1, img_wh, img_wh)
+        # Gaussian smoothing
+        blurred_img = F.conv2d(img,
+                               self.gaussian_filter_horizontal.weight.repeat(num_channels, 1, 1, 1),
+                               padding=self.gaussian_filter_horizontal.padding,
+                               groups=num_channels)
+        blurred_img = F.conv2d(blurred_img,
+                               self.gaussian_filter_vertical.weight.repeat(num_channels, 1, 1, 1),
+                               padding=self.gaussian_filter_vertical.padding,
+                               groups=num_channels)  # (batch_size, num_channels, img_wh, img_wh)
+
+        # Gradient
+        sobel_filters = torch.cat([self.sobel_filter_horizontal.weight, self.sobel_filter_vertical.weight], dim=0)
+        grads = F.conv2d(blurred_img,
+                         sobel_filters.repeat(num_channels, 1, 1, 1),
+                         padding=self.sobel_filter_horizontal.padding,
+                         groups=num_channels)  # (batch_size, num_channels * 2, img_wh, img_wh) with horizontal and vertical gradient per channel
+        grads = grads.view(img.shape[0], num_channels, 2, img.shape[2], img.shape[3]).sum(dim=1)  # (batch_size, 2, img_wh, img_wh)
+        grad_x, grad_y = grads[:, [0]], grads[:, [1]]  # (batch_size, 1, img_wh, img_wh)
 
         # Gradient magnitude and orientation
         grad_x, grad_y = grad_x / num_channels, grad_y / num_channels  # Average per-pixel gradients over channels
@@ -128,39 +139,48 @@ class CannyEdgeDetector(nn.Module):
         grad_orientation = torch.round(grad_orientation / 45.0) * 45.0  # Bin gradient orientations
 
         # Thresholding
-        thresholded_grad_magnitude = grad_magnitude.clone()
-        thresholded_grad_magnitude[grad_magnitude < self.threshold] = 0.0
+        thresholded_grad_magnitude = torch.where(grad_magnitude < self.threshold,
+                                                 torch.zeros_like(grad_magnitude),
+                                                 grad_magnitude)
 
         output = {'blurred_img': blurred_img,  # (batch_size, num_channels, img_wh, img_wh)
                   'grad_magnitude': grad_magnitude,  # (batch_size, 1, img_wh, img_wh)
                   'grad_orientation': grad_orientation,  # (batch_size, 1, img_wh, img_wh)
                   'thresholded_grad_magnitude': thresholded_grad_magnitude}  # (batch_size, 1, img_wh, img_wh)
-        assert grad_magnitude.size() == grad_orientation.size() == thresholded_grad_magnitude.size()
 
         # Non-max suppression (edge thinning)
         if self.non_max_suppression:
             all_direction_filtered = self.directional_filter(grad_magnitude)  # (batch_size, 8, img_wh, img_wh)
-            positive_idx = (grad_orientation / 45) % 8  # (batch_size, 1, img_wh, img_wh)  Index of positive gradient direction (0: 0°, ..., 7: 315°) at each pixel
-            thin_edges = grad_magnitude.clone()  # (batch_size, 1, img_wh, img_wh)
-            for pos_i in range(4):
-                neg_i = pos_i + 4
-                is_oriented_i = (positive_idx == pos_i) * 1
-                is_oriented_i = is_oriented_i + (positive_idx == neg_i) * 1  # > 0 if pixel is oriented in pos_i or neg_i direction
-                pos_directional = all_direction_filtered[:, pos_i]
-                neg_directional = all_direction_filtered[:, neg_i]
-                selected_direction = torch.stack([pos_directional, neg_directional])
-
-                # get the local maximum pixels for the angle
-                is_max = selected_direction.min(dim=0)[0] > 0.0  # Check if pixel greater than neighbours in pos_i and neg_i directions.
-                is_max = torch.unsqueeze(is_max, dim=1)
-
-                # apply non maximum suppression
-                to_remove = (is_max == 0) * 1 * (is_oriented_i) > 0
-                thin_edges[to_remove] = 0.0
-            thresholded_thin_edges = thin_edges.clone()
-            thresholded_thin_edges[thin_edges < self.threshold] = 0.0
+            positive_idx = ((grad_orientation / 45) % 8).long()  # (batch_size, 1, img_wh, img_wh)  Index of positive gradient direction (0: 0°, ..., 7: 315°) at each pixel
+            pos_i = positive_idx % 4  # Pixels oriented in direction i or i + 4 are compared against their neighbours in both directions
+            pos_directional = all_direction_filtered.gather(1, pos_i)  # (batch_size, 1, img_wh, img_wh)
+            neg_directional = all_direction_filtered.gather(1, pos_i + 4)  # (batch_size, 1, img_wh, img_wh)
+
+            # get the local maximum pixels for the angle
+            is_max = torch.min(pos_directional, neg_directional) > 0.0  # Check if pixel greater than neighbours in pos_i and neg_i directions.
+
+            # apply non maximum suppression
+            thin_edges = torch.where(is_max, grad_magnitude, torch.zeros_like(grad_magnitude))
+            thresholded_thin_edges = torch.where(thin_edges < self.threshold,
+                                                 torch.zeros_like(thin_edges),
+                                                 thin_edges)
 
             output['thin_edges'] = thin_edges
             output['thresholded_thin_edges'] = thresholded_thin_edges
 
         return output
+
+
+def compile_edge_detector(edge_detect_model, mode='script'):
+    """
+    Compiles the edge detector, which runs on every prediction and training batch.
+    :param edge_detect_model: CannyEdgeDetector
+    :param mode: 'script' for TorchScript or 'compile' for torch.compile (needs PyTorch >= 2.0).
+        TorchScript outputs are bit-identical to the eager outputs, torch.compile fuses the gradient magnitude
+        computation, so its magnitudes may differ by an ulp.
+    :return: compiled edge detector, called like the CannyEdgeDetector
+    """
+    assert mode in ['script', 'compile']
+    if mode == 'script':
+        return torch.jit.script(edge_detect_model)
+    return torch.compile(edge_detect_model)
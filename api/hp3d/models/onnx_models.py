@@ -0,0 +1,83 @@
+import os
+import numpy as np
+import onnxruntime
+import torch
+from torch import nn as nn
+
+# Files written by export_onnx.py
+ONNX_HRNET_FNAME = 'pose_hrnet_w48_384x288.onnx'
+ONNX_POSE_SHAPE_ENCODER_FNAME = 'poseMF_shapeGaussian_net_encoder_{gender}.onnx'
+ONNX_POSE_SHAPE_ENCODER_OUTPUTS = ('shape_params', 'glob', 'cam', 'embed')
+
+
+def get_onnx_path(onnx_dir, fname, quantized=False):
+    """
+    :param fname: one of the ONNX_*_FNAME graph filenames, formatted
+    :param quantized: path of the INT8 graph written by quantize_onnx.py instead of the float graph
+    """
+    if quantized:
+        fname = fname[:-len('.onnx')] + '.int8.onnx'
+    return os.path.join(onnx_dir, fname)
+
+
+def create_onnxruntime_session(onnx_path, num_threads=None):
+    """
+    :param num_threads: number of threads used within an operator, None for one per physical core
+    :return: ONNX Runtime CPU inference session
+    """
+    session_options = onnxruntime.SessionOptions()
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session_options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    session_options.inter_op_num_threads = 1
+    if num_threads is not None:
+        session_options.intra_op_num_threads = num_threads
+    return onnxruntime.InferenceSession(onnx_path, sess_options=session_options, providers=['CPUExecutionProvider'])
+
+
+class PoseMFShapeGaussianEncoder(nn.Module):
+    def __init__(self, pose_shape_model):
+        """
+        Image encoder + FC shape/glob/cam/embed networks of PoseMFShapeGaussianNet, i.e. the part which is exported to
+        ONNX. The FC pose networks and the SVDs of their outputs stay in PyTorch, see forward_distributions.
+        """
+        super(PoseMFShapeGaussianEncoder, self).__init__()
+        self.pose_shape_model = pose_shape_model
+
+    def forward(self, input):
+        return self.pose_shape_model.forward_heads(self.pose_shape_model.image_encoder(input))
+
+
+class ONNXRuntimeModel(nn.Module):
+    def __init__(self, onnx_path, num_threads=None):
+        """
+        Runs an exported ONNX graph with ONNX Runtime on the CPU. Inputs and outputs are CPU tensors.
+        """
+        super(ONNXRuntimeModel, self).__init__()
+        self.onnx_path = onnx_path
+        self.session = create_onnxruntime_session(onnx_path, num_threads=num_threads)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def run(self, input):
+        outputs = self.session.run(None, {self.input_name: np.ascontiguousarray(input.detach().cpu().numpy(), dtype=np.float32)})
+        return [torch.from_numpy(output) for output in outputs]
+
+
+class ONNXRuntimeHRNet(ONNXRuntimeModel):
+    """
+    Drop-in replacement of PoseHighResolutionNet at inference.
+    """
+    def forward(self, input):
+        return self.run(input)[0]
+
+
+class ONNXRuntimePoseMFShapeGaussianNet(ONNXRuntimeModel):
+    def __init__(self, onnx_path, pose_shape_model, num_threads=None):
+        """
+        Drop-in replacement of PoseMFShapeGaussianNet at inference: the image encoder and FC heads run in ONNX Runtime,
+        the hierarchical pose distributions are predicted from their outputs by pose_shape_model.
+        """
+        super(ONNXRuntimePoseMFShapeGaussianNet, self).__init__(onnx_path, num_threads=num_threads)
+        self.pose_shape_model = pose_shape_model
+
+    def forward(self, input):
+        return self.pose_shape_model.forward_distributions(*self.run(input))
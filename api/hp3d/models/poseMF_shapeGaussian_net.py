@@ -8,7 +8,7 @@ from torch.distributions import Normal
 
 from models.resnet import resnet18, resnet50
 
-from utils.rigid_transform_utils import rotmat_to_rot6d
+from utils.rigid_transform_utils import rotmat_to_rot6d, batch_svd_3x3
 
 
 def immediate_parents_to_all_parents(immediate_parents):
@@ -38,6 +38,11 @@ class PoseMFShapeGaussianNet(nn.Module):
         self.parents_dict = immediate_parents_to_all_parents(smpl_parents)
         self.num_joints = len(self.parents_dict)
         self.num_pose_params = self.num_joints * 3 * 3  # 3x3 matrix parameter for MF distribution for each joint.
+        # Joints grouped by their depth in the kinematic tree (= number of parents), joints at the same depth are predicted together.
+        self.joints_by_depth = defaultdict(list)
+        for joint in range(self.num_joints):
+            self.joints_by_depth[len(self.parents_dict[joint])].append(joint)
+        self.joints_by_depth = [self.joints_by_depth[depth] for depth in sorted(self.joints_by_depth)]
 
         # Number of shape, glob and cam parameters + sensible initial estimates for weak-perspective camera and global rotation
         self.num_shape_params = self.config.MODEL.NUM_SMPL_BETAS
@@ -82,23 +87,33 @@ class PoseMFShapeGaussianNet(nn.Module):
                                               self.activation,
                                               nn.Linear(self.config.MODEL.EMBED_DIM // 2, 9)))
 
-    def forward(self, input, input_feats=None):
+    def fc_pose_joints(self, joints, fc_input):
         """
-        input: (B, C, D, D) where B is batch size, C is number of channels and
-        D is height and width.
+        Evaluates the fc_pose networks of joints with the same number of parents in one batched matrix multiplication per layer.
+        :param joints: list of joint indices
+        :param fc_input: (bsize, num joints, input dim)
+        :return: (bsize, num joints, 9)
         """
-        if input_feats is None:
-            input_feats = self.image_encoder(input)
-        batch_size = input_feats.shape[0]
-        device = input_feats.device
+        x = fc_input.transpose(0, 1)  # (num joints, bsize, input dim)
+        for layer_idx, layer in enumerate(self.fc_pose[joints[0]]):
+            if isinstance(layer, nn.Linear):
+                weight = torch.stack([self.fc_pose[joint][layer_idx].weight for joint in joints])  # (num joints, out dim, in dim)
+                bias = torch.stack([self.fc_pose[joint][layer_idx].bias for joint in joints])  # (num joints, out dim)
+                x = torch.baddbmm(bias[:, None, :], x, weight.transpose(1, 2))  # (num joints, bsize, out dim)
+            else:
+                x = layer(x)
+        return x.transpose(0, 1)
 
+    def forward_heads(self, input_feats):
+        """
+        FC shape/glob/cam networks and the embedding which the FC pose networks are conditioned on.
+        :param input_feats: (bsize, num image features)
+        :return: shape_params: (bsize, num_smpl_betas * 2), glob: (bsize, 6), cam: (bsize, 3), embed: (bsize, embed dim)
+        """
         x = self.activation(self.fc1(input_feats))
 
         # Shape
         shape_params = self.fc_shape(x)  # (bsize, num_smpl_betas * 2)
-        shape_mean = shape_params[:, :self.num_shape_params]
-        shape_log_std = shape_params[:, self.num_shape_params:]
-        shape_dist = Normal(loc=shape_mean, scale=torch.exp(shape_log_std))
 
         # Glob rot and WP Cam
         delta_cam = self.fc_cam(x)
@@ -109,6 +124,30 @@ class PoseMFShapeGaussianNet(nn.Module):
         # Input Feats/Shape/Glob/Cam embed
         embed = self.activation(self.fc_embed(torch.cat([input_feats, shape_params, glob, cam], dim=1)))  # (bsize, embed dim)
 
+        return shape_params, glob, cam, embed
+
+    def forward(self, input, input_feats=None):
+        """
+        input: (B, C, D, D) where B is batch size, C is number of channels and
+        D is height and width.
+        """
+        if input_feats is None:
+            input_feats = self.image_encoder(input)
+        return self.forward_distributions(*self.forward_heads(input_feats))
+
+    def forward_distributions(self, shape_params, glob, cam, embed):
+        """
+        Shape distribution and hierarchical pose distributions from the outputs of forward_heads.
+        Split from forward_heads since the FC pose networks are interleaved with the SVDs of their parents' outputs,
+        so everything up to here can run in a different backend (see models.onnx_models).
+        """
+        batch_size = embed.shape[0]
+        device = embed.device
+
+        shape_mean = shape_params[:, :self.num_shape_params]
+        shape_log_std = shape_params[:, self.num_shape_params:]
+        shape_dist = Normal(loc=shape_mean, scale=torch.exp(shape_log_std))
+
         # Pose
         pose_F = torch.zeros(batch_size, self.num_joints, 3, 3, device=device)  # (bsize, 23, 3, 3)
         pose_U = torch.zeros(batch_size, self.num_joints, 3, 3, device=device)  # (bsize, 23, 3, 3)
@@ -118,27 +157,33 @@ class PoseMFShapeGaussianNet(nn.Module):
         pose_S_proper = torch.zeros(batch_size, self.num_joints, 3, device=device)  # (bsize, 23, 3)
         pose_rotmats_mode = torch.zeros(batch_size, self.num_joints, 3, 3, device=device)  # (bsize, 23, 3, 3)
 
-        for joint in range(self.num_joints):
-            parents = self.parents_dict[joint]
-            fc_joint = self.fc_pose[joint]
+        for joints in self.joints_by_depth:
+            num_joints = len(joints)
+            parents = [self.parents_dict[joint] for joint in joints]
 
-            if len(parents) > 0:
-                parents_U_proper = pose_U_proper[:, parents, :, :].view(batch_size, -1)  # (bsize, num parents * 3 * 3)
-                parents_S_proper = pose_S_proper[:, parents, :].view(batch_size, -1)  # (bsize, num parents * 3)
-                parents_mode = pose_rotmats_mode[:, parents, :, :].view(batch_size, -1)  # (bsize, num parents * 3 * 3)
+            fc_input = embed[:, None, :].expand(-1, num_joints, -1)  # (bsize, num joints, embed dim)
+            if len(parents[0]) > 0:
+                parents_U_proper = pose_U_proper[:, parents, :, :].view(batch_size, num_joints, -1)  # (bsize, num joints, num parents * 3 * 3)
+                parents_S_proper = pose_S_proper[:, parents, :].view(batch_size, num_joints, -1)  # (bsize, num joints, num parents * 3)
+                parents_mode = pose_rotmats_mode[:, parents, :, :].view(batch_size, num_joints, -1)  # (bsize, num joints, num parents * 3 * 3)
+                fc_input = torch.cat([fc_input, parents_U_proper, parents_S_proper, parents_mode], dim=2)
 
-                joint_F = fc_joint(torch.cat([embed, parents_U_proper, parents_S_proper, parents_mode], dim=1)).view(-1, 3, 3)  # (bsize, 3, 3)
-            else:
-                joint_F = fc_joint(embed).view(-1, 3, 3)  # (bsize, 3, 3)
+            joint_F = self.fc_pose_joints(joints, fc_input).reshape(-1, 3, 3)  # (bsize * num joints, 3, 3)
 
             if self.config.MODEL.DELTA_I:
                 joint_F = joint_F + self.config.MODEL.DELTA_I_WEIGHT * torch.eye(3, device=device)[None, :, :].expand_as(joint_F)
 
-            joint_U, joint_S, joint_V = torch.svd(joint_F.cpu())  # (bsize, 3, 3), (bsize, 3), (bsize, 3, 3)
-            # I found that SVD is faster on CPU than GPU, but YMMV.
-            with torch.no_grad():
-                det_joint_U, det_joint_V = torch.det(joint_U).to(device), torch.det(joint_V).to(device)  # (bsize,), (bsize,)
-            joint_U, joint_S, joint_V = joint_U.to(device), joint_S.to(device), joint_V.to(device)
+            # One SVD for all joints at this depth
+            if self.config.MODEL.ANALYTIC_SVD:
+                joint_U, joint_S, joint_V = batch_svd_3x3(joint_F)  # (bsize * num joints, 3, 3), (bsize * num joints, 3), (bsize * num joints, 3, 3)
+                with torch.no_grad():
+                    det_joint_U, det_joint_V = torch.det(joint_U), torch.det(joint_V)  # (bsize * num joints,), (bsize * num joints,)
+            else:
+                joint_U, joint_S, joint_V = torch.svd(joint_F.cpu())  # (bsize * num joints, 3, 3), (bsize * num joints, 3), (bsize * num joints, 3, 3)
+                # I found that SVD is faster on CPU than GPU, but YMMV.
+                with torch.no_grad():
+                    det_joint_U, det_joint_V = torch.det(joint_U).to(device), torch.det(joint_V).to(device)  # (bsize * num joints,), (bsize * num joints,)
+                joint_U, joint_S, joint_V = joint_U.to(device), joint_S.to(device), joint_V.to(device)
 
             # "Proper" SVD
             joint_U_proper = joint_U.clone()
@@ -151,13 +196,13 @@ class PoseMFShapeGaussianNet(nn.Module):
 
             joint_rotmat_mode = torch.matmul(joint_U_proper, joint_V_proper.transpose(dim0=-1, dim1=-2))
 
-            pose_F[:, joint, :, :] = joint_F
-            pose_U[:, joint, :, :] = joint_U
-            pose_S[:, joint, :] = joint_S
-            pose_V[:, joint, :, :] = joint_V
-            pose_U_proper[:, joint, :, :] = joint_U_proper
-            pose_S_proper[:, joint, :] = joint_S_proper
-            pose_rotmats_mode[:, joint, :, :] = joint_rotmat_mode
+            pose_F[:, joints, :, :] = joint_F.view(batch_size, num_joints, 3, 3)
+            pose_U[:, joints, :, :] = joint_U.view(batch_size, num_joints, 3, 3)
+            pose_S[:, joints, :] = joint_S.view(batch_size, num_joints, 3)
+            pose_V[:, joints, :, :] = joint_V.view(batch_size, num_joints, 3, 3)
+            pose_U_proper[:, joints, :, :] = joint_U_proper.view(batch_size, num_joints, 3, 3)
+            pose_S_proper[:, joints, :] = joint_S_proper.view(batch_size, num_joints, 3)
+            pose_rotmats_mode[:, joints, :, :] = joint_rotmat_mode.view(batch_size, num_joints, 3, 3)
 
         return pose_F, pose_U, pose_S, pose_V, pose_rotmats_mode, shape_dist, glob, cam
 
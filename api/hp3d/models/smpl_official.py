@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 import torch
 import numpy as np
 from smplx import SMPL as _SMPL
@@ -5,37 +7,134 @@ try:
     from smplx.body_models import ModelOutput as SMPLOutput
 except ImportError:
     from smplx.utils import SMPLOutput
-from smplx.lbs import vertices2joints
+from smplx.lbs import vertices2joints, blend_shapes, batch_rodrigues, batch_rigid_transform
 
 from configs import paths
 
 
 class SMPL(_SMPL):
     """ Extension of the official SMPL implementation to support more joints """
-    def __init__(self, *args, **kwargs):
+    # Number of betas vectors whose shaped template is memoized by shape_blend
+    SHAPE_BLEND_CACHE_SIZE = 32
+
+    def __init__(self, *args, J_regressor_extra=None, J_regressor_cocoplus=None, J_regressor_h36m=None, **kwargs):
+        """
+        The additional joint regressors are read from configs.paths unless given (e.g. from a utils.model_bundle).
+        """
         super(SMPL, self).__init__(*args, **kwargs)
-        J_regressor_extra = np.load(paths.J_REGRESSOR_EXTRA)
-        J_regressor_cocoplus = np.load(paths.COCOPLUS_REGRESSOR)
-        J_regressor_h36m = np.load(paths.H36M_REGRESSOR)
-        self.register_buffer('J_regressor_extra', torch.tensor(J_regressor_extra,
-                                                               dtype=torch.float32))
-        self.register_buffer('J_regressor_cocoplus', torch.tensor(J_regressor_cocoplus,
+        if J_regressor_extra is None:
+            J_regressor_extra = np.load(paths.J_REGRESSOR_EXTRA)
+        if J_regressor_cocoplus is None:
+            J_regressor_cocoplus = np.load(paths.COCOPLUS_REGRESSOR)
+        if J_regressor_h36m is None:
+            J_regressor_h36m = np.load(paths.H36M_REGRESSOR)
+        self.register_buffer('J_regressor_extra', torch.as_tensor(J_regressor_extra,
                                                                   dtype=torch.float32))
-        self.register_buffer('J_regressor_h36m', torch.tensor(J_regressor_h36m,
-                                                              dtype=torch.float32))
+        self._shape_blend_cache = OrderedDict()
+        self.register_buffer('J_regressor_cocoplus', torch.as_tensor(J_regressor_cocoplus,
+                                                                     dtype=torch.float32))
+        self.register_buffer('J_regressor_h36m', torch.as_tensor(J_regressor_h36m,
+                                                                 dtype=torch.float32))
 
     def forward(self, *args, **kwargs):
         kwargs['get_skin'] = True
         smpl_output = super(SMPL, self).forward(*args, **kwargs)
-        extra_joints = vertices2joints(self.J_regressor_extra, smpl_output.vertices)
-        cocoplus_joints = vertices2joints(self.J_regressor_cocoplus, smpl_output.vertices)
-        h36m_joints = vertices2joints(self.J_regressor_h36m, smpl_output.vertices)
-        all_joints = torch.cat([smpl_output.joints, extra_joints, cocoplus_joints,
-                                h36m_joints], dim=1)
         output = SMPLOutput(vertices=smpl_output.vertices,
                             global_orient=smpl_output.global_orient,
                             body_pose=smpl_output.body_pose,
-                            joints=all_joints,
+                            joints=self.get_all_joints(smpl_output.vertices, smpl_output.joints),
                             betas=smpl_output.betas,
                             full_pose=smpl_output.full_pose)
         return output
+
+    def get_all_joints(self, vertices, joints):
+        """
+        Appends the joints of the additional regressors to the SMPL joints.
+        :param vertices: (B, 6890, 3) posed vertices
+        :param joints: (B, 45, 3) SMPL joints, including the vertex-selected joints
+        :return: (B, 90, 3) joints
+        """
+        extra_joints = vertices2joints(self.J_regressor_extra, vertices)
+        cocoplus_joints = vertices2joints(self.J_regressor_cocoplus, vertices)
+        h36m_joints = vertices2joints(self.J_regressor_h36m, vertices)
+        return torch.cat([joints, extra_joints, cocoplus_joints, h36m_joints], dim=1)
+
+    def shape_blend(self, betas, cache=True):
+        """
+        Shaped template, i.e. the T-pose vertices and joints for the given betas. Memoized per betas vector, so
+        repeated calls with the same shape (e.g. posed and reposed meshes of the same prediction) skip the blend shapes
+        and joint regression. Not memoized if gradients w.r.t. betas are required.
+        :param betas: (B, num_betas)
+        :param cache: set to False for betas which are not reused, e.g. samples, to keep them out of the cache.
+        :return: v_shaped: (B, 6890, 3) T-pose vertices
+        :return: J: (B, 24, 3) T-pose joints
+        """
+        if not cache or (betas.requires_grad and torch.is_grad_enabled()):
+            v_shaped = self.v_template + blend_shapes(betas, self.shapedirs)
+            return v_shaped, vertices2joints(self.J_regressor, v_shaped)
+
+        keys = [(str(betas.device), betas.dtype, row.tobytes()) for row in betas.detach().cpu().numpy()]
+        missing = [i for i, key in enumerate(keys) if key not in self._shape_blend_cache]
+        if len(missing) > 0:
+            v_shaped_missing = self.v_template + blend_shapes(betas[missing].detach(), self.shapedirs)
+            J_missing = vertices2joints(self.J_regressor, v_shaped_missing)
+            for i, v_shaped, J in zip(missing, v_shaped_missing, J_missing):
+                self._shape_blend_cache[keys[i]] = (v_shaped, J)
+        for key in keys:
+            self._shape_blend_cache.move_to_end(key)
+        while len(self._shape_blend_cache) > max(self.SHAPE_BLEND_CACHE_SIZE, len(keys)):
+            self._shape_blend_cache.popitem(last=False)
+
+        v_shaped = torch.stack([self._shape_blend_cache[key][0] for key in keys], dim=0)
+        J = torch.stack([self._shape_blend_cache[key][1] for key in keys], dim=0)
+        return v_shaped, J
+
+    def forward_cached(self, betas, body_pose=None, global_orient=None, pose2rot=True, return_joints=True,
+                       cache_shape=True):
+        """
+        Faster alternative to forward for inference and targets, with the same vertices and joints:
+            - The shaped template is taken from shape_blend.
+            - Shape-only: if body_pose and global_orient are None, the T-pose vertices are returned without skinning.
+            - Vertices-only: if return_joints is False, the joints (and additional joint regressors) are skipped.
+            - Shared betas: betas with a batch size of 1 are broadcast over a batch of poses (e.g. pose samples)
+              instead of computing the same shaped template for every pose.
+        :param betas: (1, num_betas) or (B, num_betas)
+        :param body_pose: None, (B, 69) axis-angle or (B, 23, 3, 3) rotation matrices if pose2rot is False
+        :param global_orient: None, (B, 3) axis-angle or (B, 1, 3, 3) rotation matrices if pose2rot is False
+        :param cache_shape: see shape_blend
+        :return: SMPLOutput with vertices (B, 6890, 3), joints (B, 90, 3) or None and betas
+        """
+        assert (body_pose is None) == (global_orient is None), 'body_pose and global_orient must both be given or None'
+        v_shaped, J = self.shape_blend(betas, cache=cache_shape)
+
+        if body_pose is None:
+            vertices = v_shaped
+            joints = J
+        else:
+            full_pose = torch.cat([global_orient, body_pose], dim=1)
+            batch_size = max(betas.shape[0], full_pose.shape[0])
+            if pose2rot:
+                rot_mats = batch_rodrigues(full_pose.reshape(-1, 3)).view(batch_size, -1, 3, 3)
+            else:
+                rot_mats = full_pose.view(batch_size, -1, 3, 3)
+
+            # Pose blend shapes and skinning as in smplx.lbs.lbs, with v_shaped broadcast over the poses
+            ident = torch.eye(3, dtype=v_shaped.dtype, device=v_shaped.device)
+            pose_feature = (rot_mats[:, 1:, :, :] - ident).view(batch_size, -1)
+            pose_offsets = torch.matmul(pose_feature, self.posedirs).view(batch_size, -1, 3)
+            v_posed = pose_offsets + v_shaped
+            joints, A = batch_rigid_transform(rot_mats, J.expand(batch_size, -1, -1), self.parents, dtype=v_shaped.dtype)
+
+            W = self.lbs_weights.unsqueeze(dim=0).expand(batch_size, -1, -1)
+            T = torch.matmul(W, A.view(batch_size, -1, 16)).view(batch_size, -1, 4, 4)
+            vertices = torch.matmul(T[:, :, :3, :3], v_posed.unsqueeze(-1))[:, :, :, 0] + T[:, :, :3, 3]
+
+        all_joints = None
+        if return_joints:
+            joints = self.vertex_joint_selector(vertices, joints)
+            if self.joint_mapper is not None:
+                joints = self.joint_mapper(joints)
+            all_joints = self.get_all_joints(vertices, joints)
+        return SMPLOutput(vertices=vertices,
+                          joints=all_joints,
+                          betas=betas)
@@ -0,0 +1,151 @@
+import os
+import argparse
+import numpy as np
+import torch
+
+from models.pose2D_hrnet import PoseHighResolutionNet
+from configs.poseMF_shapeGaussian_net_config import (
+    get_poseMF_shapeGaussian_cfg_defaults,
+)
+from configs.pose2D_hrnet_config import get_pose2D_hrnet_cfg_defaults
+from configs import paths
+
+from predict.person_detectors import (
+    build_person_detector,
+    TORCHVISION_PERSON_DETECTORS,
+)
+from utils.model_bundle import load_smpl_data, save_model_bundle
+
+
+def pack_model_bundle(
+    bundle_path,
+    pose2D_hrnet_weights_path,
+    pose_shape_weights_template,
+    genders,
+    detectors,
+):
+    """
+    Packs the inference weights of all hp3d models into a single safetensors file, see
+    utils.model_bundle.ModelBundle. Training state (optimizer, epoch, ...) is stripped from the
+    checkpoints and the SMPL .pkl files and joint regressors are stored as plain tensors.
+    :param pose_shape_weights_template: checkpoint path with a {gender} placeholder.
+    :param detectors: torchvision person detectors to pack, their weights are downloaded (or
+    read from the torch hub cache) once here.
+    :return: version hash of the bundle.
+    """
+    tensors = {}
+
+    # HRNet, only the weights the model uses
+    hrnet_model = PoseHighResolutionNet(get_pose2D_hrnet_cfg_defaults())
+    hrnet_checkpoint = torch.load(pose2D_hrnet_weights_path, map_location="cpu")
+    hrnet_model.load_state_dict(hrnet_checkpoint, strict=False)
+    for key, tensor in hrnet_model.state_dict().items():
+        tensors["hrnet." + key] = tensor
+    print("Packed HRNet weights from", pose2D_hrnet_weights_path)
+
+    for detector in detectors:
+        object_detect_model = build_person_detector(name=detector, device="cpu")
+        for key, tensor in object_detect_model.state_dict().items():
+            tensors["detector.{}.{}".format(detector, key)] = tensor
+        print("Packed person detector", detector)
+
+    analytic_svd_genders = []
+    for gender in genders:
+        pose_shape_weights_path = pose_shape_weights_template.format(gender=gender)
+        checkpoint = torch.load(pose_shape_weights_path, map_location="cpu")
+        if checkpoint.get("analytic_svd", False):
+            analytic_svd_genders.append(gender)
+        for key, tensor in checkpoint["best_model_state_dict"].items():
+            tensors["pose_shape.{}.{}".format(gender, key)] = tensor
+        print("Packed Distribution Predictor weights from", pose_shape_weights_path)
+
+        smpl_path = os.path.join(paths.SMPL, "SMPL_{}.pkl".format(gender.upper()))
+        for key, tensor in load_smpl_data(smpl_path).items():
+            tensors["smpl.{}.{}".format(gender, key)] = tensor
+        print("Packed SMPL model from", smpl_path)
+
+    for key, regressor_path in (
+        ("J_regressor_extra", paths.J_REGRESSOR_EXTRA),
+        ("J_regressor_cocoplus", paths.COCOPLUS_REGRESSOR),
+        ("J_regressor_h36m", paths.H36M_REGRESSOR),
+    ):
+        tensors["smpl." + key] = torch.as_tensor(
+            np.load(regressor_path), dtype=torch.float32
+        )
+
+    version = save_model_bundle(
+        bundle_path,
+        tensors,
+        metadata={
+            "genders": ",".join(genders),
+            "detectors": ",".join(detectors),
+            "analytic_svd": ",".join(analytic_svd_genders),
+        },
+    )
+    print(
+        "\nWrote model bundle {} ({:.1f} MB, version {})".format(
+            bundle_path, os.path.getsize(bundle_path) / 2**20, version
+        )
+    )
+    return version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--out",
+        "-O",
+        type=str,
+        default="./model_files/hp3d_inference.safetensors",
+        help="Path of the model bundle to write.",
+    )
+    parser.add_argument(
+        "--pose2D_hrnet_weights",
+        "-W2D",
+        type=str,
+        default="./model_files/pose_hrnet_w48_384x288.pth",
+    )
+    parser.add_argument(
+        "--pose_shape_weights_template",
+        type=str,
+        default="./model_files/poseMF_shapeGaussian_net_weights_{gender}.tar",
+        help="Checkpoint path with a {gender} placeholder.",
+    )
+    parser.add_argument(
+        "--genders",
+        "-G",
+        type=str,
+        nargs="+",
+        default=["male", "female"],
+        choices=["neutral", "male", "female"],
+    )
+    parser.add_argument("--pose_shape_cfg", type=str, default=None)
+    parser.add_argument(
+        "--detectors",
+        "-D",
+        type=str,
+        nargs="*",
+        default=None,
+        choices=TORCHVISION_PERSON_DETECTORS,
+        help="Person detectors to pack, defaults to DATA.BBOX_DETECTOR of the config.",
+    )
+    args = parser.parse_args()
+
+    detectors = args.detectors
+    if detectors is None:
+        pose_shape_cfg = get_poseMF_shapeGaussian_cfg_defaults()
+        if args.pose_shape_cfg is not None:
+            pose_shape_cfg.merge_from_file(args.pose_shape_cfg)
+        detectors = [
+            detector
+            for detector in [pose_shape_cfg.DATA.BBOX_DETECTOR]
+            if detector in TORCHVISION_PERSON_DETECTORS
+        ]
+
+    pack_model_bundle(
+        bundle_path=args.out,
+        pose2D_hrnet_weights_path=args.pose2D_hrnet_weights,
+        pose_shape_weights_template=args.pose_shape_weights_template,
+        genders=args.genders,
+        detectors=detectors,
+    )
@@ -0,0 +1,94 @@
+import torch
+import torchvision
+from torch import nn as nn
+
+from predict.predict_hrnet import predict_hrnet_batch, get_image_joints2D
+
+# torchvision COCO detectors, label 1 is 'person' for all of them
+TORCHVISION_PERSON_DETECTORS = ('maskrcnn_resnet50_fpn',
+                                'fasterrcnn_mobilenet_v3_large_fpn',
+                                'ssdlite320_mobilenet_v3_large')
+PERSON_DETECTORS = TORCHVISION_PERSON_DETECTORS + ('hrnet_heatmap',)
+
+
+class HRNetHeatmapPersonDetector(nn.Module):
+    def __init__(self,
+                 hrnet_model,
+                 hrnet_config,
+                 joint_conf_threshold=0.3,
+                 min_num_joints=4,
+                 box_margin=0.15):
+        """
+        Person detector without a separate detection network: HRNet is run on the entire (padded) image and the box
+        around the confidently detected 2D joints is returned, enlarged by box_margin of its height/width on every side
+        (the joints lie inside the body). Assumes a single person per image.
+        Returns the same boxes/labels/scores as the torchvision detectors, with score 1 for every box found.
+        :param joint_conf_threshold: minimum heatmap confidence of a joint to be part of the box
+        :param min_num_joints: minimum number of confident joints for a box, otherwise no box is returned
+        """
+        super(HRNetHeatmapPersonDetector, self).__init__()
+        self.hrnet_model = hrnet_model
+        self.hrnet_config = hrnet_config
+        self.joint_conf_threshold = joint_conf_threshold
+        self.min_num_joints = min_num_joints
+        self.box_margin = box_margin
+
+    def forward(self, images):
+        """
+        :param images: list of B (3, H, W) tensors, input RGB images
+        :return: list of B dicts with boxes (N, 4) in [x1, y1, x2, y2] (horizontal, vertical) coordinates, labels (N,)
+            and scores (N,), with N = 0 or 1
+        """
+        hrnet_output = predict_hrnet_batch(hrnet_model=self.hrnet_model,
+                                           hrnet_config=self.hrnet_config,
+                                           images=images,
+                                           object_detect_model=None,
+                                           bbox_scale_factor=1.0)
+
+        # 2D joints from HRNet input (crop of entire image) coordinates to image coordinates
+        joints2D = get_image_joints2D(hrnet_output, self.hrnet_config, bbox_scale_factor=1.0)  # (B, K, 2)
+
+        object_preds = []
+        for image, image_joints2D, joints2Dconfs in zip(images, joints2D, hrnet_output['joints2Dconfs']):
+            image_height, image_width = image.shape[1:]
+            confident_joints2D = image_joints2D[joints2Dconfs > self.joint_conf_threshold]  # (num confident joints, 2)
+            if confident_joints2D.shape[0] < self.min_num_joints:
+                boxes = torch.zeros(0, 4, device=image.device)
+            else:
+                top_left, _ = torch.min(confident_joints2D, dim=0)
+                bot_right, _ = torch.max(confident_joints2D, dim=0)
+                margin = (bot_right - top_left) * self.box_margin
+                top_left = torch.clamp(top_left - margin, min=0)
+                bot_right = torch.min(bot_right + margin, torch.tensor([image_width, image_height], device=image.device, dtype=torch.float32))
+                boxes = torch.cat([top_left, bot_right])[None, :]  # (1, 4)
+            object_preds.append({'boxes': boxes,
+                                 'labels': torch.ones(boxes.shape[0], device=image.device, dtype=torch.int64),
+                                 'scores': torch.ones(boxes.shape[0], device=image.device)})
+        return object_preds
+
+
+def build_person_detector(name, device, hrnet_model=None, hrnet_config=None, state_dict=None, allow_download=True):
+    """
+    :param name: one of PERSON_DETECTORS, the torchvision detection model or 'hrnet_heatmap'
+    :param hrnet_model: HRNet used by the 'hrnet_heatmap' detector
+    :param state_dict: weights of the torchvision detector, which are downloaded (or read from the torch hub cache)
+        if not given
+    :param allow_download: if False, state_dict is required for the torchvision detectors, e.g. when loading from a
+        model bundle, which must not depend on the network at runtime
+    :return: detector, called on a list of (3, H, W) RGB images and returning a list of dicts with
+        boxes (N, 4), labels (N,) and scores (N,) for each image
+    """
+    if name == 'hrnet_heatmap':
+        assert hrnet_model is not None and hrnet_config is not None, 'hrnet_heatmap detector needs the HRNet model'
+        return HRNetHeatmapPersonDetector(hrnet_model=hrnet_model,
+                                          hrnet_config=hrnet_config).to(device)
+    if name not in TORCHVISION_PERSON_DETECTORS:
+        raise ValueError('Unknown person detector {}, choose from {}'.format(name, ', '.join(PERSON_DETECTORS)))
+    if state_dict is None:
+        if not allow_download:
+            raise ValueError('No weights given for person detector {}, re-pack the model bundle with '
+                             'pack_model_bundle.py'.format(name))
+        return getattr(torchvision.models.detection, name)(pretrained=True).to(device)
+    object_detect_model = getattr(torchvision.models.detection, name)(weights=None, weights_backbone=None)
+    object_detect_model.load_state_dict(state_dict)
+    return object_detect_model.to(device)
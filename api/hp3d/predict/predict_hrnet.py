@@ -30,27 +30,14 @@ def get_kp_locations_confs_from_heatmaps(batch_heatmaps):
     return pred_kps, max_confs
 
 
-def predict_hrnet(hrnet_model,
-                  hrnet_config,
-                  image,
-                  object_detect_model=None,
-                  object_detect_threshold=0.8,
-                  bbox_scale_factor=1.2):
+def get_person_bbox(image, object_pred=None, object_detect_threshold=0.8):
     """
-    :param hrnet_model:
-    :param object_detect_model:
     :param image: (3, H, W) tensor, input RGB image
-    :return: joints2D: (K, 2) tensor, 2D joint locations predicted by HRNet
-    :return: joints2Dconfs: (K,) tensor, 2D joint confidences predicted by HRNet
-    :return: bbox_centre, bbox_height, bbox_width: bounding box centre, height and width
-
+    :param object_pred: object detector prediction for the image, or None to use the entire image
+    :return: bbox_centre, bbox_height, bbox_width: centre-most person bounding box in (vert, hor) coordinates
     """
     image_height, image_width = image.shape[1:]
-    if object_detect_model is not None:
-        # Detecting object bounding boxes in input image
-        # Bounding boxes are in (hor, vert) coordinates
-        object_pred = object_detect_model(image[None, :, :, :])[0]
-
+    if object_pred is not None:
         # Select person bounding boxes with score > object detect threshold.
         pred_human_boxes = object_pred['boxes'][object_pred['labels'] == 1]  # 1 is COCO index for 'person' class
         pred_human_scores = object_pred['scores'][object_pred['labels'] == 1]
@@ -64,56 +51,211 @@ def predict_hrnet(hrnet_model,
             pred_centre = all_pred_centres[torch.argmin(centre_dists), :]
             pred_height = all_pred_heights[torch.argmin(centre_dists)]
             pred_width = all_pred_widths[torch.argmin(centre_dists)]
-        else:
-            try:
-                pred_centre = all_pred_centres[0]
-                pred_height = all_pred_heights[0]
-                pred_width = all_pred_widths[0]
-            except IndexError:
-                print("Could not find person bounding box - using entire image!")
-                pred_centre = torch.tensor(image.shape[1:], device=image.device, dtype=torch.float32) * 0.5
-                pred_height = torch.tensor(image_height, device=image.device, dtype=torch.float32)
-                pred_width = torch.tensor(image_width, device=image.device, dtype=torch.float32)
-    else:
-        pred_centre = torch.tensor(image.shape[1:], device=image.device, dtype=torch.float32) * 0.5
-        pred_height = torch.tensor(image_height, device=image.device, dtype=torch.float32)
-        pred_width = torch.tensor(image_width, device=image.device, dtype=torch.float32)
+            return pred_centre, pred_height, pred_width
+        elif pred_human_boxes.shape[0] == 1:
+            return all_pred_centres[0], all_pred_heights[0], all_pred_widths[0]
+        print("Could not find person bounding box - using entire image!")
+
+    pred_centre = torch.tensor(image.shape[1:], device=image.device, dtype=torch.float32) * 0.5
+    pred_height = torch.tensor(image_height, device=image.device, dtype=torch.float32)
+    pred_width = torch.tensor(image_width, device=image.device, dtype=torch.float32)
+    return pred_centre, pred_height, pred_width
 
+
+def get_bbox_hint_object_pred(image, bbox_hint):
+    """
+    :param image: (3, H, W) tensor, input RGB image
+    :param bbox_hint: [x1, y1, x2, y2] person bounding box given as fractions of the image width/height,
+        [0, 0, 1, 1] for an image already cropped around the person
+    :return: object detector style prediction with the hint as the only person box
+    """
+    image_height, image_width = image.shape[1:]
+    box = torch.tensor(bbox_hint, device=image.device, dtype=torch.float32)
+    box = box * torch.tensor([image_width, image_height, image_width, image_height], device=image.device, dtype=torch.float32)
+    return {'boxes': box[None, :],
+            'labels': torch.ones(1, device=image.device, dtype=torch.int64),
+            'scores': torch.ones(1, device=image.device)}
+
+
+def crop_hrnet_inputs(hrnet_config,
+                      images,
+                      object_preds,
+                      object_detect_threshold=0.8,
+                      bbox_scale_factor=1.2):
+    """
+    Crops each image to its centre-most person bounding box, resized to the HRNet input size.
+    :param images: list of B (3, H, W) tensors, input RGB images (may differ in size)
+    :param object_preds: list of B object detector predictions, None to use the entire image
+    :return: cropped_image: (B, 3, 384, 288) tensor, RGB crops (not normalised)
+    :return: bbox_centre, bbox_height, bbox_width: (B, 2), (B,) and (B,) bounding box centres, heights and widths
+    """
     # Convert box to be same aspect ratio as HrNet input
     aspect_ratio = float(hrnet_config.MODEL.IMAGE_SIZE[1]) / float(hrnet_config.MODEL.IMAGE_SIZE[0])
-    if pred_height > pred_width * aspect_ratio:
-        pred_width = pred_height / aspect_ratio
-    elif pred_height < pred_width * aspect_ratio:
-        pred_height = pred_width * aspect_ratio
-
-    # Crop input image to centre-most person box + resize to 384x288 for HRNet input.
-    image = batch_crop_pytorch_affine(input_wh=(image_width, image_height),
-                                      output_wh=(hrnet_config.MODEL.IMAGE_SIZE[0], hrnet_config.MODEL.IMAGE_SIZE[1]),
-                                      num_to_crop=1,
-                                      device=image.device,
-                                      rgb=image[None, :, :, :],
-                                      bbox_centres=pred_centre[None, :],
-                                      bbox_heights=pred_height[None],
-                                      bbox_widths=pred_width[None],
-                                      orig_scale_factor=bbox_scale_factor)['rgb'][0]  # (3, 384, 288)
+    cropped_images, pred_centres, pred_heights, pred_widths = [], [], [], []
+    for image, object_pred in zip(images, object_preds):
+        image_height, image_width = image.shape[1:]
+        pred_centre, pred_height, pred_width = get_person_bbox(image=image,
+                                                               object_pred=object_pred,
+                                                               object_detect_threshold=object_detect_threshold)
+        if pred_height > pred_width * aspect_ratio:
+            pred_width = pred_height / aspect_ratio
+        elif pred_height < pred_width * aspect_ratio:
+            pred_height = pred_width * aspect_ratio
 
-    # Predict 2D joint heatmaps using HRNet
+        # Crop input image to centre-most person box + resize to 384x288 for HRNet input.
+        # Images differ in size, so they are cropped one by one.
+        cropped_images.append(batch_crop_pytorch_affine(input_wh=(image_width, image_height),
+                                                        output_wh=(hrnet_config.MODEL.IMAGE_SIZE[0], hrnet_config.MODEL.IMAGE_SIZE[1]),
+                                                        num_to_crop=1,
+                                                        device=image.device,
+                                                        rgb=image[None, :, :, :],
+                                                        bbox_centres=pred_centre[None, :],
+                                                        bbox_heights=pred_height[None],
+                                                        bbox_widths=pred_width[None],
+                                                        orig_scale_factor=bbox_scale_factor)['rgb'][0])  # (3, 384, 288)
+        pred_centres.append(pred_centre)
+        pred_heights.append(pred_height)
+        pred_widths.append(pred_width)
+
+    return {'cropped_image': torch.stack(cropped_images, dim=0),  # (B, 3, 384, 288)
+            'bbox_centre': torch.stack(pred_centres, dim=0),
+            'bbox_height': torch.stack(pred_heights, dim=0),
+            'bbox_width': torch.stack(pred_widths, dim=0)}
+
+
+def normalise_hrnet_input(cropped_images):
+    """
+    :param cropped_images: (B, 3, 384, 288) tensor, RGB crops in [0, 1]
+    :return: HRNet input, normalised with the ImageNet mean and std
+    """
     transform = transforms.Normalize(mean=[0.485, 0.456, 0.406],
                                      std=[0.229, 0.224, 0.225])
-    pred_heatmaps = hrnet_model(transform(image)[None, :, :, :])  # (1, 17, 96, 72)
+    return transform(cropped_images)
+
+
+def crop_and_predict_hrnet(hrnet_model,
+                           hrnet_config,
+                           images,
+                           object_preds,
+                           object_detect_threshold=0.8,
+                           bbox_scale_factor=1.2):
+    """
+    Crops each image to its centre-most person bounding box and runs HRNet once on all crops.
+    :param images: list of B (3, H, W) tensors, input RGB images (may differ in size)
+    :param object_preds: list of B object detector predictions, None to use the entire image
+    :return: same outputs as predict_hrnet_batch
+    """
+    crop_output = crop_hrnet_inputs(hrnet_config=hrnet_config,
+                                    images=images,
+                                    object_preds=object_preds,
+                                    object_detect_threshold=object_detect_threshold,
+                                    bbox_scale_factor=bbox_scale_factor)
+
+    # Predict 2D joint heatmaps using HRNet
+    pred_heatmaps = hrnet_model(normalise_hrnet_input(crop_output['cropped_image']))  # (B, 17, 96, 72)
     pred_joints2D, pred_joints2Dconfs = get_kp_locations_confs_from_heatmaps(pred_heatmaps)
 
     # Rescale 2D joint locations back to HRNet input size
     pred_joints2D *= hrnet_config.MODEL.IMAGE_SIZE[0] / hrnet_config.MODEL.HEATMAP_SIZE[0]
 
-    output = {'joints2D': pred_joints2D[0],
-              'joints2Dconfs': pred_joints2Dconfs[0],
-              'cropped_image': image,
-              'bbox_centre': pred_centre,
-              'bbox_height': pred_height,
-              'bbox_width': pred_width}
+    output = {'joints2D': pred_joints2D,
+              'joints2Dconfs': pred_joints2Dconfs}
+    output.update(crop_output)
+
+    return output
+
+
+def get_image_joints2D(hrnet_output, hrnet_config, bbox_scale_factor=1.2):
+    """
+    :param hrnet_output: output of predict_hrnet_batch
+    :param bbox_scale_factor: bbox_scale_factor given to predict_hrnet_batch
+    :return: (B, K, 2) tensor, 2D joint locations predicted by HRNet in (hor, vert) input image coordinates
+    """
+    hrnet_input_wh = torch.tensor(hrnet_config.MODEL.IMAGE_SIZE, device=hrnet_output['joints2D'].device, dtype=torch.float32)
+    crop_whs = torch.stack([hrnet_output['bbox_width'], hrnet_output['bbox_height']], dim=-1) * bbox_scale_factor  # (B, 2)
+    return hrnet_output['bbox_centre'][:, None, [1, 0]] + (hrnet_output['joints2D'] - hrnet_input_wh * 0.5) * (crop_whs / hrnet_input_wh)[:, None, :]
+
+
+def predict_hrnet_batch(hrnet_model,
+                        hrnet_config,
+                        images,
+                        object_detect_model=None,
+                        object_detect_threshold=0.8,
+                        bbox_scale_factor=1.2,
+                        bbox_hints=None,
+                        bbox_hint_min_joint_conf=0.5):
+    """
+    Batched version of predict_hrnet: the object detector and HRNet each run once on all images.
+    Images with a bounding box hint skip the object detector. If the mean HRNet joint confidence of such an image is
+    below bbox_hint_min_joint_conf, the hint is not trusted and the image is predicted again with the object detector.
+    :param images: list of B (3, H, W) tensors, input RGB images (may differ in size)
+    :param bbox_hints: list of B person bounding box hints, see get_bbox_hint_object_pred, None for no hint
+    :return: joints2D: (B, K, 2) tensor, 2D joint locations predicted by HRNet
+    :return: joints2Dconfs: (B, K) tensor, 2D joint confidences predicted by HRNet
+    :return: cropped_image: (B, 3, 384, 288) tensor, HRNet inputs
+    :return: bbox_centre, bbox_height, bbox_width: (B, 2), (B,) and (B,) bounding box centres, heights and widths
+    """
+    if bbox_hints is None:
+        bbox_hints = [None] * len(images)
+    object_preds = [None if bbox_hint is None else get_bbox_hint_object_pred(image, bbox_hint)
+                    for image, bbox_hint in zip(images, bbox_hints)]
+    if object_detect_model is not None:
+        # Detecting object bounding boxes in all input images without hint at once
+        # Bounding boxes are in (hor, vert) coordinates
+        detect_indices = [i for i, bbox_hint in enumerate(bbox_hints) if bbox_hint is None]
+        if len(detect_indices) > 0:
+            detected_preds = object_detect_model([images[i] for i in detect_indices])
+            for i, object_pred in zip(detect_indices, detected_preds):
+                object_preds[i] = object_pred
+
+    output = crop_and_predict_hrnet(hrnet_model=hrnet_model,
+                                    hrnet_config=hrnet_config,
+                                    images=images,
+                                    object_preds=object_preds,
+                                    object_detect_threshold=object_detect_threshold,
+                                    bbox_scale_factor=bbox_scale_factor)
+
+    if object_detect_model is not None:
+        # Fall back to the object detector for hinted images where HRNet is not confident
+        hinted = torch.tensor([bbox_hint is not None for bbox_hint in bbox_hints], device=output['joints2Dconfs'].device)
+        redetect_indices = torch.nonzero(hinted & (output['joints2Dconfs'].mean(dim=1) < bbox_hint_min_joint_conf))[:, 0].tolist()
+        if len(redetect_indices) > 0:
+            print('Low joint confidence with bounding box hint - detecting person in {} image(s)!'.format(len(redetect_indices)))
+            redetect_images = [images[i] for i in redetect_indices]
+            redetect_output = crop_and_predict_hrnet(hrnet_model=hrnet_model,
+                                                     hrnet_config=hrnet_config,
+                                                     images=redetect_images,
+                                                     object_preds=object_detect_model(redetect_images),
+                                                     object_detect_threshold=object_detect_threshold,
+                                                     bbox_scale_factor=bbox_scale_factor)
+            for key in output:
+                output[key][redetect_indices] = redetect_output[key]
 
     return output
 
 
+def predict_hrnet(hrnet_model,
+                  hrnet_config,
+                  image,
+                  object_detect_model=None,
+                  object_detect_threshold=0.8,
+                  bbox_scale_factor=1.2,
+                  bbox_hint=None):
+    """
+    :param hrnet_model:
+    :param object_detect_model:
+    :param image: (3, H, W) tensor, input RGB image
+    :return: joints2D: (K, 2) tensor, 2D joint locations predicted by HRNet
+    :return: joints2Dconfs: (K,) tensor, 2D joint confidences predicted by HRNet
+    :return: bbox_centre, bbox_height, bbox_width: bounding box centre, height and width
+
+    """
+    output = predict_hrnet_batch(hrnet_model=hrnet_model,
+                                 hrnet_config=hrnet_config,
+                                 images=[image],
+                                 object_detect_model=object_detect_model,
+                                 object_detect_threshold=object_detect_threshold,
+                                 bbox_scale_factor=bbox_scale_factor,
+                                 bbox_hints=[bbox_hint])
 
+    return {key: value[0] for key, value in output.items()}
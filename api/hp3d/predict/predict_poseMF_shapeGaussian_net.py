@@ -1,12 +1,16 @@
 import os
+import time
+import queue
+import threading
 import numpy as np
 import torch
 import cv2
 import matplotlib.pyplot as plt
 from tqdm import tqdm
+from torch.distributions import Normal
 from smplx.lbs import batch_rodrigues
 
-from predict.predict_hrnet import predict_hrnet
+from predict.predict_hrnet import predict_hrnet_batch
 
 from renderers.pytorch3d_textured_renderer import TexturedIUVRenderer
 
@@ -16,30 +20,31 @@ from utils.image_utils import (
     batch_crop_opencv_affine,
 )
 from utils.label_conversions import convert_2Djoints_to_gaussian_heatmaps_torch
-from utils.rigid_transform_utils import (
-    rot6d_to_rotmat,
-    aa_rotate_translate_points_pytorch3d,
-)
+from utils.mesh_writer import MESH_FORMATS, get_mesh_writer
+from utils.smpl_params import encode_smpl_params
+from utils.rigid_transform_utils import rot6d_to_rotmat
 from utils.sampling_utils import (
     compute_vertex_uncertainties_by_poseMF_shapeGaussian_sampling,
     joints2D_error_sorted_verts_sampling,
 )
 
+OUTPUTS = ("mesh", "vis", "samples", "params")
+# Views of the visualisation figure: the mode rotated by 0°, 90°, 180° and 270° about the
+# vertical axis and the reposed mean rotated by 0° and 90°
+NUM_VIS_VIEWS = 6
+
 
-def save_mesh_as_obj(out_path, vertices, faces):
+def save_mesh_as_obj(out_path, vertices, faces, smooth=False):
     """
     Saves vertex mesh as obj file.
     :param out_path: path to save obj file.
     :param vertices: (num vertices, 3) numpy array of 3D vertices
     :param faces: (num faces, 3) numpy array, each row contains ordered
     indices of vertices belonging to that face.
+    :param smooth: if True, writes per-vertex normals and the faces in a smoothing group, so the
+    mesh is shaded smooth without post-processing it in Blender.
     """
-    with open(out_path, "w") as fp:
-        for v in vertices:
-            fp.write("v %f %f %f\n" % (v[0], v[1], v[2]))
-        if not (faces is None):
-            for f in faces + 1:
-                fp.write("f %d %d %d\n" % (f[0], f[1], f[2]))
+    get_mesh_writer(faces).write(out_path, vertices, file_format="obj", smooth=smooth)
 
 
 def scale_smpl_to_real_height(neutral_vertices, posed_vertices, height):
@@ -56,6 +61,641 @@ def scale_smpl_to_real_height(neutral_vertices, posed_vertices, height):
     return scaled_vertices
 
 
+def prefetch_image_batches(image_dir, image_fnames, batch_size, num_prefetch=2):
+    """
+    Loads and decodes images in a background thread, so reading the next batch overlaps with the
+    prediction of the current one.
+    :param image_dir: directory of the images.
+    :param image_fnames: filenames of the images to load, in order.
+    :param batch_size: number of images per batch.
+    :param num_prefetch: number of batches loaded ahead.
+    :return: generator of (filenames, list of (H, W, 3) RGB numpy images) per batch.
+    """
+    batches = queue.Queue(maxsize=num_prefetch)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def load():
+        try:
+            for start in range(0, len(image_fnames), batch_size):
+                batch_fnames = image_fnames[start : start + batch_size]
+                batch_images = [
+                    cv2.cvtColor(
+                        cv2.imread(os.path.join(image_dir, image_fname)),
+                        cv2.COLOR_BGR2RGB,
+                    )
+                    for image_fname in batch_fnames
+                ]
+                put((batch_fnames, batch_images))
+        except Exception as e:
+            put(e)
+            return
+        put(None)
+
+    threading.Thread(target=load, name="image-prefetch", daemon=True).start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+    finally:
+        stop.set()
+
+
+def setup_body_vis_renderer(device, visualise_wh=512):
+    """
+    Sets up the body visualisation renderer together with its lights, fixed camera and the
+    rotations of the rendered views. The renderer is built for a batch of NUM_VIS_VIEWS views,
+    so all views of the visualisation figure are rendered in a single call.
+    :return: dict with the renderer and its settings, see visualise_prediction.
+    """
+    body_vis_renderer = TexturedIUVRenderer(
+        device=device,
+        batch_size=NUM_VIS_VIEWS,
+        img_wh=visualise_wh,
+        projection_type="orthographic",
+        render_rgb=True,
+        bin_size=32,
+    )
+    lights_rgb_settings = {
+        "location": torch.tensor(
+            [[0.0, -0.8, -2.0]], device=device, dtype=torch.float32
+        ),
+        "ambient_color": 0.5
+        * torch.ones(1, 3, device=device, dtype=torch.float32),
+        "diffuse_color": 0.3
+        * torch.ones(1, 3, device=device, dtype=torch.float32),
+        "specular_color": torch.zeros(
+            1, 3, device=device, dtype=torch.float32
+        ),
+    }
+    fixed_cam_t = torch.tensor([[0.0, -0.2, 2.5]], device=device)
+    fixed_orthographic_scale = torch.tensor([[0.95, 0.95]], device=device)
+
+    # Vertices are flipped about the x-axis so that they project the right way up, then rotated
+    # by 0°, 90°, 180° and 270° about the vertical axis for visualisation.
+    flip = cv2.Rodrigues(np.array([np.pi, 0.0, 0.0]))[0]
+    view_rotmats = np.stack(
+        [
+            np.matmul(cv2.Rodrigues(np.array([0.0, -angle, 0.0]))[0], flip)
+            for angle in (0.0, np.pi / 2.0, np.pi, 3.0 * np.pi / 2.0)
+        ],
+        axis=0,
+    )
+
+    return {
+        "renderer": body_vis_renderer,
+        "lights_rgb_settings": lights_rgb_settings,
+        "fixed_cam_t": fixed_cam_t,
+        "fixed_orthographic_scale": fixed_orthographic_scale,
+        "view_rotmats": torch.from_numpy(view_rotmats).float().to(device),
+    }
+
+
+def render_body_views(vis_setup, vertices, cam_t, orthographic_scale, verts_features):
+    """
+    Renders a batch of views with the body visualisation renderer, in chunks of NUM_VIS_VIEWS
+    views. The last chunk is padded with copies of the last view.
+    :param vis_setup: renderer and settings from setup_body_vis_renderer.
+    :param vertices: (num views, 6890, 3) vertices of each view.
+    :param cam_t: (num views, 3) camera translation of each view.
+    :param orthographic_scale: (num views, 2) orthographic scale of each view.
+    :param verts_features: (num views, 6890, 3) vertex colours of each view.
+    :return: dict with the (num views, img_wh, img_wh, 3) rgb_images and iuv_images.
+    """
+    num_views = vertices.shape[0]
+    rgb_images, iuv_images = [], []
+    for start in range(0, num_views, NUM_VIS_VIEWS):
+        views = torch.arange(start, start + NUM_VIS_VIEWS, device=vertices.device)
+        views = views.clamp(max=num_views - 1)
+        body_vis_output = vis_setup["renderer"](
+            vertices=vertices[views],
+            cam_t=cam_t[views],
+            orthographic_scale=orthographic_scale[views],
+            lights_rgb_settings=vis_setup["lights_rgb_settings"],
+            verts_features=verts_features[views],
+        )
+        rgb_images.append(body_vis_output["rgb_images"])
+        iuv_images.append(body_vis_output["iuv_images"])
+    return {
+        "rgb_images": torch.cat(rgb_images, dim=0)[:num_views],
+        "iuv_images": torch.cat(iuv_images, dim=0)[:num_views],
+    }
+
+
+def visualise_prediction(
+    vis_setup,
+    smpl_model,
+    pose_shape_cfg,
+    device,
+    save_dir,
+    image_fname,
+    orig_image,
+    hrnet_output,
+    cropped_for_proxy,
+    proxy_rep_input,
+    pred_pose_U,
+    pred_pose_S,
+    pred_pose_V,
+    pred_vertices_mode,
+    pred_shape_dist,
+    pred_glob_rotmats,
+    pred_cam_wp,
+    visualise_wh=512,
+    visualise=True,
+    visualise_uncropped=True,
+    visualise_samples=False,
+):
+    """
+    Renders and saves the visualisation figure and/or the samples figure of a single prediction.
+    All prediction tensors have a batch size of 1, hrnet_output is the output of predict_hrnet
+    for the image.
+    :param vis_setup: renderer and settings from setup_body_vis_renderer.
+    """
+    fixed_cam_t = vis_setup["fixed_cam_t"]
+    fixed_orthographic_scale = vis_setup["fixed_orthographic_scale"]
+    view_rotmats = vis_setup["view_rotmats"]  # (4, 3, 3)
+
+    # Shaped template is cached from the mode prediction
+    pred_reposed_vertices_mean = smpl_model.forward_cached(
+        betas=pred_shape_dist.loc, return_joints=False
+    ).vertices  # (1, 6890, 3)
+    # Flipping and rotating the mode by 0°, 90°, 180° and 270° and the reposed mean by 0° and 90°
+    # for visualisation, all views in one batched rotation.
+    vis_vertices = torch.einsum(
+        "bij,bkj->bki",
+        torch.cat([view_rotmats, view_rotmats[:2]], dim=0),
+        torch.cat(
+            [
+                pred_vertices_mode.expand(4, -1, -1),
+                pred_reposed_vertices_mean.expand(2, -1, -1),
+            ],
+            dim=0,
+        ),
+    )  # (NUM_VIS_VIEWS, 6890, 3)
+
+    # -------------------------------------- VISUALISATION --------------------------------------
+    # Predicted camera corresponding to proxy rep input
+    orthographic_scale = pred_cam_wp[:, [0, 0]]
+    cam_t = torch.cat(
+        [
+            pred_cam_wp[:, 1:],
+            torch.ones(pred_cam_wp.shape[0], 1, device=device).float() * 2.5,
+        ],
+        dim=-1,
+    )
+
+    # Estimate per-vertex uncertainty (variance) by sampling SMPL poses/shapes and computing corresponding vertex meshes
+    per_vertex_3Dvar, pred_vertices_samples, pred_joints_samples = (
+        compute_vertex_uncertainties_by_poseMF_shapeGaussian_sampling(
+            pose_U=pred_pose_U,
+            pose_S=pred_pose_S,
+            pose_V=pred_pose_V,
+            shape_distribution=pred_shape_dist,
+            glob_rotmats=pred_glob_rotmats,
+            num_samples=50,
+            smpl_model=smpl_model,
+            use_mean_shape=True,
+        )
+    )
+
+    if visualise_samples:
+        num_samples = 8
+        # Prepare vertex samples for visualisation
+        pred_vertices_samples = joints2D_error_sorted_verts_sampling(
+            pred_vertices_samples=pred_vertices_samples,
+            pred_joints_samples=pred_joints_samples,
+            input_joints2D_heatmaps=proxy_rep_input[:, 1:, :, :],
+            pred_cam_wp=pred_cam_wp,
+        )[
+            :num_samples, :, :
+        ]  # (8, 6890, 3)
+        # Flipped and flipped + rotated 90° views of the mode and each sample, interleaved
+        pred_vertices_samples = torch.einsum(
+            "vij,bkj->bvki", view_rotmats[:2], pred_vertices_samples
+        )  # (8, 2, 6890, 3)
+        pred_vertices_samples = torch.cat(
+            [vis_vertices[None, :2], pred_vertices_samples], dim=0
+        )  # (9, 2, 6890, 3)
+        pred_vertices_samples = pred_vertices_samples.reshape(
+            2 * (num_samples + 1), -1, 3
+        )  # (18, 6890, 3)
+
+    # Generate per-vertex uncertainty colourmap
+    vertex_var_norm = plt.Normalize(vmin=0.0, vmax=0.2, clip=True)
+    vertex_var_colours = plt.cm.jet(
+        vertex_var_norm(per_vertex_3Dvar.cpu().detach().numpy())
+    )[:, :3]
+    vertex_var_colours = (
+        torch.from_numpy(vertex_var_colours[None, :, :]).to(device).float()
+    )
+
+    cropped_for_proxy_rgb = torch.nn.functional.interpolate(
+        cropped_for_proxy["rgb"],
+        size=(visualise_wh, visualise_wh),
+        mode="bilinear",
+        align_corners=False,
+    )
+    vis_save_path = os.path.join(save_dir, image_fname)
+
+    plain_verts_features = torch.full_like(vertex_var_colours, 0.7)
+
+    if visualise:
+        # Render all views of the visualisation in one batch, the mode with the predicted camera
+        # corresponding to the proxy rep input and the other views with the fixed camera.
+        body_vis_output = render_body_views(
+            vis_setup,
+            vertices=vis_vertices,
+            cam_t=torch.cat([cam_t, fixed_cam_t.expand(5, -1)], dim=0),
+            orthographic_scale=torch.cat(
+                [orthographic_scale, fixed_orthographic_scale.expand(5, -1)], dim=0
+            ),
+            verts_features=torch.cat(
+                [
+                    vertex_var_colours.expand(4, -1, -1),
+                    plain_verts_features.expand(2, -1, -1),
+                ],
+                dim=0,
+            ),
+        )
+        body_vis_rgb = body_vis_output["rgb_images"].permute(0, 3, 1, 2)
+        body_vis_iuv = body_vis_output["iuv_images"].permute(0, 3, 1, 2)
+        body_vis_rgb_with_background = batch_add_rgb_background(
+            backgrounds=cropped_for_proxy_rgb,
+            rgb=body_vis_rgb[:1],
+            seg=body_vis_iuv[:1, 0].round(),
+        )
+        # Single transfer to the host of everything the figure and the uncropped visualisation need
+        vis_images = (
+            torch.cat(
+                [
+                    cropped_for_proxy_rgb,
+                    body_vis_rgb_with_background,
+                    body_vis_rgb[1:],
+                    body_vis_rgb[:1],
+                    body_vis_iuv[:1],
+                ],
+                dim=0,
+            )
+            .cpu()
+            .detach()
+            .numpy()
+        )
+        cropped_for_proxy_vis = vis_images[0].transpose(1, 2, 0)
+        body_vis_rgb = vis_images[1 : 1 + NUM_VIS_VIEWS].transpose(0, 2, 3, 1)
+
+        # Combine all visualisations
+        combined_vis_rows = 2
+        combined_vis_cols = 4
+        combined_vis_fig = np.zeros(
+            (
+                combined_vis_rows * visualise_wh,
+                combined_vis_cols * visualise_wh,
+                3,
+            ),
+            dtype=vis_images.dtype,
+        )
+        # Cropped input image
+        combined_vis_fig[:visualise_wh, :visualise_wh] = cropped_for_proxy_vis
+
+        # Proxy representation + 2D joints scatter + 2D joints confidences
+        proxy_rep_input = proxy_rep_input[0].sum(dim=0).cpu().detach().numpy()
+        proxy_rep_input = np.stack(
+            [proxy_rep_input] * 3, axis=-1
+        )  # single-channel to RGB
+        proxy_rep_input = cv2.resize(
+            proxy_rep_input, (visualise_wh, visualise_wh)
+        )
+        for joint_num in range(cropped_for_proxy["joints2D"].shape[1]):
+            hor_coord = (
+                cropped_for_proxy["joints2D"][0, joint_num, 0].item()
+                * visualise_wh
+                / pose_shape_cfg.DATA.PROXY_REP_SIZE
+            )
+            ver_coord = (
+                cropped_for_proxy["joints2D"][0, joint_num, 1].item()
+                * visualise_wh
+                / pose_shape_cfg.DATA.PROXY_REP_SIZE
+            )
+            cv2.circle(
+                proxy_rep_input,
+                (int(hor_coord), int(ver_coord)),
+                radius=3,
+                color=(255, 0, 0),
+                thickness=-1,
+            )
+            cv2.putText(
+                proxy_rep_input,
+                str(joint_num),
+                (int(hor_coord + 4), int(ver_coord + 4)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.6,
+                (255, 0, 0),
+                lineType=2,
+            )
+            cv2.putText(
+                proxy_rep_input,
+                str(joint_num)
+                + " {:.2f}".format(
+                    hrnet_output["joints2Dconfs"][joint_num].item()
+                ),
+                (10, 16 * (joint_num + 1)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.6,
+                (255, 0, 0),
+                lineType=2,
+            )
+        combined_vis_fig[visualise_wh : 2 * visualise_wh, :visualise_wh] = (
+            proxy_rep_input
+        )
+
+        # Posed 3D body (mode and rotated by 90°, 180° and 270°), then T-pose 3D body (reposed
+        # mean and rotated by 90°), down rows then across columns
+        for view in range(NUM_VIS_VIEWS):
+            row = (view + 2) % combined_vis_rows
+            col = (view + 2) // combined_vis_rows
+            combined_vis_fig[
+                row * visualise_wh : (row + 1) * visualise_wh,
+                col * visualise_wh : (col + 1) * visualise_wh,
+            ] = body_vis_rgb[view]
+        cv2.imwrite(vis_save_path, combined_vis_fig[:, :, ::-1] * 255)
+
+        if visualise_uncropped:
+            # Uncropped visualisation by projecting 3D body onto original image
+            rgb_to_uncrop = vis_images[[1 + NUM_VIS_VIEWS]]
+            iuv_to_uncrop = vis_images[[2 + NUM_VIS_VIEWS]]
+            bbox_centres = (
+                hrnet_output["bbox_centre"][None].cpu().detach().numpy()
+            )
+            bbox_whs = (
+                torch.max(
+                    hrnet_output["bbox_height"], hrnet_output["bbox_width"]
+                )[None]
+                .cpu()
+                .detach()
+                .numpy()
+            )
+            bbox_whs *= pose_shape_cfg.DATA.BBOX_SCALE_FACTOR
+            uncropped_for_visualise = batch_crop_opencv_affine(
+                output_wh=(visualise_wh, visualise_wh),
+                num_to_crop=1,
+                rgb=rgb_to_uncrop,
+                iuv=iuv_to_uncrop,
+                bbox_centres=bbox_centres,
+                bbox_whs=bbox_whs,
+                uncrop=True,
+                uncrop_wh=(orig_image.shape[1], orig_image.shape[0]),
+            )
+            uncropped_rgb = (
+                uncropped_for_visualise["rgb"][0].transpose(1, 2, 0) * 255
+            )
+            uncropped_seg = uncropped_for_visualise["iuv"][0, 0, :, :]
+            background_pixels = (
+                uncropped_seg[:, :, None] == 0
+            )  # Body pixels are > 0
+            uncropped_rgb_with_background = (
+                uncropped_rgb * (np.logical_not(background_pixels))
+                + orig_image * background_pixels
+            )
+
+            uncropped_vis_save_path = (
+                os.path.splitext(vis_save_path)[0] + "_uncrop.png"
+            )
+            cv2.imwrite(
+                uncropped_vis_save_path,
+                uncropped_rgb_with_background[:, :, ::-1],
+            )
+
+    if visualise_samples:
+        samples_rows = 3
+        samples_cols = 6
+        samples_fig = np.zeros(
+            (samples_rows * visualise_wh, samples_cols * visualise_wh, 3),
+            dtype=np.float32,
+        )
+        # Flipped views with the predicted camera and the background, rotated 90° views with the
+        # fixed camera, rendered in batches of NUM_VIS_VIEWS
+        num_views = pred_vertices_samples.shape[0]
+        body_vis_output_samples = render_body_views(
+            vis_setup,
+            vertices=pred_vertices_samples,
+            cam_t=torch.cat([cam_t, fixed_cam_t], dim=0).repeat(num_samples + 1, 1),
+            orthographic_scale=torch.cat(
+                [orthographic_scale, fixed_orthographic_scale], dim=0
+            ).repeat(num_samples + 1, 1),
+            verts_features=plain_verts_features.expand(num_views, -1, -1),
+        )
+        body_vis_rgb_samples = body_vis_output_samples["rgb_images"].permute(0, 3, 1, 2)
+        body_vis_rgb_samples[::2] = batch_add_rgb_background(
+            backgrounds=cropped_for_proxy_rgb,
+            rgb=body_vis_rgb_samples[::2],
+            seg=body_vis_output_samples["iuv_images"][::2, :, :, 0].round(),
+        )
+        body_vis_rgb_samples = (
+            body_vis_rgb_samples.cpu().detach().numpy().transpose(0, 2, 3, 1)
+        )
+
+        for view in range(num_views):
+            row = view // samples_cols
+            col = view % samples_cols
+            samples_fig[
+                row * visualise_wh : (row + 1) * visualise_wh,
+                col * visualise_wh : (col + 1) * visualise_wh,
+            ] = body_vis_rgb_samples[view]
+
+        samples_fig_save_path = os.path.splitext(vis_save_path)[0] + "_samples.png"
+        cv2.imwrite(samples_fig_save_path, samples_fig[:, :, ::-1] * 255)
+
+
+def predict_proxy_representations(
+    images,
+    bbox_hints,
+    hrnet_model,
+    hrnet_cfg,
+    pose_shape_cfg,
+    edge_detect_model,
+    object_detect_model,
+    joints2Dvisib_threshold,
+    device,
+):
+    """
+    Proxy representation stage: person bounding boxes and 2D joints with the object detector and
+    HRNet, crop to the proxy representation size, edge detection and 2D joint heatmaps.
+    :param images: list of B (H, W, 3) RGB numpy images.
+    :param bbox_hints: list of B person bounding box hints, None for no hint.
+    :return: dict with hrnet_output (output of predict_hrnet_batch without the HRNet input
+    image), cropped_for_proxy (rgb and joints2D cropped to the proxy representation size) and
+    proxy_rep_input ((B, 18, img_wh, img_wh) tensor).
+    """
+    num_images = len(images)
+    images = [
+        torch.from_numpy(image.transpose(2, 0, 1)).float().to(device) / 255.0
+        for image in images
+    ]
+    # Predict Person Bounding Boxes + 2D Joints
+    hrnet_output = predict_hrnet_batch(
+        hrnet_model=hrnet_model,
+        hrnet_config=hrnet_cfg,
+        object_detect_model=object_detect_model,
+        images=images,
+        object_detect_threshold=pose_shape_cfg.DATA.BBOX_THRESHOLD,
+        bbox_scale_factor=pose_shape_cfg.DATA.BBOX_SCALE_FACTOR,
+        bbox_hints=bbox_hints,
+        bbox_hint_min_joint_conf=pose_shape_cfg.DATA.BBOX_HINT_MIN_JOINT_CONF,
+    )
+    # HRNet input, only needed for the crop
+    hrnet_cropped_image = hrnet_output.pop("cropped_image")
+
+    # Transform predicted 2D joints and image from HRNet input size to input proxy representation size
+    hrnet_input_centre = (
+        torch.tensor(
+            [[hrnet_cropped_image.shape[2], hrnet_cropped_image.shape[3]]]
+            * num_images,
+            dtype=torch.float32,
+            device=device,
+        )
+        * 0.5
+    )
+    hrnet_input_height = torch.tensor(
+        [hrnet_cropped_image.shape[2]] * num_images,
+        dtype=torch.float32,
+        device=device,
+    )
+    cropped_for_proxy = batch_crop_pytorch_affine(
+        input_wh=(hrnet_cfg.MODEL.IMAGE_SIZE[0], hrnet_cfg.MODEL.IMAGE_SIZE[1]),
+        output_wh=(
+            pose_shape_cfg.DATA.PROXY_REP_SIZE,
+            pose_shape_cfg.DATA.PROXY_REP_SIZE,
+        ),
+        num_to_crop=num_images,
+        device=device,
+        joints2D=hrnet_output["joints2D"],
+        rgb=hrnet_cropped_image,
+        bbox_centres=hrnet_input_centre,
+        bbox_heights=hrnet_input_height,
+        bbox_widths=hrnet_input_height,
+        orig_scale_factor=1.0,
+    )
+
+    # Create proxy representation with 1) Edge detection and 2) 2D joints heatmaps generation
+    edge_detector_output = edge_detect_model(cropped_for_proxy["rgb"])
+    proxy_rep_img = (
+        edge_detector_output["thresholded_thin_edges"]
+        if pose_shape_cfg.DATA.EDGE_NMS
+        else edge_detector_output["thresholded_grad_magnitude"]
+    )
+    proxy_rep_heatmaps = convert_2Djoints_to_gaussian_heatmaps_torch(
+        joints2D=cropped_for_proxy["joints2D"],
+        img_wh=pose_shape_cfg.DATA.PROXY_REP_SIZE,
+        std=pose_shape_cfg.DATA.HEATMAP_GAUSSIAN_STD,
+    )
+    hrnet_joints2Dvisib = (
+        hrnet_output["joints2Dconfs"] > joints2Dvisib_threshold
+    )  # (B, 17)
+    hrnet_joints2Dvisib[:, [0, 1, 2, 3, 4, 5, 6, 11, 12]] = (
+        True  # Only removing joints [7, 8, 9, 10, 13, 14, 15, 16] if occluded
+    )
+    proxy_rep_heatmaps = proxy_rep_heatmaps * hrnet_joints2Dvisib[:, :, None, None]
+    proxy_rep_input = torch.cat(
+        [proxy_rep_img, proxy_rep_heatmaps], dim=1
+    ).float()  # (B, 18, img_wh, img_wh)
+
+    return {
+        "hrnet_output": hrnet_output,
+        "cropped_for_proxy": cropped_for_proxy,
+        "proxy_rep_input": proxy_rep_input,
+    }
+
+
+def get_proxy_representations(images, bbox_hints, proxy_rep_cache=None, **stage_kwargs):
+    """
+    Runs predict_proxy_representations on the images which are not in proxy_rep_cache and takes
+    the others from the cache. The stage time per image is stored with each cache entry, so the
+    cache can report the time its hits saved.
+    :param proxy_rep_cache: predict.proxy_rep_cache.ProxyRepCache, or None to always run the
+    stage.
+    :param stage_kwargs: models, configs and settings of predict_proxy_representations.
+    :return: batched output of predict_proxy_representations.
+    """
+    if proxy_rep_cache is None:
+        return predict_proxy_representations(
+            images=images, bbox_hints=bbox_hints, **stage_kwargs
+        )
+
+    device = stage_kwargs["device"]
+    # Everything the stage output depends on besides the image and the weights, including the
+    # backend HRNet runs in (PyTorch or ONNX Runtime)
+    stage_settings = repr(
+        (
+            stage_kwargs["pose_shape_cfg"].DATA.dump(),
+            stage_kwargs["hrnet_cfg"].dump(),
+            type(stage_kwargs["hrnet_model"]).__name__,
+            stage_kwargs["object_detect_model"] is not None,
+            stage_kwargs["joints2Dvisib_threshold"],
+        )
+    )
+    cache_keys = [
+        proxy_rep_cache.make_key(image, stage_settings + repr(bbox_hint))
+        for image, bbox_hint in zip(images, bbox_hints)
+    ]
+    proxy_reps = [proxy_rep_cache.get(cache_key) for cache_key in cache_keys]
+
+    miss_indices = [i for i, proxy_rep in enumerate(proxy_reps) if proxy_rep is None]
+    if len(miss_indices) > 0:
+        stage_start = time.time()
+        computed = predict_proxy_representations(
+            images=[images[i] for i in miss_indices],
+            bbox_hints=[bbox_hints[i] for i in miss_indices],
+            **stage_kwargs,
+        )
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        seconds = (time.time() - stage_start) / len(miss_indices)
+        # Whole batch computed, no need to split and stack it again
+        if len(miss_indices) == len(images):
+            proxy_reps = None
+        for j, i in enumerate(miss_indices):
+            proxy_rep = {
+                name: (
+                    {key: value[j] for key, value in output.items()}
+                    if isinstance(output, dict)
+                    else output[j]
+                )
+                for name, output in computed.items()
+            }
+            proxy_rep["seconds"] = seconds
+            proxy_rep_cache.put(cache_keys[i], proxy_rep)
+            if proxy_reps is not None:
+                proxy_reps[i] = proxy_rep
+        if proxy_reps is None:
+            return computed
+
+    def stack(values):
+        return torch.stack([value.to(device) for value in values])
+
+    return {
+        name: (
+            {
+                key: stack([proxy_rep[name][key] for proxy_rep in proxy_reps])
+                for key in proxy_reps[0][name]
+            }
+            if name != "proxy_rep_input"
+            else stack([proxy_rep[name] for proxy_rep in proxy_reps])
+        )
+        for name in ("hrnet_output", "cropped_for_proxy", "proxy_rep_input")
+    }
+
+
 def predict_poseMF_shapeGaussian_net(
     pose_shape_model,
     pose_shape_cfg,
@@ -71,121 +711,91 @@ def predict_poseMF_shapeGaussian_net(
     joints2Dvisib_threshold=0.75,
     visualise_wh=512,
     visualise_uncropped=True,
-    visualise_samples=False,
-    export_obj=False,
+    outputs=("vis",),
+    batch_size=1,
+    bbox_hints=None,
+    mesh_format="obj",
+    mesh_in_memory=False,
+    gender=None,
+    proxy_rep_cache=None,
 ):
     """
     Predictor for SingleInputKinematicPoseMFShapeGaussianwithGlobCam on unseen test data.
     Input --> ResNet --> image features --> FC layers --> MF over pose and Diagonal Gaussian over shape.
     Also get cam and glob separately to distribution predictor.
     Pose predictions follow the kinematic chain.
+    :param outputs: which outputs to write for each image, any of "mesh" (the height-scaled mesh),
+    "vis" (the visualisation figure and, if visualise_uncropped, the uncropped render),
+    "samples" (the figure of pose/shape samples) and "params" (the predicted SMPL parameters as
+    .npz, to regenerate meshes with predict.regenerate_smpl_mesh). Sampling and rendering is
+    skipped entirely, and the renderer not even built, unless "vis" or "samples" is requested.
+    :param batch_size: number of images the object detector, HRNet, edge detector, distribution
+    predictor and SMPL model run on at once. Images are decoded in a prefetching thread.
+    :param bbox_hints: dict mapping image filenames to [x1, y1, x2, y2] person bounding box hints,
+    given as fractions of the image width/height ([0, 0, 1, 1] for cropped images). The object
+    detector is skipped for these images, unless HRNet is not confident on the hinted crop.
+    :param mesh_format: file format of the mesh output, one of utils.mesh_writer.MESH_FORMATS.
+    :param mesh_in_memory: if True, the encoded meshes and SMPL parameters are returned under
+    "mesh" and "params" of each prediction instead of being written to save_dir.
+    :param gender: gender of smpl_model, stored with the SMPL parameters.
+    :param proxy_rep_cache: predict.proxy_rep_cache.ProxyRepCache of the proxy representation
+    stage (object detector, HRNet, crop and edge detector), which does not depend on the gender.
+    Images in the cache only run the distribution predictor and SMPL.
+    :return: dict mapping each image filename to its prediction, i.e. the predicted SMPL shape
+    parameters (mean of the shape distribution) as list under "betas".
     """
-    # Setting up body visualisation renderer
-    body_vis_renderer = TexturedIUVRenderer(
-        device=device,
-        batch_size=1,
-        img_wh=visualise_wh,
-        projection_type="orthographic",
-        render_rgb=True,
-        bin_size=32,
-    )
-    plain_texture = torch.ones(1, 1200, 800, 3, device=device).float() * 0.7
-    lights_rgb_settings = {
-        "location": torch.tensor(
-            [[0.0, -0.8, -2.0]], device=device, dtype=torch.float32
-        ),
-        "ambient_color": 0.5 * torch.ones(1, 3, device=device, dtype=torch.float32),
-        "diffuse_color": 0.3 * torch.ones(1, 3, device=device, dtype=torch.float32),
-        "specular_color": torch.zeros(1, 3, device=device, dtype=torch.float32),
-    }
-    fixed_cam_t = torch.tensor([[0.0, -0.2, 2.5]], device=device)
-    fixed_orthographic_scale = torch.tensor([[0.95, 0.95]], device=device)
+    unknown_outputs = set(outputs) - set(OUTPUTS)
+    if unknown_outputs:
+        raise ValueError(f"Unknown outputs {sorted(unknown_outputs)}")
+    if mesh_format not in MESH_FORMATS:
+        raise ValueError(f"Unknown mesh format {mesh_format}")
+    export_mesh = "mesh" in outputs
+    export_params = "params" in outputs
+    visualise = "vis" in outputs
+    visualise_samples = "samples" in outputs
+    render = visualise or visualise_samples
+    if export_mesh:
+        mesh_writer = get_mesh_writer(smpl_model.faces)
+
+    # Setting up body visualisation renderer, only needed if anything is rendered
+    if render:
+        vis_setup = setup_body_vis_renderer(device=device, visualise_wh=visualise_wh)
 
     hrnet_model.eval()
     pose_shape_model.eval()
     if object_detect_model is not None:
         object_detect_model.eval()
-    for image_fname in tqdm(
-        sorted([f for f in os.listdir(image_dir) if f.endswith((".jpg", ".png"))])
+    image_fnames = sorted(
+        [f for f in os.listdir(image_dir) if f.endswith((".jpg", ".png"))]
+    )
+    if bbox_hints is None:
+        bbox_hints = {}
+    predictions = {}
+    start_time = time.time()
+    progress_bar = tqdm(total=len(image_fnames))
+    for batch_fnames, batch_images in prefetch_image_batches(
+        image_dir, image_fnames, batch_size
     ):
+        num_images = len(batch_fnames)
         with torch.no_grad():
             # ------------------------- INPUT LOADING AND PROXY REPRESENTATION GENERATION -------------------------
-            image = cv2.cvtColor(
-                cv2.imread(os.path.join(image_dir, image_fname)), cv2.COLOR_BGR2RGB
-            )
-            orig_image = image.copy()
-            image = (
-                torch.from_numpy(image.transpose(2, 0, 1)).float().to(device) / 255.0
-            )
-            # Predict Person Bounding Box + 2D Joints
-            hrnet_output = predict_hrnet(
+            proxy_reps = get_proxy_representations(
+                images=batch_images,
+                bbox_hints=[
+                    bbox_hints.get(image_fname) for image_fname in batch_fnames
+                ],
+                proxy_rep_cache=proxy_rep_cache,
                 hrnet_model=hrnet_model,
-                hrnet_config=hrnet_cfg,
+                hrnet_cfg=hrnet_cfg,
+                pose_shape_cfg=pose_shape_cfg,
+                edge_detect_model=edge_detect_model,
                 object_detect_model=object_detect_model,
-                image=image,
-                object_detect_threshold=pose_shape_cfg.DATA.BBOX_THRESHOLD,
-                bbox_scale_factor=pose_shape_cfg.DATA.BBOX_SCALE_FACTOR,
-            )
-
-            # Transform predicted 2D joints and image from HRNet input size to input proxy representation size
-            hrnet_input_centre = (
-                torch.tensor(
-                    [
-                        [
-                            hrnet_output["cropped_image"].shape[1],
-                            hrnet_output["cropped_image"].shape[2],
-                        ]
-                    ],
-                    dtype=torch.float32,
-                    device=device,
-                )
-                * 0.5
-            )
-            hrnet_input_height = torch.tensor(
-                [hrnet_output["cropped_image"].shape[1]],
-                dtype=torch.float32,
-                device=device,
-            )
-            cropped_for_proxy = batch_crop_pytorch_affine(
-                input_wh=(hrnet_cfg.MODEL.IMAGE_SIZE[0], hrnet_cfg.MODEL.IMAGE_SIZE[1]),
-                output_wh=(
-                    pose_shape_cfg.DATA.PROXY_REP_SIZE,
-                    pose_shape_cfg.DATA.PROXY_REP_SIZE,
-                ),
-                num_to_crop=1,
+                joints2Dvisib_threshold=joints2Dvisib_threshold,
                 device=device,
-                joints2D=hrnet_output["joints2D"][None, :, :],
-                rgb=hrnet_output["cropped_image"][None, :, :, :],
-                bbox_centres=hrnet_input_centre,
-                bbox_heights=hrnet_input_height,
-                bbox_widths=hrnet_input_height,
-                orig_scale_factor=1.0,
             )
-
-            # Create proxy representation with 1) Edge detection and 2) 2D joints heatmaps generation
-            edge_detector_output = edge_detect_model(cropped_for_proxy["rgb"])
-            proxy_rep_img = (
-                edge_detector_output["thresholded_thin_edges"]
-                if pose_shape_cfg.DATA.EDGE_NMS
-                else edge_detector_output["thresholded_grad_magnitude"]
-            )
-            proxy_rep_heatmaps = convert_2Djoints_to_gaussian_heatmaps_torch(
-                joints2D=cropped_for_proxy["joints2D"],
-                img_wh=pose_shape_cfg.DATA.PROXY_REP_SIZE,
-                std=pose_shape_cfg.DATA.HEATMAP_GAUSSIAN_STD,
-            )
-            hrnet_joints2Dvisib = (
-                hrnet_output["joints2Dconfs"] > joints2Dvisib_threshold
-            )
-            hrnet_joints2Dvisib[[0, 1, 2, 3, 4, 5, 6, 11, 12]] = (
-                True  # Only removing joints [7, 8, 9, 10, 13, 14, 15, 16] if occluded
-            )
-            proxy_rep_heatmaps = (
-                proxy_rep_heatmaps * hrnet_joints2Dvisib[None, :, None, None]
-            )
-            proxy_rep_input = torch.cat(
-                [proxy_rep_img, proxy_rep_heatmaps], dim=1
-            ).float()  # (1, 18, img_wh, img_wh)
+            hrnet_output = proxy_reps["hrnet_output"]
+            cropped_for_proxy = proxy_reps["cropped_for_proxy"]
+            proxy_rep_input = proxy_reps["proxy_rep_input"]  # (B, 18, img_wh, img_wh)
 
             # ------------------------------- POSE AND SHAPE DISTRIBUTION PREDICTION -------------------------------
             (
@@ -201,436 +811,121 @@ def predict_poseMF_shapeGaussian_net(
             # Pose F, U, V and rotmats_mode are (bsize, 23, 3, 3) and Pose S is (bsize, 23, 3)
 
             if pred_glob.shape[-1] == 3:
-                pred_glob_rotmats = batch_rodrigues(pred_glob)  # (1, 3, 3)
+                pred_glob_rotmats = batch_rodrigues(pred_glob)  # (B, 3, 3)
             elif pred_glob.shape[-1] == 6:
-                pred_glob_rotmats = rot6d_to_rotmat(pred_glob)  # (1, 3, 3)
+                pred_glob_rotmats = rot6d_to_rotmat(pred_glob)  # (B, 3, 3)
 
-            pred_smpl_output_mode = smpl_model(
+            pred_smpl_output_mode = smpl_model.forward_cached(
+                betas=pred_shape_dist.loc,
                 body_pose=pred_pose_rotmats_mode,
                 global_orient=pred_glob_rotmats.unsqueeze(1),
-                betas=pred_shape_dist.loc,
                 pose2rot=False,
+                return_joints=False,
             )
-            pred_vertices_mode = pred_smpl_output_mode.vertices  # (1, 6890, 3)
+            pred_vertices_mode = pred_smpl_output_mode.vertices  # (B, 6890, 3)
 
             # ------------------------------- START ADDED CODE -------------------------------
-            # SMPL model with neutral pose (only shape)
-            neutral_smpl_output = smpl_model(
-                betas=pred_shape_dist.loc,
-            )
-            neutral_vertices = neutral_smpl_output.vertices  # (1, 6890, 3)
-
-            # Scale posed SMPL model to real height
-            scaled_vertices = scale_smpl_to_real_height(
-                neutral_vertices=neutral_vertices.squeeze(0).cpu().numpy(),
-                posed_vertices=pred_vertices_mode.squeeze(0).cpu().numpy(),
-                height=height,
-            )
-
-            # Added export to obj option
-            if export_obj:
-                obj_save_path = os.path.join(
-                    save_dir, os.path.splitext(image_fname)[0] + ".obj"
-                )
-
-                save_mesh_as_obj(
-                    out_path=obj_save_path,
-                    vertices=scaled_vertices,
-                    faces=smpl_model.faces,
+            if export_mesh:
+                # SMPL model with neutral pose (only shape), shaped template is cached from the mode
+                neutral_smpl_output = smpl_model.forward_cached(
+                    betas=pred_shape_dist.loc, return_joints=False
                 )
+                neutral_vertices = neutral_smpl_output.vertices.cpu().numpy()
+                posed_vertices = pred_vertices_mode.cpu().numpy()
             # ------------------------------- END ADDED CODE -------------------------------
 
-            # Need to flip pred_vertices before projecting so that they project the right way up.
-            pred_vertices_mode = aa_rotate_translate_points_pytorch3d(
-                points=pred_vertices_mode,
-                axes=torch.tensor([1.0, 0.0, 0.0], device=device),
-                angles=np.pi,
-                translations=torch.zeros(3, device=device),
-            )
-            # Rotating 90° about vertical axis for visualisation
-            pred_vertices_rot90_mode = aa_rotate_translate_points_pytorch3d(
-                points=pred_vertices_mode,
-                axes=torch.tensor([0.0, 1.0, 0.0], device=device),
-                angles=-np.pi / 2.0,
-                translations=torch.zeros(3, device=device),
-            )
-            pred_vertices_rot180_mode = aa_rotate_translate_points_pytorch3d(
-                points=pred_vertices_rot90_mode,
-                axes=torch.tensor([0.0, 1.0, 0.0], device=device),
-                angles=-np.pi / 2.0,
-                translations=torch.zeros(3, device=device),
-            )
-            pred_vertices_rot270_mode = aa_rotate_translate_points_pytorch3d(
-                points=pred_vertices_rot180_mode,
-                axes=torch.tensor([0.0, 1.0, 0.0], device=device),
-                angles=-np.pi / 2.0,
-                translations=torch.zeros(3, device=device),
-            )
-
-            pred_reposed_smpl_output_mean = smpl_model(betas=pred_shape_dist.loc)
-            pred_reposed_vertices_mean = (
-                pred_reposed_smpl_output_mean.vertices
-            )  # (1, 6890, 3)
-            # Need to flip pred_vertices before projecting so that they project the right way up.
-            pred_reposed_vertices_flipped_mean = aa_rotate_translate_points_pytorch3d(
-                points=pred_reposed_vertices_mean,
-                axes=torch.tensor([1.0, 0.0, 0.0], device=device),
-                angles=np.pi,
-                translations=torch.zeros(3, device=device),
-            )
-            # Rotating 90° about vertical axis for visualisation
-            pred_reposed_vertices_rot90_mean = aa_rotate_translate_points_pytorch3d(
-                points=pred_reposed_vertices_flipped_mean,
-                axes=torch.tensor([0.0, 1.0, 0.0], device=device),
-                angles=-np.pi / 2.0,
-                translations=torch.zeros(3, device=device),
-            )
-
-            # -------------------------------------- VISUALISATION --------------------------------------
-            # Predicted camera corresponding to proxy rep input
-            orthographic_scale = pred_cam_wp[:, [0, 0]]
-            cam_t = torch.cat(
-                [
-                    pred_cam_wp[:, 1:],
-                    torch.ones(pred_cam_wp.shape[0], 1, device=device).float() * 2.5,
-                ],
-                dim=-1,
-            )
-
-            # Estimate per-vertex uncertainty (variance) by sampling SMPL poses/shapes and computing corresponding vertex meshes
-            per_vertex_3Dvar, pred_vertices_samples, pred_joints_samples = (
-                compute_vertex_uncertainties_by_poseMF_shapeGaussian_sampling(
-                    pose_U=pred_pose_U,
-                    pose_S=pred_pose_S,
-                    pose_V=pred_pose_V,
-                    shape_distribution=pred_shape_dist,
-                    glob_rotmats=pred_glob_rotmats,
-                    num_samples=50,
-                    smpl_model=smpl_model,
-                    use_mean_shape=True,
-                )
-            )
-
-            if visualise_samples:
-                num_samples = 8
-                # Prepare vertex samples for visualisation
-                pred_vertices_samples = joints2D_error_sorted_verts_sampling(
-                    pred_vertices_samples=pred_vertices_samples,
-                    pred_joints_samples=pred_joints_samples,
-                    input_joints2D_heatmaps=proxy_rep_input[:, 1:, :, :],
-                    pred_cam_wp=pred_cam_wp,
-                )[
-                    :num_samples, :, :
-                ]  # (8, 6890, 3)
-                # Need to flip pred_vertices before projecting so that they project the right way up.
-                pred_vertices_samples = aa_rotate_translate_points_pytorch3d(
-                    points=pred_vertices_samples,
-                    axes=torch.tensor([1.0, 0.0, 0.0], device=device),
-                    angles=np.pi,
-                    translations=torch.zeros(3, device=device),
-                )
-                pred_vertices_rot90_samples = aa_rotate_translate_points_pytorch3d(
-                    points=pred_vertices_samples,
-                    axes=torch.tensor([0.0, 1.0, 0.0], device=device),
-                    angles=-np.pi / 2.0,
-                    translations=torch.zeros(3, device=device),
-                )
-
-                pred_vertices_samples = torch.cat(
-                    [pred_vertices_mode, pred_vertices_samples], dim=0
-                )  # (9, 6890, 3)
-                pred_vertices_rot90_samples = torch.cat(
-                    [pred_vertices_rot90_mode, pred_vertices_rot90_samples], dim=0
-                )  # (9, 6890, 3)
-
-            # Generate per-vertex uncertainty colourmap
-            vertex_var_norm = plt.Normalize(vmin=0.0, vmax=0.2, clip=True)
-            vertex_var_colours = plt.cm.jet(
-                vertex_var_norm(per_vertex_3Dvar.cpu().detach().numpy())
-            )[:, :3]
-            vertex_var_colours = (
-                torch.from_numpy(vertex_var_colours[None, :, :]).to(device).float()
-            )
-
-            # Render visualisation outputs
-            body_vis_output = body_vis_renderer(
-                vertices=pred_vertices_mode,
-                cam_t=cam_t,
-                orthographic_scale=orthographic_scale,
-                lights_rgb_settings=lights_rgb_settings,
-                verts_features=vertex_var_colours,
-            )
-            cropped_for_proxy_rgb = torch.nn.functional.interpolate(
-                cropped_for_proxy["rgb"],
-                size=(visualise_wh, visualise_wh),
-                mode="bilinear",
-                align_corners=False,
-            )
-            body_vis_rgb = batch_add_rgb_background(
-                backgrounds=cropped_for_proxy_rgb,
-                rgb=body_vis_output["rgb_images"].permute(0, 3, 1, 2).contiguous(),
-                seg=body_vis_output["iuv_images"][:, :, :, 0].round(),
-            )
-            body_vis_rgb = body_vis_rgb.cpu().detach().numpy()[0].transpose(1, 2, 0)
-
-            body_vis_rgb_rot90 = (
-                body_vis_renderer(
-                    vertices=pred_vertices_rot90_mode,
-                    cam_t=fixed_cam_t,
-                    orthographic_scale=fixed_orthographic_scale,
-                    lights_rgb_settings=lights_rgb_settings,
-                    verts_features=vertex_var_colours,
-                )["rgb_images"]
-                .cpu()
-                .detach()
-                .numpy()[0]
-            )
-            body_vis_rgb_rot180 = (
-                body_vis_renderer(
-                    vertices=pred_vertices_rot180_mode,
-                    cam_t=fixed_cam_t,
-                    orthographic_scale=fixed_orthographic_scale,
-                    lights_rgb_settings=lights_rgb_settings,
-                    verts_features=vertex_var_colours,
-                )["rgb_images"]
-                .cpu()
-                .detach()
-                .numpy()[0]
-            )
-            body_vis_rgb_rot270 = (
-                body_vis_renderer(
-                    vertices=pred_vertices_rot270_mode,
-                    textures=plain_texture,
-                    cam_t=fixed_cam_t,
-                    orthographic_scale=fixed_orthographic_scale,
-                    lights_rgb_settings=lights_rgb_settings,
-                    verts_features=vertex_var_colours,
-                )["rgb_images"]
-                .cpu()
-                .detach()
-                .numpy()[0]
-            )
-
-            # Reposed body visualisation
-            reposed_body_vis_rgb = (
-                body_vis_renderer(
-                    vertices=pred_reposed_vertices_flipped_mean,
-                    textures=plain_texture,
-                    cam_t=fixed_cam_t,
-                    orthographic_scale=fixed_orthographic_scale,
-                    lights_rgb_settings=lights_rgb_settings,
-                )["rgb_images"]
-                .cpu()
-                .detach()
-                .numpy()[0]
-            )
-            reposed_body_vis_rgb_rot90 = (
-                body_vis_renderer(
-                    vertices=pred_reposed_vertices_rot90_mean,
-                    textures=plain_texture,
-                    cam_t=fixed_cam_t,
-                    orthographic_scale=fixed_orthographic_scale,
-                    lights_rgb_settings=lights_rgb_settings,
-                )["rgb_images"]
-                .cpu()
-                .detach()
-                .numpy()[0]
-            )
-
-            # Combine all visualisations
-            combined_vis_rows = 2
-            combined_vis_cols = 4
-            combined_vis_fig = np.zeros(
-                (combined_vis_rows * visualise_wh, combined_vis_cols * visualise_wh, 3),
-                dtype=body_vis_rgb.dtype,
-            )
-            # Cropped input image
-            combined_vis_fig[:visualise_wh, :visualise_wh] = (
-                cropped_for_proxy_rgb.cpu().detach().numpy()[0].transpose(1, 2, 0)
-            )
-
-            # Proxy representation + 2D joints scatter + 2D joints confidences
-            proxy_rep_input = proxy_rep_input[0].sum(dim=0).cpu().detach().numpy()
-            proxy_rep_input = np.stack(
-                [proxy_rep_input] * 3, axis=-1
-            )  # single-channel to RGB
-            proxy_rep_input = cv2.resize(proxy_rep_input, (visualise_wh, visualise_wh))
-            for joint_num in range(cropped_for_proxy["joints2D"].shape[1]):
-                hor_coord = (
-                    cropped_for_proxy["joints2D"][0, joint_num, 0].item()
-                    * visualise_wh
-                    / pose_shape_cfg.DATA.PROXY_REP_SIZE
-                )
-                ver_coord = (
-                    cropped_for_proxy["joints2D"][0, joint_num, 1].item()
-                    * visualise_wh
-                    / pose_shape_cfg.DATA.PROXY_REP_SIZE
-                )
-                cv2.circle(
-                    proxy_rep_input,
-                    (int(hor_coord), int(ver_coord)),
-                    radius=3,
-                    color=(255, 0, 0),
-                    thickness=-1,
-                )
-                cv2.putText(
-                    proxy_rep_input,
-                    str(joint_num),
-                    (int(hor_coord + 4), int(ver_coord + 4)),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.6,
-                    (255, 0, 0),
-                    lineType=2,
-                )
-                cv2.putText(
-                    proxy_rep_input,
-                    str(joint_num)
-                    + " {:.2f}".format(hrnet_output["joints2Dconfs"][joint_num].item()),
-                    (10, 16 * (joint_num + 1)),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.6,
-                    (255, 0, 0),
-                    lineType=2,
-                )
-            combined_vis_fig[visualise_wh : 2 * visualise_wh, :visualise_wh] = (
-                proxy_rep_input
-            )
-
-            # Posed 3D body
-            combined_vis_fig[:visualise_wh, visualise_wh : 2 * visualise_wh] = (
-                body_vis_rgb
-            )
-            combined_vis_fig[
-                visualise_wh : 2 * visualise_wh, visualise_wh : 2 * visualise_wh
-            ] = body_vis_rgb_rot90
-            combined_vis_fig[:visualise_wh, 2 * visualise_wh : 3 * visualise_wh] = (
-                body_vis_rgb_rot180
-            )
-            combined_vis_fig[
-                visualise_wh : 2 * visualise_wh, 2 * visualise_wh : 3 * visualise_wh
-            ] = body_vis_rgb_rot270
-
-            # T-pose 3D body
-            combined_vis_fig[:visualise_wh, 3 * visualise_wh : 4 * visualise_wh] = (
-                reposed_body_vis_rgb
-            )
-            combined_vis_fig[
-                visualise_wh : 2 * visualise_wh, 3 * visualise_wh : 4 * visualise_wh
-            ] = reposed_body_vis_rgb_rot90
-            vis_save_path = os.path.join(save_dir, image_fname)
-            cv2.imwrite(vis_save_path, combined_vis_fig[:, :, ::-1] * 255)
-
-            if visualise_uncropped:
-                # Uncropped visualisation by projecting 3D body onto original image
-                rgb_to_uncrop = (
-                    body_vis_output["rgb_images"]
-                    .permute(0, 3, 1, 2)
-                    .contiguous()
-                    .cpu()
-                    .detach()
-                    .numpy()
-                )
-                iuv_to_uncrop = (
-                    body_vis_output["iuv_images"]
-                    .permute(0, 3, 1, 2)
-                    .contiguous()
-                    .cpu()
-                    .detach()
-                    .numpy()
-                )
-                bbox_centres = hrnet_output["bbox_centre"][None].cpu().detach().numpy()
-                bbox_whs = (
-                    torch.max(hrnet_output["bbox_height"], hrnet_output["bbox_width"])[
-                        None
-                    ]
-                    .cpu()
-                    .detach()
-                    .numpy()
-                )
-                bbox_whs *= pose_shape_cfg.DATA.BBOX_SCALE_FACTOR
-                uncropped_for_visualise = batch_crop_opencv_affine(
-                    output_wh=(visualise_wh, visualise_wh),
-                    num_to_crop=1,
-                    rgb=rgb_to_uncrop,
-                    iuv=iuv_to_uncrop,
-                    bbox_centres=bbox_centres,
-                    bbox_whs=bbox_whs,
-                    uncrop=True,
-                    uncrop_wh=(orig_image.shape[1], orig_image.shape[0]),
-                )
-                uncropped_rgb = (
-                    uncropped_for_visualise["rgb"][0].transpose(1, 2, 0) * 255
-                )
-                uncropped_seg = uncropped_for_visualise["iuv"][0, 0, :, :]
-                background_pixels = (
-                    uncropped_seg[:, :, None] == 0
-                )  # Body pixels are > 0
-                uncropped_rgb_with_background = (
-                    uncropped_rgb * (np.logical_not(background_pixels))
-                    + orig_image * background_pixels
-                )
-
-                uncropped_vis_save_path = (
-                    os.path.splitext(vis_save_path)[0] + "_uncrop.png"
-                )
-                cv2.imwrite(
-                    uncropped_vis_save_path, uncropped_rgb_with_background[:, :, ::-1]
-                )
-
-            if visualise_samples:
-                samples_rows = 3
-                samples_cols = 6
-                samples_fig = np.zeros(
-                    (samples_rows * visualise_wh, samples_cols * visualise_wh, 3),
-                    dtype=body_vis_rgb.dtype,
-                )
-                for i in range(num_samples + 1):
-                    body_vis_output_sample = body_vis_renderer(
-                        vertices=pred_vertices_samples[[i]],
-                        textures=plain_texture,
-                        cam_t=cam_t,
-                        orthographic_scale=orthographic_scale,
-                        lights_rgb_settings=lights_rgb_settings,
+            for i, image_fname in enumerate(batch_fnames):
+                predictions[image_fname] = {
+                    "betas": pred_shape_dist.loc[i].cpu().numpy().tolist()
+                }
+
+                if export_params:
+                    params_data = encode_smpl_params(
+                        pose_rotmats=pred_pose_rotmats_mode[i].cpu().numpy(),
+                        glob_rotmats=pred_glob_rotmats[i].cpu().numpy(),
+                        betas=pred_shape_dist.loc[i].cpu().numpy(),
+                        betas_std=pred_shape_dist.scale[i].cpu().numpy(),
+                        cam_wp=pred_cam_wp[i].cpu().numpy(),
+                        height=height,
+                        gender=gender,
                     )
-                    body_vis_rgb_sample = batch_add_rgb_background(
-                        backgrounds=cropped_for_proxy_rgb,
-                        rgb=body_vis_output_sample["rgb_images"]
-                        .permute(0, 3, 1, 2)
-                        .contiguous(),
-                        seg=body_vis_output_sample["iuv_images"][:, :, :, 0].round(),
-                    )
-                    body_vis_rgb_sample = (
-                        body_vis_rgb_sample.cpu().detach().numpy()[0].transpose(1, 2, 0)
+                    if mesh_in_memory:
+                        predictions[image_fname]["params"] = params_data
+                    else:
+                        params_path = os.path.join(
+                            save_dir, os.path.splitext(image_fname)[0] + "_params.npz"
+                        )
+                        with open(params_path, "wb") as f:
+                            f.write(params_data)
+
+                # ------------------------------- START ADDED CODE -------------------------------
+                if export_mesh:
+                    # Scale posed SMPL model to real height
+                    scaled_vertices = scale_smpl_to_real_height(
+                        neutral_vertices=neutral_vertices[i],
+                        posed_vertices=posed_vertices[i],
+                        height=height,
                     )
 
-                    body_vis_rgb_rot90_sample = (
-                        body_vis_renderer(
-                            vertices=pred_vertices_rot90_samples[[i]],
-                            textures=plain_texture,
-                            cam_t=fixed_cam_t,
-                            orthographic_scale=fixed_orthographic_scale,
-                            lights_rgb_settings=lights_rgb_settings,
-                        )["rgb_images"]
-                        .cpu()
-                        .detach()
-                        .numpy()[0]
+                    # Added export to obj option, or another mesh format
+                    if mesh_in_memory:
+                        predictions[image_fname]["mesh"] = mesh_writer.encode(
+                            scaled_vertices, file_format=mesh_format, smooth=True
+                        )
+                    else:
+                        mesh_writer.write(
+                            os.path.join(
+                                save_dir,
+                                os.path.splitext(image_fname)[0] + "." + mesh_format,
+                            ),
+                            scaled_vertices,
+                            file_format=mesh_format,
+                            smooth=True,
+                        )
+                # ------------------------------- END ADDED CODE -------------------------------
+
+                if render:
+                    visualise_prediction(
+                        vis_setup=vis_setup,
+                        smpl_model=smpl_model,
+                        pose_shape_cfg=pose_shape_cfg,
+                        device=device,
+                        save_dir=save_dir,
+                        image_fname=image_fname,
+                        orig_image=batch_images[i],
+                        hrnet_output={
+                            key: value[i] for key, value in hrnet_output.items()
+                        },
+                        cropped_for_proxy={
+                            key: value[[i]] for key, value in cropped_for_proxy.items()
+                        },
+                        proxy_rep_input=proxy_rep_input[[i]],
+                        pred_pose_U=pred_pose_U[[i]],
+                        pred_pose_S=pred_pose_S[[i]],
+                        pred_pose_V=pred_pose_V[[i]],
+                        pred_vertices_mode=pred_vertices_mode[[i]],
+                        pred_shape_dist=Normal(
+                            loc=pred_shape_dist.loc[[i]],
+                            scale=pred_shape_dist.scale[[i]],
+                        ),
+                        pred_glob_rotmats=pred_glob_rotmats[[i]],
+                        pred_cam_wp=pred_cam_wp[[i]],
+                        visualise_wh=visualise_wh,
+                        visualise=visualise,
+                        visualise_uncropped=visualise_uncropped,
+                        visualise_samples=visualise_samples,
                     )
+        progress_bar.update(num_images)
+    progress_bar.close()
+
+    elapsed_time = time.time() - start_time
+    print(
+        "Predicted {} images in {:.2f}s ({:.2f} images/s, batch size {})".format(
+            len(image_fnames),
+            elapsed_time,
+            len(image_fnames) / max(elapsed_time, 1e-9),
+            batch_size,
+        )
+    )
 
-                    row = (2 * i) // samples_cols
-                    col = (2 * i) % samples_cols
-                    samples_fig[
-                        row * visualise_wh : (row + 1) * visualise_wh,
-                        col * visualise_wh : (col + 1) * visualise_wh,
-                    ] = body_vis_rgb_sample
-
-                    row = (2 * i + 1) // samples_cols
-                    col = (2 * i + 1) % samples_cols
-                    samples_fig[
-                        row * visualise_wh : (row + 1) * visualise_wh,
-                        col * visualise_wh : (col + 1) * visualise_wh,
-                    ] = body_vis_rgb_rot90_sample
-
-                    samples_fig_save_path = (
-                        os.path.splitext(vis_save_path)[0] + "_samples.png"
-                    )
-                    cv2.imwrite(samples_fig_save_path, samples_fig[:, :, ::-1] * 255)
+    return predictions
@@ -0,0 +1,150 @@
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import torch
+
+
+class ProxyRepCache:
+    """
+    LRU cache of the proxy representation stage of predict_poseMF_shapeGaussian_net, i.e. the
+    person bounding box, the HRNet 2D joints and confidences, the crop and the edge + heatmap
+    proxy representation of each image. The stage does not depend on the gender, so predicting an
+    image again with the other gendered model only runs the distribution predictor and SMPL.
+    Entries are keyed by a hash of the decoded image, the stage settings and the version of the
+    weights (see make_key) and evicted least recently used first once they exceed max_bytes.
+    With a cache_dir, entries are stored as files and persist across runs, otherwise they are
+    kept in memory. Not thread-safe, predictions using the cache must not run concurrently.
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, cache_dir=None, version=""):
+        """
+        :param max_bytes: size budget of the cached tensors.
+        :param cache_dir: directory to store the entries in, None to keep them in memory.
+        :param version: version of the HRNet/detector weights, part of every key, e.g.
+        ModelBundle.version or utils.model_bundle.compute_files_version of the weight files.
+        """
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.version = version
+        self.entries = OrderedDict()  # key -> (entry, or None if on disk, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            paths = [
+                os.path.join(cache_dir, fname)
+                for fname in os.listdir(cache_dir)
+                if fname.endswith(".pt")
+            ]
+            for path in sorted(paths, key=os.path.getmtime):
+                key = os.path.splitext(os.path.basename(path))[0]
+                self.entries[key] = (None, os.path.getsize(path))
+                self.size += self.entries[key][1]
+            self._evict()
+
+    def make_key(self, image, settings=""):
+        """
+        :param image: (H, W, 3) numpy array, the decoded image.
+        :param settings: string of everything else the stage output depends on, e.g. the configs,
+        the bounding box hint and the joint visibility threshold.
+        :return: the cache key, a hex digest.
+        """
+        sha256 = hashlib.sha256()
+        sha256.update(
+            f"{self.version}\0{image.shape}\0{image.dtype}\0{settings}\0".encode()
+        )
+        sha256.update(np.ascontiguousarray(image).data)
+        return sha256.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".pt")
+
+    def get(self, key):
+        """
+        :return: the cached entry (dict of CPU tensors, see put), or None on a miss.
+        """
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        entry, size = self.entries[key]
+        if entry is None:
+            try:
+                entry = torch.load(self._path(key), map_location="cpu")
+                os.utime(self._path(key))
+            except (OSError, RuntimeError, EOFError):
+                # Entry file is gone or incomplete, compute the stage again
+                del self.entries[key]
+                self.size -= size
+                self.misses += 1
+                return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        self.saved_seconds += entry["seconds"]
+        return entry
+
+    def put(self, key, entry):
+        """
+        :param entry: dict of the stage outputs of one image (tensors or dicts of tensors, without
+        batch dimension) and the time it took to compute them in seconds under "seconds".
+        """
+        # Copied, so views into the batch do not keep (or save) the whole batch
+        entry = {
+            name: (
+                {k: v.to("cpu", copy=True) for k, v in value.items()}
+                if isinstance(value, dict)
+                else value.to("cpu", copy=True) if torch.is_tensor(value) else value
+            )
+            for name, value in entry.items()
+        }
+        size = sum(
+            tensor.numel() * tensor.element_size()
+            for value in entry.values()
+            for tensor in (value.values() if isinstance(value, dict) else [value])
+            if torch.is_tensor(tensor)
+        )
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        if self.cache_dir is not None:
+            # Written to a temporary file first, so readers never load a partial entry
+            tmp_path = self._path(key) + ".tmp"
+            torch.save(entry, tmp_path)
+            os.replace(tmp_path, self._path(key))
+            size = os.path.getsize(self._path(key))
+            self.entries[key] = (None, size)
+        else:
+            self.entries[key] = (entry, size)
+        self.size += size
+        self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and len(self.entries) > 0:
+            key, (_, size) = self.entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            if self.cache_dir is not None:
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+
+    def stats(self):
+        """
+        :return: dict with the hit/miss counters, the size of the cache and the stage time saved
+        by the hits in seconds.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+        }
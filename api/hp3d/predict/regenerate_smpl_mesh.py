@@ -0,0 +1,70 @@
+import numpy as np
+import torch
+from smplx.lbs import batch_rodrigues
+
+from predict.predict_poseMF_shapeGaussian_net import scale_smpl_to_real_height
+
+POSES = ("predicted", "tpose", "apose")
+APOSE_SHOULDER_ANGLE = np.pi / 4  # Arms lowered from the T-pose by 45 degrees
+SMPL_LEFT_SHOULDER, SMPL_RIGHT_SHOULDER = 15, 16  # Indices into the 23 body pose joints
+
+
+def get_body_pose_rotmats(pose_rotmats, pose="predicted"):
+    """
+    :param pose_rotmats: (23, 3, 3) tensor, predicted body pose rotation matrices.
+    :param pose: one of POSES, the predicted pose, a T-pose or an A-pose.
+    :return: (23, 3, 3) tensor of body pose rotation matrices.
+    """
+    if pose not in POSES:
+        raise ValueError(f"Unknown pose {pose}, expected one of {POSES}")
+    if pose == "predicted":
+        return pose_rotmats
+
+    body_pose = torch.zeros(
+        23, 3, dtype=pose_rotmats.dtype, device=pose_rotmats.device
+    )
+    if pose == "apose":
+        # Lower the arms around the forward axis, the left arm points along +x in the T-pose
+        body_pose[SMPL_LEFT_SHOULDER, 2] = -APOSE_SHOULDER_ANGLE
+        body_pose[SMPL_RIGHT_SHOULDER, 2] = APOSE_SHOULDER_ANGLE
+    return batch_rodrigues(body_pose)
+
+
+def regenerate_smpl_vertices(smpl_model, params, height=None, pose="predicted"):
+    """
+    Regenerates the height-scaled mesh of a prediction from its SMPL parameters with the SMPL
+    model only, i.e. without the object detector, HRNet, edge detector or distribution predictor.
+    The predicted pose gives the vertices of the mesh exported by predict_poseMF_shapeGaussian_net,
+    up to float rounding if it was predicted in a batch.
+    :param smpl_model: SMPL model of the gender of the prediction.
+    :param params: SMPL parameters loaded with utils.smpl_params.load_smpl_params.
+    :param height: height in meters to scale the mesh to, by default the height of the prediction.
+    :param pose: one of POSES. The global orientation of the prediction is kept for all poses.
+    :return: (6890, 3) numpy array of the scaled vertices.
+    """
+    if height is None:
+        height = params["height"]
+    device = smpl_model.shapedirs.device
+    betas = torch.from_numpy(params["betas"]).to(device)[None]
+    pose_rotmats = get_body_pose_rotmats(
+        torch.from_numpy(params["pose_rotmats"]).to(device), pose=pose
+    )
+    glob_rotmats = torch.from_numpy(params["glob_rotmats"]).to(device)
+
+    with torch.no_grad():
+        posed_vertices = smpl_model.forward_cached(
+            betas=betas,
+            body_pose=pose_rotmats[None],
+            global_orient=glob_rotmats[None, None],
+            pose2rot=False,
+            return_joints=False,
+        ).vertices
+        neutral_vertices = smpl_model.forward_cached(
+            betas=betas, return_joints=False
+        ).vertices
+
+    return scale_smpl_to_real_height(
+        neutral_vertices=neutral_vertices[0].cpu().numpy(),
+        posed_vertices=posed_vertices[0].cpu().numpy(),
+        height=height,
+    )
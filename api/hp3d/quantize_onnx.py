@@ -0,0 +1,195 @@
+import os
+import argparse
+import tempfile
+import numpy as np
+import torch
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quant_pre_process,
+    quantize_static,
+)
+
+from configs import paths
+from configs.poseMF_shapeGaussian_net_config import (
+    get_poseMF_shapeGaussian_cfg_defaults,
+)
+from configs.pose2D_hrnet_config import get_pose2D_hrnet_cfg_defaults
+from data.ssp3d_eval_dataset import SSP3DEvalDataset
+from models.canny_edge_detector import CannyEdgeDetector
+from models.onnx_models import (
+    ONNX_HRNET_FNAME,
+    ONNX_POSE_SHAPE_ENCODER_FNAME,
+    get_onnx_path,
+)
+from predict.predict_hrnet import crop_hrnet_inputs, normalise_hrnet_input
+
+# Convolutional encoder ops, the FC heads (Gemm) of the distribution predictor stay in float
+QUANTIZED_OP_TYPES = ["Conv", "Relu", "Add", "Resize", "MaxPool"]
+
+
+class InputCalibrationDataReader(CalibrationDataReader):
+    def __init__(self, input_name, inputs):
+        """
+        :param inputs: list of numpy arrays, the graph inputs to calibrate the activation ranges on.
+        """
+        self.input_name = input_name
+        self.inputs = iter(inputs)
+
+    def get_next(self):
+        input = next(self.inputs, None)
+        if input is None:
+            return None
+        return {self.input_name: input}
+
+
+def get_calibration_inputs(
+    ssp3d_dir_path, pose_shape_cfg, hrnet_cfg, num_images, seed=0
+):
+    """
+    Draws random SSP-3D images and creates the HRNet and distribution predictor inputs for them,
+    like run_predict.py with already cropped images. The proxy representations use the labelled
+    2D joints, like run_evaluate.py.
+    :return: hrnet_inputs: list of (1, 3, 384, 288) arrays.
+    :return: proxy_rep_inputs: list of (1, 18, 256, 256) arrays.
+    """
+    eval_dataset = SSP3DEvalDataset(ssp3d_dir_path=ssp3d_dir_path, config=pose_shape_cfg)
+    indices = np.random.RandomState(seed).choice(
+        len(eval_dataset), size=min(num_images, len(eval_dataset)), replace=False
+    )
+    edge_detect_model = CannyEdgeDetector(
+        non_max_suppression=pose_shape_cfg.DATA.EDGE_NMS,
+        gaussian_filter_std=pose_shape_cfg.DATA.EDGE_GAUSSIAN_STD,
+        gaussian_filter_size=pose_shape_cfg.DATA.EDGE_GAUSSIAN_SIZE,
+        threshold=pose_shape_cfg.DATA.EDGE_THRESHOLD,
+    )
+
+    hrnet_inputs, proxy_rep_inputs = [], []
+    with torch.no_grad():
+        for index in indices:
+            sample = eval_dataset[index]
+            image = sample["image"][None]  # (1, 3, 256, 256) crop around the person
+            hrnet_crop = crop_hrnet_inputs(
+                hrnet_config=hrnet_cfg,
+                images=[image[0]],
+                object_preds=[None],
+                bbox_scale_factor=pose_shape_cfg.DATA.BBOX_SCALE_FACTOR,
+            )
+            hrnet_inputs.append(
+                normalise_hrnet_input(hrnet_crop["cropped_image"]).numpy()
+            )
+
+            edge_detector_output = edge_detect_model(image)
+            proxy_rep_img = (
+                edge_detector_output["thresholded_thin_edges"]
+                if pose_shape_cfg.DATA.EDGE_NMS
+                else edge_detector_output["thresholded_grad_magnitude"]
+            )
+            proxy_rep_inputs.append(
+                torch.cat([proxy_rep_img, sample["heatmaps"][None]], dim=1).numpy()
+            )
+    return hrnet_inputs, proxy_rep_inputs
+
+
+def quantize_onnx_graph(onnx_path, quantized_onnx_path, inputs):
+    """
+    Post-training static INT8 quantization of an exported graph: per-channel signed INT8 weights
+    and unsigned INT8 activations, whose ranges are calibrated on inputs.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Shape inference and graph optimisation before quantization. Symbolic shape
+        # inference does not resolve the HRNet upsampling with a dynamic batch size.
+        preprocessed_onnx_path = os.path.join(tmp_dir, "preprocessed.onnx")
+        quant_pre_process(onnx_path, preprocessed_onnx_path, skip_symbolic_shape=True)
+        quantize_static(
+            preprocessed_onnx_path,
+            quantized_onnx_path,
+            InputCalibrationDataReader("input", inputs),
+            quant_format=QuantFormat.QDQ,
+            op_types_to_quantize=QUANTIZED_OP_TYPES,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,  # U8S8 has the fast kernels on x86
+            weight_type=QuantType.QInt8,
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+    print(
+        "Wrote {} ({:.1f} MB, float {:.1f} MB)".format(
+            quantized_onnx_path,
+            os.path.getsize(quantized_onnx_path) / 2**20,
+            os.path.getsize(onnx_path) / 2**20,
+        )
+    )
+
+
+def quantize_onnx(
+    onnx_dir, genders, ssp3d_dir_path, num_calibration_images, pose_shape_cfg_path=None
+):
+    """
+    Quantizes the graphs written by export_onnx.py to INT8, for run_predict.py --quantized.
+    Calibrated on SSP-3D images, the accuracy of the quantized graphs is evaluated with
+    run_evaluate.py --quantized.
+    """
+    pose_shape_cfg = get_poseMF_shapeGaussian_cfg_defaults()
+    if pose_shape_cfg_path is not None:
+        pose_shape_cfg.merge_from_file(pose_shape_cfg_path)
+    hrnet_cfg = get_pose2D_hrnet_cfg_defaults()
+
+    hrnet_inputs, proxy_rep_inputs = get_calibration_inputs(
+        ssp3d_dir_path=ssp3d_dir_path,
+        pose_shape_cfg=pose_shape_cfg,
+        hrnet_cfg=hrnet_cfg,
+        num_images=num_calibration_images,
+    )
+    print("\nCalibrating on {} SSP-3D images.".format(len(hrnet_inputs)))
+
+    quantize_onnx_graph(
+        get_onnx_path(onnx_dir, ONNX_HRNET_FNAME),
+        get_onnx_path(onnx_dir, ONNX_HRNET_FNAME, quantized=True),
+        hrnet_inputs,
+    )
+    for gender in genders:
+        encoder_fname = ONNX_POSE_SHAPE_ENCODER_FNAME.format(gender=gender)
+        quantize_onnx_graph(
+            get_onnx_path(onnx_dir, encoder_fname),
+            get_onnx_path(onnx_dir, encoder_fname, quantized=True),
+            proxy_rep_inputs,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--onnx_dir",
+        type=str,
+        default="./model_files/onnx",
+        help="Directory of the graphs written by export_onnx.py, the INT8 graphs are written next "
+        "to them.",
+    )
+    parser.add_argument(
+        "--genders",
+        "-G",
+        type=str,
+        nargs="+",
+        default=["male", "female"],
+        choices=["neutral", "male", "female"],
+    )
+    parser.add_argument("--ssp3d_dir", type=str, default=paths.SSP3D_PATH)
+    parser.add_argument(
+        "--num_calibration_images",
+        "-N",
+        type=int,
+        default=64,
+        help="Number of random SSP-3D images to calibrate the activation ranges on.",
+    )
+    parser.add_argument("--pose_shape_cfg", type=str, default=None)
+    args = parser.parse_args()
+
+    quantize_onnx(
+        onnx_dir=args.onnx_dir,
+        genders=args.genders,
+        ssp3d_dir_path=args.ssp3d_dir,
+        num_calibration_images=args.num_calibration_images,
+        pose_shape_cfg_path=args.pose_shape_cfg,
+    )
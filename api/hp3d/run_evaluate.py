@@ -5,21 +5,38 @@ import argparse
 
 from configs import paths
 from configs.poseMF_shapeGaussian_net_config import get_poseMF_shapeGaussian_cfg_defaults
+from configs.pose2D_hrnet_config import get_pose2D_hrnet_cfg_defaults
 
 from data.pw3d_eval_dataset import PW3DEvalDataset
 from data.ssp3d_eval_dataset import SSP3DEvalDataset
 
 from models.smpl_official import SMPL
 from models.poseMF_shapeGaussian_net import PoseMFShapeGaussianNet
+from models.pose2D_hrnet import PoseHighResolutionNet
 from models.canny_edge_detector import CannyEdgeDetector
+from models.onnx_models import ONNXRuntimeHRNet, ONNXRuntimePoseMFShapeGaussianNet, ONNX_HRNET_FNAME, \
+    ONNX_POSE_SHAPE_ENCODER_FNAME, get_onnx_path
 from evaluate.evaluate_poseMF_shapeGaussian_net import evaluate_pose_MF_shapeGaussian_net
 
+from utils.checkpoint_utils import check_analytic_svd
+
 
 def run_evaluate(device,
                  dataset_name,
                  pose_shape_weights_path,
                  pose_shape_cfg_path=None,
-                 num_samples_for_metrics=10):
+                 num_samples_for_metrics=10,
+                 hrnet_joints=False,
+                 pose2D_hrnet_weights_path=None,
+                 onnx_dir=None,
+                 quantized=False):
+    """
+    :param hrnet_joints: predict the input 2D joints with HRNet instead of using the labelled 2D joints
+    :param onnx_dir: directory of the graphs written by export_onnx.py (with -G neutral for the evaluated weights), to
+        run HRNet and the distribution predictor encoder with ONNX Runtime
+    :param quantized: additionally evaluate the INT8 graphs written by quantize_onnx.py and print the difference of
+        each metric to the float graphs
+    """
 
     # ------------------ Models ------------------
     # Config
@@ -52,9 +69,18 @@ def run_evaluate(device,
     pose_shape_dist_model = PoseMFShapeGaussianNet(smpl_parents=smpl_immediate_parents,
                                                    config=pose_shape_cfg).to(device)
     checkpoint = torch.load(pose_shape_weights_path, map_location=device)
+    check_analytic_svd(pose_shape_cfg, checkpoint.get('analytic_svd', False), pose_shape_weights_path)
     pose_shape_dist_model.load_state_dict(checkpoint['best_model_state_dict'])
     print('\nLoaded Distribution Predictor weights from', pose_shape_weights_path)
 
+    # HRNet
+    hrnet_cfg = get_pose2D_hrnet_cfg_defaults()
+    hrnet_model = None
+    if hrnet_joints and onnx_dir is None:
+        hrnet_model = PoseHighResolutionNet(hrnet_cfg).to(device)
+        hrnet_model.load_state_dict(torch.load(pose2D_hrnet_weights_path, map_location=device), strict=False)
+        print('\nLoaded HRNet weights from', pose2D_hrnet_weights_path)
+
     # ------------------ Dataset + Metrics ------------------
     if dataset_name == '3dpw':
         metrics = ['PVE', 'PVE-SC', 'PVE-PA', 'PVE-T-SC', 'MPJPE', 'MPJPE-SC', 'MPJPE-PA']
@@ -74,24 +100,45 @@ def run_evaluate(device,
     print("Metrics:", metrics)
     print("Saving to:", save_path)
 
-    if not os.path.exists(save_path):
-        os.makedirs(save_path)
-
     # ------------------ Evaluate ------------------
-    torch.manual_seed(0)
-    np.random.seed(0)
-    evaluate_pose_MF_shapeGaussian_net(pose_shape_model=pose_shape_dist_model,
-                                       pose_shape_cfg=pose_shape_cfg,
-                                       smpl_model=smpl_model,
-                                       smpl_model_male=smpl_model_male,
-                                       smpl_model_female=smpl_model_female,
-                                       edge_detect_model=edge_detect_model,
-                                       device=device,
-                                       eval_dataset=eval_dataset,
-                                       metrics=metrics,
-                                       save_path=save_path,
-                                       num_samples_for_metrics=num_samples_for_metrics,
-                                       sample_on_cpu=True)
+    final_metrics = {}
+    for onnx_quantized in ([False, True] if quantized else [False]):
+        eval_pose_shape_model = pose_shape_dist_model
+        eval_hrnet_model = hrnet_model
+        eval_save_path = save_path + ('_int8' if onnx_quantized else '')
+        if onnx_dir is not None:
+            eval_pose_shape_model = ONNXRuntimePoseMFShapeGaussianNet(
+                get_onnx_path(onnx_dir, ONNX_POSE_SHAPE_ENCODER_FNAME.format(gender='neutral'), quantized=onnx_quantized),
+                pose_shape_model=pose_shape_dist_model)
+            if hrnet_joints:
+                eval_hrnet_model = ONNXRuntimeHRNet(get_onnx_path(onnx_dir, ONNX_HRNET_FNAME, quantized=onnx_quantized))
+            print('\nEvaluating {} ONNX Runtime graphs from {}'.format('INT8' if onnx_quantized else 'float', onnx_dir))
+
+        if not os.path.exists(eval_save_path):
+            os.makedirs(eval_save_path)
+
+        torch.manual_seed(0)
+        np.random.seed(0)
+        final_metrics[onnx_quantized] = evaluate_pose_MF_shapeGaussian_net(pose_shape_model=eval_pose_shape_model,
+                                                                           pose_shape_cfg=pose_shape_cfg,
+                                                                           smpl_model=smpl_model,
+                                                                           smpl_model_male=smpl_model_male,
+                                                                           smpl_model_female=smpl_model_female,
+                                                                           edge_detect_model=edge_detect_model,
+                                                                           device=device,
+                                                                           eval_dataset=eval_dataset,
+                                                                           metrics=metrics,
+                                                                           save_path=eval_save_path,
+                                                                           num_samples_for_metrics=num_samples_for_metrics,
+                                                                           sample_on_cpu=True,
+                                                                           hrnet_model=eval_hrnet_model,
+                                                                           hrnet_cfg=hrnet_cfg)
+
+    if quantized:
+        print('\nINT8 - float:')
+        for metric in metrics:
+            print(metric, '{:+.2f}'.format(final_metrics[True][metric] - final_metrics[False][metric]))
+    return final_metrics
 
 
 if __name__ == '__main__':
@@ -101,18 +148,35 @@ if __name__ == '__main__':
     parser.add_argument('--pose_shape_cfg', type=str, default=None)
     parser.add_argument('--num_samples', '-N', type=int, default=10, help='Number of samples to use for sample-based evaluation metrics.')
     parser.add_argument('--gpu', type=int, default=0)
+    parser.add_argument('--hrnet_joints', action='store_true',
+                        help='Predict the input 2D joints with HRNet instead of using the labelled 2D joints.')
+    parser.add_argument('--pose2D_hrnet_weights', '-W2D', type=str, default='./model_files/pose_hrnet_w48_384x288.pth')
+    parser.add_argument('--backend', type=str, default='torch', choices=['torch', 'onnxruntime'])
+    parser.add_argument('--onnx_dir', type=str, default='./model_files/onnx',
+                        help='Directory of the graphs written by export_onnx.py -G neutral, for --backend onnxruntime.')
+    parser.add_argument('--quantized', action='store_true',
+                        help='Also evaluate the INT8 graphs written by quantize_onnx.py and print the difference to the '
+                             'float graphs, implies --backend onnxruntime.')
     args = parser.parse_args()
+    if args.quantized:
+        args.backend = 'onnxruntime'
 
     os.environ["CUDA_DEVICE_ORDER"] = "PCI_BUS_ID"  # see issue #152
     os.environ["CUDA_VISIBLE_DEVICES"] = str(args.gpu)
     device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    if args.backend == 'onnxruntime':
+        device = torch.device('cpu')  # ONNX Runtime backend is CPU-only
     print('\nDevice: {}'.format(device))
 
     run_evaluate(device=device,
                  dataset_name=args.dataset,
                  pose_shape_weights_path=args.pose_shape_weights,
                  pose_shape_cfg_path=args.pose_shape_cfg,
-                 num_samples_for_metrics=args.num_samples)
+                 num_samples_for_metrics=args.num_samples,
+                 hrnet_joints=args.hrnet_joints,
+                 pose2D_hrnet_weights_path=args.pose2D_hrnet_weights,
+                 onnx_dir=args.onnx_dir if args.backend == 'onnxruntime' else None,
+                 quantized=args.quantized)
 
 
 
@@ -1,13 +1,20 @@
 import os
+import json
 import torch
-import torchvision
 import numpy as np
 import argparse
 
 from models.poseMF_shapeGaussian_net import PoseMFShapeGaussianNet
 from models.smpl_official import SMPL
 from models.pose2D_hrnet import PoseHighResolutionNet
-from models.canny_edge_detector import CannyEdgeDetector
+from models.canny_edge_detector import CannyEdgeDetector, compile_edge_detector
+from models.onnx_models import (
+    ONNXRuntimeHRNet,
+    ONNXRuntimePoseMFShapeGaussianNet,
+    ONNX_HRNET_FNAME,
+    ONNX_POSE_SHAPE_ENCODER_FNAME,
+    get_onnx_path,
+)
 
 from configs.poseMF_shapeGaussian_net_config import (
     get_poseMF_shapeGaussian_cfg_defaults,
@@ -15,26 +22,42 @@ from configs.poseMF_shapeGaussian_net_config import (
 from configs.pose2D_hrnet_config import get_pose2D_hrnet_cfg_defaults
 from configs import paths
 
-from predict.predict_poseMF_shapeGaussian_net import predict_poseMF_shapeGaussian_net
+from predict.predict_poseMF_shapeGaussian_net import (
+    predict_poseMF_shapeGaussian_net,
+    OUTPUTS,
+)
+from predict.person_detectors import build_person_detector
+from predict.proxy_rep_cache import ProxyRepCache
+from utils.checkpoint_utils import check_analytic_svd
+from utils.mesh_writer import MESH_FORMATS
+from utils.model_bundle import (
+    ModelBundle,
+    build_from_state_dict,
+    compute_files_version,
+)
 
 
-def run_predict(
+def load_shared_models(
     device,
-    image_dir,
-    save_dir,
-    height,  # Added height to scale to real height
-    pose_shape_weights_path,
     pose2D_hrnet_weights_path,
     pose_shape_cfg_path=None,
     already_cropped_images=False,
-    visualise_samples=False,
-    visualise_uncropped=False,
-    joints2Dvisib_threshold=0.75,
-    gender="neutral",
-    export_obj=False,  # Added export option
+    edge_detect_compile_mode=None,
+    model_bundle=None,
+    onnx_dir=None,
+    onnx_quantized=False,
 ):
-
-    # ------------------------- Models -------------------------
+    """
+    Loads the gender-independent models (object detector, HRNet and edge detector).
+    :param edge_detect_compile_mode: None, or 'script'/'compile' to compile the edge detector with
+    TorchScript/torch.compile.
+    :param model_bundle: utils.model_bundle.ModelBundle to load the weights from instead of
+    pose2D_hrnet_weights_path and the torch hub.
+    :param onnx_dir: directory of the graphs written by export_onnx.py, to run HRNet with ONNX
+    Runtime on the CPU instead of PyTorch.
+    :param onnx_quantized: use the INT8 graph written by quantize_onnx.py in onnx_dir.
+    :return: dict with configs and models, which can be re-used across predictions.
+    """
     # Configs
     pose2D_hrnet_cfg = get_pose2D_hrnet_cfg_defaults()
     pose_shape_cfg = get_poseMF_shapeGaussian_cfg_defaults()
@@ -44,20 +67,45 @@ def run_predict(
     else:
         print("\nUsing default Distribution Predictor config.")
 
+    # HRNet model for 2D joint detection
+    if onnx_dir is not None:
+        hrnet_model = ONNXRuntimeHRNet(
+            get_onnx_path(onnx_dir, ONNX_HRNET_FNAME, quantized=onnx_quantized)
+        )
+        print("\nLoaded HRNet graph from", hrnet_model.onnx_path)
+    elif model_bundle is not None:
+        hrnet_model = build_from_state_dict(
+            lambda: PoseHighResolutionNet(pose2D_hrnet_cfg),
+            model_bundle.state_dict("hrnet"),
+        ).to(device)
+        print("\nLoaded HRNet weights from", model_bundle.path)
+    else:
+        hrnet_model = PoseHighResolutionNet(pose2D_hrnet_cfg).to(device)
+        hrnet_checkpoint = torch.load(pose2D_hrnet_weights_path, map_location=device)
+        hrnet_model.load_state_dict(hrnet_checkpoint, strict=False)
+        print("\nLoaded HRNet weights from", pose2D_hrnet_weights_path)
+
     # Bounding box / Object detection model
     if not already_cropped_images:
-        object_detect_model = torchvision.models.detection.maskrcnn_resnet50_fpn(
-            pretrained=True
-        ).to(device)
+        object_detect_state_dict = None
+        if model_bundle is not None and model_bundle.has(
+            "detector." + pose_shape_cfg.DATA.BBOX_DETECTOR
+        ):
+            object_detect_state_dict = model_bundle.state_dict(
+                "detector." + pose_shape_cfg.DATA.BBOX_DETECTOR
+            )
+        object_detect_model = build_person_detector(
+            name=pose_shape_cfg.DATA.BBOX_DETECTOR,
+            device=device,
+            hrnet_model=hrnet_model,
+            hrnet_config=pose2D_hrnet_cfg,
+            state_dict=object_detect_state_dict,
+            allow_download=model_bundle is None,
+        )
+        print("\nUsing person detector", pose_shape_cfg.DATA.BBOX_DETECTOR)
     else:
         object_detect_model = None
 
-    # HRNet model for 2D joint detection
-    hrnet_model = PoseHighResolutionNet(pose2D_hrnet_cfg).to(device)
-    hrnet_checkpoint = torch.load(pose2D_hrnet_weights_path, map_location=device)
-    hrnet_model.load_state_dict(hrnet_checkpoint, strict=False)
-    print("\nLoaded HRNet weights from", pose2D_hrnet_weights_path)
-
     # Edge detector
     edge_detect_model = CannyEdgeDetector(
         non_max_suppression=pose_shape_cfg.DATA.EDGE_NMS,
@@ -65,49 +113,217 @@ def run_predict(
         gaussian_filter_size=pose_shape_cfg.DATA.EDGE_GAUSSIAN_SIZE,
         threshold=pose_shape_cfg.DATA.EDGE_THRESHOLD,
     ).to(device)
+    if edge_detect_compile_mode is not None:
+        edge_detect_model = compile_edge_detector(
+            edge_detect_model, mode=edge_detect_compile_mode
+        )
 
-    # SMPL model
+    return {
+        "pose_shape_cfg": pose_shape_cfg,
+        "hrnet_cfg": pose2D_hrnet_cfg,
+        "object_detect_model": object_detect_model,
+        "hrnet_model": hrnet_model,
+        "edge_detect_model": edge_detect_model,
+    }
+
+
+def load_smpl_model(device, gender, num_betas, model_bundle=None):
+    """
+    Loads the SMPL model of one gender.
+    :param model_bundle: utils.model_bundle.ModelBundle to load the SMPL model from instead of
+    paths.SMPL.
+    """
     print(
-        "\nUsing {} SMPL model with {} shape parameters.".format(
-            gender, str(pose_shape_cfg.MODEL.NUM_SMPL_BETAS)
-        )
+        "\nUsing {} SMPL model with {} shape parameters.".format(gender, str(num_betas))
     )
-    smpl_model = SMPL(
+    smpl_bundle_kwargs = {}
+    if model_bundle is not None:
+        smpl_bundle_kwargs = dict(
+            data_struct=model_bundle.smpl_data_struct(gender),
+            **model_bundle.smpl_J_regressors(),
+        )
+    return SMPL(
         paths.SMPL,
         batch_size=1,
         gender=gender,
-        num_betas=pose_shape_cfg.MODEL.NUM_SMPL_BETAS,
+        num_betas=num_betas,
+        **smpl_bundle_kwargs,
     ).to(device)
+
+
+def load_gendered_models(
+    device,
+    pose_shape_cfg,
+    pose_shape_weights_path,
+    gender,
+    model_bundle=None,
+    onnx_dir=None,
+    onnx_quantized=False,
+):
+    """
+    Loads the SMPL model and the 3D shape and pose distribution predictor for one gender.
+    :param model_bundle: utils.model_bundle.ModelBundle to load the SMPL model and the weights
+    from instead of paths.SMPL and pose_shape_weights_path.
+    :param onnx_dir: directory of the graphs written by export_onnx.py, to run the image encoder
+    and FC heads of the distribution predictor with ONNX Runtime on the CPU instead of PyTorch.
+    :param onnx_quantized: use the INT8 graph written by quantize_onnx.py in onnx_dir.
+    :return: dict with the SMPL model and the distribution predictor.
+    """
+    # SMPL model
+    smpl_model = load_smpl_model(
+        device=device,
+        gender=gender,
+        num_betas=pose_shape_cfg.MODEL.NUM_SMPL_BETAS,
+        model_bundle=model_bundle,
+    )
     smpl_immediate_parents = smpl_model.parents.tolist()
 
     # 3D shape and pose distribution predictor
-    pose_shape_dist_model = PoseMFShapeGaussianNet(
-        smpl_parents=smpl_immediate_parents, config=pose_shape_cfg
-    ).to(device)
-    checkpoint = torch.load(pose_shape_weights_path, map_location=device)
-    pose_shape_dist_model.load_state_dict(checkpoint["best_model_state_dict"])
-    print("\nLoaded Distribution Predictor weights from", pose_shape_weights_path)
+    if model_bundle is not None:
+        check_analytic_svd(
+            pose_shape_cfg,
+            gender in model_bundle.metadata.get("analytic_svd", "").split(","),
+            model_bundle.path,
+        )
+        pose_shape_dist_model = build_from_state_dict(
+            lambda: PoseMFShapeGaussianNet(
+                smpl_parents=smpl_immediate_parents, config=pose_shape_cfg
+            ),
+            model_bundle.state_dict("pose_shape." + gender),
+        ).to(device)
+        print("\nLoaded Distribution Predictor weights from", model_bundle.path)
+    else:
+        pose_shape_dist_model = PoseMFShapeGaussianNet(
+            smpl_parents=smpl_immediate_parents, config=pose_shape_cfg
+        ).to(device)
+        checkpoint = torch.load(pose_shape_weights_path, map_location=device)
+        check_analytic_svd(
+            pose_shape_cfg,
+            checkpoint.get("analytic_svd", False),
+            pose_shape_weights_path,
+        )
+        pose_shape_dist_model.load_state_dict(checkpoint["best_model_state_dict"])
+        print("\nLoaded Distribution Predictor weights from", pose_shape_weights_path)
+    if onnx_dir is not None:
+        pose_shape_dist_model = ONNXRuntimePoseMFShapeGaussianNet(
+            get_onnx_path(
+                onnx_dir,
+                ONNX_POSE_SHAPE_ENCODER_FNAME.format(gender=gender),
+                quantized=onnx_quantized,
+            ),
+            pose_shape_model=pose_shape_dist_model,
+        )
+        print(
+            "\nLoaded Distribution Predictor encoder graph from",
+            pose_shape_dist_model.onnx_path,
+        )
+
+    return {"smpl_model": smpl_model, "pose_shape_model": pose_shape_dist_model}
+
+
+def run_predict(
+    device,
+    image_dir,
+    save_dir,
+    height,  # Added height to scale to real height
+    pose_shape_weights_path,
+    pose2D_hrnet_weights_path,
+    pose_shape_cfg_path=None,
+    already_cropped_images=False,
+    visualise_uncropped=False,
+    joints2Dvisib_threshold=0.75,
+    gender="neutral",
+    outputs=("vis",),  # Added outputs option, e.g. ("mesh",) to only export the obj
+    batch_size=1,  # Added batched prediction
+    edge_detect_compile_mode=None,  # Added edge detector compilation
+    bbox_hints=None,  # Added person bounding box hints
+    model_bundle_path=None,  # Added inference weight bundle
+    onnx_dir=None,  # Added ONNX Runtime backend
+    onnx_quantized=False,  # Added INT8 quantized inference
+    mesh_format="obj",  # Added mesh formats
+    proxy_rep_cache_dir=None,  # Added proxy representation cache
+    proxy_rep_cache_bytes=1 << 30,
+):
+
+    # ------------------------- Models -------------------------
+    model_bundle = None
+    if model_bundle_path is not None:
+        model_bundle = ModelBundle(model_bundle_path)
+        print(
+            "\nUsing model bundle {} ({})".format(
+                model_bundle_path, model_bundle.version
+            )
+        )
+    shared_models = load_shared_models(
+        device=device,
+        pose2D_hrnet_weights_path=pose2D_hrnet_weights_path,
+        pose_shape_cfg_path=pose_shape_cfg_path,
+        already_cropped_images=already_cropped_images,
+        edge_detect_compile_mode=edge_detect_compile_mode,
+        model_bundle=model_bundle,
+        onnx_dir=onnx_dir,
+        onnx_quantized=onnx_quantized,
+    )
+    gendered_models = load_gendered_models(
+        device=device,
+        pose_shape_cfg=shared_models["pose_shape_cfg"],
+        pose_shape_weights_path=pose_shape_weights_path,
+        gender=gender,
+        model_bundle=model_bundle,
+        onnx_dir=onnx_dir,
+        onnx_quantized=onnx_quantized,
+    )
+
+    # Proxy representations of images predicted before, e.g. with the other gender
+    proxy_rep_cache = None
+    if proxy_rep_cache_dir is not None:
+        # The stage depends on the detector and HRNet weights and on the backend HRNet runs in,
+        # so a cache directory shared by FP32, ONNX and INT8 runs never mixes their entries
+        stage_versions = []
+        if model_bundle is not None:
+            stage_versions.append(model_bundle.version)
+        elif onnx_dir is None:
+            stage_versions.append(compute_files_version([pose2D_hrnet_weights_path]))
+        if onnx_dir is not None:
+            stage_versions += [
+                "onnxruntime",
+                compute_files_version([shared_models["hrnet_model"].onnx_path]),
+                "int8" if onnx_quantized else "fp32",
+            ]
+        else:
+            stage_versions.append("torch")
+        proxy_rep_cache = ProxyRepCache(
+            max_bytes=proxy_rep_cache_bytes,
+            cache_dir=proxy_rep_cache_dir,
+            version="-".join(stage_versions),
+        )
 
     # ------------------------- Predict -------------------------
     torch.manual_seed(0)
     np.random.seed(0)
     predict_poseMF_shapeGaussian_net(
-        pose_shape_model=pose_shape_dist_model,
-        pose_shape_cfg=pose_shape_cfg,
-        smpl_model=smpl_model,
-        hrnet_model=hrnet_model,
-        hrnet_cfg=pose2D_hrnet_cfg,
-        edge_detect_model=edge_detect_model,
+        pose_shape_model=gendered_models["pose_shape_model"],
+        pose_shape_cfg=shared_models["pose_shape_cfg"],
+        smpl_model=gendered_models["smpl_model"],
+        hrnet_model=shared_models["hrnet_model"],
+        hrnet_cfg=shared_models["hrnet_cfg"],
+        edge_detect_model=shared_models["edge_detect_model"],
         device=device,
         image_dir=image_dir,
         save_dir=save_dir,
         height=height,  # Added height to scale to real height
-        object_detect_model=object_detect_model,
+        object_detect_model=shared_models["object_detect_model"],
         joints2Dvisib_threshold=joints2Dvisib_threshold,
         visualise_uncropped=visualise_uncropped,
-        visualise_samples=visualise_samples,
-        export_obj=export_obj,  # Added export option
+        outputs=outputs,  # Added outputs option
+        batch_size=batch_size,  # Added batched prediction
+        bbox_hints=bbox_hints,  # Added person bounding box hints
+        mesh_format=mesh_format,  # Added mesh formats
+        gender=gender,  # Added SMPL parameter export
+        proxy_rep_cache=proxy_rep_cache,  # Added proxy representation cache
     )
+    if proxy_rep_cache is not None:
+        print("Proxy representation cache:", proxy_rep_cache.stats())
 
 
 if __name__ == "__main__":
@@ -154,20 +370,120 @@ if __name__ == "__main__":
     parser.add_argument("--gpu", type=int, default=0)
     parser.add_argument(
         "--export_obj", "-EO", action="store_true"
-    )  # Added export option
+    )  # Added export option, same as adding mesh to --outputs
+    parser.add_argument(
+        "--outputs",
+        "-O",
+        type=str,
+        default="vis",
+        help="Comma-separated outputs to write per image: {}. "
+        "With only mesh, sampling and rendering are skipped.".format(
+            ", ".join(OUTPUTS)
+        ),
+    )  # Added outputs option
+    parser.add_argument(
+        "--mesh_format",
+        type=str,
+        default="obj",
+        choices=MESH_FORMATS,
+        help="File format of the mesh output.",
+    )  # Added mesh formats
     parser.add_argument(
         "--height", "-H", type=float, required=True
     )  # Added height float
+    parser.add_argument(
+        "--batch_size",
+        "-B",
+        type=int,
+        default=1,
+        help="Number of images predicted at once.",
+    )  # Added batched prediction
+    parser.add_argument(
+        "--compile_edge_detector",
+        type=str,
+        default=None,
+        choices=["script", "compile"],
+        help="Compile the edge detector with TorchScript or torch.compile.",
+    )  # Added edge detector compilation
+    parser.add_argument(
+        "--bbox_hints",
+        type=str,
+        default=None,
+        help="JSON file mapping image filenames to [x1, y1, x2, y2] person bounding boxes, "
+        "given as fractions of the image width/height. Skips person detection for them.",
+    )  # Added person bounding box hints
+    parser.add_argument(
+        "--model_bundle",
+        type=str,
+        default=None,
+        help="Inference weight bundle written by pack_model_bundle.py, "
+        "replaces the weight and SMPL files.",
+    )  # Added inference weight bundle
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="torch",
+        choices=["torch", "onnxruntime"],
+        help="Run HRNet and the distribution predictor encoder with PyTorch or with ONNX Runtime "
+        "on the CPU.",
+    )  # Added ONNX Runtime backend
+    parser.add_argument(
+        "--onnx_dir",
+        type=str,
+        default="./model_files/onnx",
+        help="Directory of the graphs written by export_onnx.py, for --backend onnxruntime.",
+    )  # Added ONNX Runtime backend
+    parser.add_argument(
+        "--quantized",
+        action="store_true",
+        help="Run the INT8 graphs written by quantize_onnx.py, implies --backend onnxruntime.",
+    )  # Added INT8 quantized inference
+    parser.add_argument(
+        "--proxy_rep_cache_dir",
+        type=str,
+        default=None,
+        help="Directory to cache the object detector, HRNet and edge detector outputs per image "
+        "in, so predicting the same images with another gender only runs the distribution "
+        "predictor and SMPL.",
+    )  # Added proxy representation cache
+    parser.add_argument(
+        "--proxy_rep_cache_mb",
+        type=int,
+        default=1024,
+        help="Size budget of the proxy representation cache in MiB.",
+    )
     args = parser.parse_args()
+    if args.quantized:
+        args.backend = "onnxruntime"
 
     os.environ["CUDA_DEVICE_ORDER"] = "PCI_BUS_ID"  # see issue #152
     os.environ["CUDA_VISIBLE_DEVICES"] = str(args.gpu)
     device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    if args.backend == "onnxruntime":
+        device = torch.device("cpu")  # ONNX Runtime backend is CPU-only
     print("\nDevice: {}".format(device))
 
     if not os.path.exists(args.save_dir):
         os.makedirs(args.save_dir)
 
+    outputs = [output for output in args.outputs.split(",") if output]
+    if args.export_obj and "mesh" not in outputs:
+        outputs.append("mesh")
+    if args.visualise_samples and "samples" not in outputs:
+        outputs.append("samples")
+    unknown_outputs = set(outputs) - set(OUTPUTS)
+    if unknown_outputs:
+        parser.error(
+            "Unknown outputs {}, choose from {}".format(
+                ", ".join(sorted(unknown_outputs)), ", ".join(OUTPUTS)
+            )
+        )
+
+    bbox_hints = None
+    if args.bbox_hints is not None:
+        with open(args.bbox_hints, "r") as f:
+            bbox_hints = json.load(f)
+
     run_predict(
         device=device,
         image_dir=args.image_dir,
@@ -177,9 +493,17 @@ if __name__ == "__main__":
         pose_shape_cfg_path=args.pose_shape_cfg,
         pose2D_hrnet_weights_path=args.pose2D_hrnet_weights,
         already_cropped_images=args.cropped_images,
-        visualise_samples=args.visualise_samples,
         visualise_uncropped=args.visualise_uncropped,
         joints2Dvisib_threshold=args.joints2Dvisib_threshold,
         gender=args.gender,
-        export_obj=args.export_obj,  # Added export option
+        outputs=outputs,  # Added outputs option
+        batch_size=args.batch_size,  # Added batched prediction
+        edge_detect_compile_mode=args.compile_edge_detector,  # Added edge detector compilation
+        bbox_hints=bbox_hints,  # Added person bounding box hints
+        model_bundle_path=args.model_bundle,  # Added inference weight bundle
+        onnx_dir=args.onnx_dir if args.backend == "onnxruntime" else None,
+        onnx_quantized=args.quantized,  # Added INT8 quantized inference
+        mesh_format=args.mesh_format,  # Added mesh formats
+        proxy_rep_cache_dir=args.proxy_rep_cache_dir,  # Added proxy representation cache
+        proxy_rep_cache_bytes=args.proxy_rep_cache_mb * 2**20,
     )
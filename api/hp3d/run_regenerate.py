@@ -0,0 +1,126 @@
+import os
+import argparse
+import torch
+
+from predict.regenerate_smpl_mesh import POSES, regenerate_smpl_vertices
+from run_predict import load_smpl_model
+from utils.mesh_writer import MESH_FORMATS, get_mesh_writer
+from utils.model_bundle import ModelBundle
+from utils.smpl_params import load_smpl_params
+
+
+def run_regenerate(
+    device,
+    params_paths,
+    save_dir,
+    height=None,
+    pose="predicted",
+    mesh_format="obj",
+    gender=None,
+    model_bundle_path=None,
+):
+    """
+    Regenerates meshes from the SMPL parameters written by run_predict.py with --outputs params,
+    e.g. for another height, a T-pose/A-pose variant or another mesh format. Only the SMPL model
+    is loaded, the networks are not run.
+    :param height: height in meters, by default the height of each prediction.
+    :param gender: gender of the SMPL model, by default the gender stored with the parameters.
+    """
+    model_bundle = None
+    if model_bundle_path is not None:
+        model_bundle = ModelBundle(model_bundle_path)
+    smpl_models = {}
+
+    for params_path in params_paths:
+        params = load_smpl_params(params_path)
+        params_gender = gender or params["gender"] or "neutral"
+        if params_gender not in smpl_models:
+            smpl_models[params_gender] = load_smpl_model(
+                device=device,
+                gender=params_gender,
+                num_betas=params["betas"].shape[0],
+                model_bundle=model_bundle,
+            )
+        vertices = regenerate_smpl_vertices(
+            smpl_model=smpl_models[params_gender],
+            params=params,
+            height=height,
+            pose=pose,
+        )
+
+        fname = os.path.basename(params_path)
+        if fname.endswith("_params.npz"):
+            fname = fname[: -len("_params.npz")]
+        else:
+            fname = os.path.splitext(fname)[0]
+        if pose != "predicted":
+            fname += "_" + pose
+        out_path = os.path.join(save_dir, fname + "." + mesh_format)
+        get_mesh_writer(smpl_models[params_gender].faces).write(
+            out_path, vertices, file_format=mesh_format, smooth=True
+        )
+        print("Wrote", out_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--params",
+        "-P",
+        type=str,
+        nargs="+",
+        required=True,
+        help="SMPL parameter files written by run_predict.py with --outputs params.",
+    )
+    parser.add_argument(
+        "--save_dir",
+        "-S",
+        type=str,
+        required=True,
+        help="Path to directory where the meshes will be saved.",
+    )
+    parser.add_argument(
+        "--height",
+        "-H",
+        type=float,
+        default=None,
+        help="Height in meters, by default the height of the prediction.",
+    )
+    parser.add_argument("--pose", type=str, default="predicted", choices=POSES)
+    parser.add_argument(
+        "--mesh_format",
+        type=str,
+        default="obj",
+        choices=MESH_FORMATS,
+        help="File format of the mesh output.",
+    )
+    parser.add_argument(
+        "--gender",
+        "-G",
+        type=str,
+        default=None,
+        choices=["neutral", "male", "female"],
+        help="Gender of the SMPL model, by default the gender of the prediction.",
+    )
+    parser.add_argument("--model_bundle", type=str, default=None)
+    parser.add_argument("--gpu", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ["CUDA_DEVICE_ORDER"] = "PCI_BUS_ID"  # see issue #152
+    os.environ["CUDA_VISIBLE_DEVICES"] = str(args.gpu)
+    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    print("\nDevice: {}".format(device))
+
+    if not os.path.exists(args.save_dir):
+        os.makedirs(args.save_dir)
+
+    run_regenerate(
+        device=device,
+        params_paths=args.params,
+        save_dir=args.save_dir,
+        height=args.height,
+        pose=args.pose,
+        mesh_format=args.mesh_format,
+        gender=args.gender,
+        model_bundle_path=args.model_bundle,
+    )
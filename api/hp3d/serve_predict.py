@@ -0,0 +1,435 @@
+import io
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+import threading
+import argparse
+import numpy as np
+import torch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from minio import Minio
+from minio.error import S3Error
+
+from run_predict import load_shared_models, load_gendered_models
+from predict.predict_poseMF_shapeGaussian_net import predict_poseMF_shapeGaussian_net
+from predict.proxy_rep_cache import ProxyRepCache
+from predict.regenerate_smpl_mesh import POSES, regenerate_smpl_vertices
+from utils.mesh_writer import MESH_FORMATS, get_mesh_writer
+from utils.model_bundle import ModelBundle, compute_files_version
+from utils.smpl_params import SMPL_PARAMS_FNAME, load_smpl_params
+
+GENDERS = ["male", "female"]
+DATA_DIR = "/data"
+AVATAR_INDEX_PREFIX = "index/avatars"  # Must match the API config
+MIN_HEIGHT, MAX_HEIGHT = 1.40, 2.20  # Must match the API validation
+
+client = Minio(
+    endpoint=os.getenv("MINIO_ENDPOINT"),
+    access_key=os.getenv("MINIO_ACCESS_KEY"),
+    secret_key=os.getenv("MINIO_SECRET_KEY"),
+    secure=False,
+)
+
+
+def index_avatar(bucket_name, obj_key, obj_data):
+    """
+    Writes the avatar index entry mapping the SHA-256 of an obj to its key in the bucket.
+    :param obj_data: bytes of the obj.
+    :return: the SHA-256 hex digest of the obj.
+    """
+    digest = hashlib.sha256(obj_data).hexdigest()
+    data = obj_key.encode("utf-8")
+    client.put_object(
+        bucket_name, f"{AVATAR_INDEX_PREFIX}/{digest}", io.BytesIO(data), len(data)
+    )
+    return digest
+
+
+def validate_bbox_hint(bbox):
+    """
+    Validates a person bounding box hint of a prediction job.
+    :param bbox: [x1, y1, x2, y2] given as fractions of the image width/height.
+    :return: the bounding box as list of floats.
+    :raises ValueError: if the bounding box is malformed or empty.
+    """
+    if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
+        raise ValueError(f"Invalid bbox {bbox}, expected [x1, y1, x2, y2]")
+    x1, y1, x2, y2 = [float(coordinate) for coordinate in bbox]
+    if not (0.0 <= x1 < x2 <= 1.0 and 0.0 <= y1 < y2 <= 1.0):
+        raise ValueError(
+            f"Invalid bbox {bbox}, expected 0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1"
+        )
+    return [x1, y1, x2, y2]
+
+
+def validate_height(height):
+    """
+    Validates the height of a prediction or regeneration job, with the same range as the API.
+    :param height: height in meters.
+    :return: the height as float.
+    :raises ValueError: if the height is not a number between MIN_HEIGHT and MAX_HEIGHT.
+    """
+    height = float(height)
+    if not MIN_HEIGHT <= height <= MAX_HEIGHT:  # Also rejects NaN
+        raise ValueError(
+            f"Invalid height {height}, expected {MIN_HEIGHT} <= height <= {MAX_HEIGHT}"
+        )
+    return height
+
+
+class PredictionService:
+    """
+    Keeps the hp3d models resident in memory and runs prediction jobs on them.
+    Shared models (object detector, HRNet, edge detector) are loaded once, the SMPL model and
+    the distribution predictor checkpoint are loaded once per gender. With a model bundle, all
+    weights are read from the bundle and nothing is downloaded.
+    The model version identifies the weights the predictions are made with: the bundle version, or
+    a hash of the weight files and config. Predictions are deterministic for a model version.
+    The outputs of the object detector, HRNet and edge detector are cached per image, so an image
+    predicted again with the other gender only runs the distribution predictor and SMPL.
+    """
+
+    def __init__(
+        self,
+        device,
+        pose2D_hrnet_weights_path,
+        pose_shape_weights_template,
+        pose_shape_cfg_path=None,
+        genders=GENDERS,
+        edge_detect_compile_mode=None,
+        model_bundle_path=None,
+        proxy_rep_cache_bytes=256 * 2**20,
+    ):
+        self.device = device
+        self.model_bundle = None
+        if model_bundle_path is not None:
+            self.model_bundle = ModelBundle(model_bundle_path)
+            print(
+                f"\nUsing model bundle {model_bundle_path} ({self.model_bundle.version})"
+            )
+        self.shared_models = load_shared_models(
+            device=device,
+            pose2D_hrnet_weights_path=pose2D_hrnet_weights_path,
+            pose_shape_cfg_path=pose_shape_cfg_path,
+            edge_detect_compile_mode=edge_detect_compile_mode,
+            model_bundle=self.model_bundle,
+        )
+        self.gendered_models = {
+            gender: load_gendered_models(
+                device=device,
+                pose_shape_cfg=self.shared_models["pose_shape_cfg"],
+                pose_shape_weights_path=pose_shape_weights_template.format(
+                    gender=gender
+                ),
+                gender=gender,
+                model_bundle=self.model_bundle,
+            )
+            for gender in genders
+        }
+        if self.model_bundle is not None:
+            self.model_version = self.model_bundle.version
+        else:
+            weight_paths = [pose2D_hrnet_weights_path] + [
+                pose_shape_weights_template.format(gender=gender) for gender in genders
+            ]
+            if pose_shape_cfg_path is not None:
+                weight_paths.append(pose_shape_cfg_path)
+            self.model_version = compute_files_version(weight_paths)
+        self.proxy_rep_cache = ProxyRepCache(
+            max_bytes=proxy_rep_cache_bytes, version=self.model_version
+        )
+        # Only one prediction runs on the device at a time, transfers happen outside the lock.
+        self.lock = threading.Lock()
+
+    def predict(self, image_dir, save_dir, gender, height, bbox_hints=None):
+        """
+        Runs the prediction for all images in image_dir and exports the meshes as .obj and the SMPL
+        parameters as .npz in memory.
+        Images with a person bounding box hint in bbox_hints skip the object detector.
+        :return: dict mapping each image filename to its prediction (SMPL betas, obj and npz).
+        """
+        if gender not in self.gendered_models:
+            raise ValueError(f"Invalid gender {gender}")
+        gendered_models = self.gendered_models[gender]
+
+        with self.lock:
+            torch.manual_seed(0)
+            np.random.seed(0)
+            return predict_poseMF_shapeGaussian_net(
+                pose_shape_model=gendered_models["pose_shape_model"],
+                pose_shape_cfg=self.shared_models["pose_shape_cfg"],
+                smpl_model=gendered_models["smpl_model"],
+                hrnet_model=self.shared_models["hrnet_model"],
+                hrnet_cfg=self.shared_models["hrnet_cfg"],
+                edge_detect_model=self.shared_models["edge_detect_model"],
+                device=self.device,
+                image_dir=image_dir,
+                save_dir=save_dir,
+                height=height,
+                object_detect_model=self.shared_models["object_detect_model"],
+                outputs=("mesh", "params"),
+                bbox_hints=bbox_hints,
+                mesh_in_memory=True,
+                gender=gender,
+                proxy_rep_cache=self.proxy_rep_cache,
+            )
+
+    def regenerate(self, params, height=None, pose="predicted", mesh_format="obj"):
+        """
+        Regenerates the mesh of a prediction from its SMPL parameters, with the SMPL model only.
+        :param params: SMPL parameters loaded with utils.smpl_params.load_smpl_params.
+        :return: the encoded mesh as bytes.
+        """
+        if params["gender"] not in self.gendered_models:
+            raise ValueError(f"Invalid gender {params['gender']}")
+        if mesh_format not in MESH_FORMATS:
+            raise ValueError(f"Unknown mesh format {mesh_format}")
+        smpl_model = self.gendered_models[params["gender"]]["smpl_model"]
+
+        # The shaped template cache of the SMPL model is shared with the predictions
+        with self.lock:
+            vertices = regenerate_smpl_vertices(
+                smpl_model=smpl_model, params=params, height=height, pose=pose
+            )
+        return get_mesh_writer(smpl_model.faces).encode(
+            vertices, file_format=mesh_format, smooth=True
+        )
+
+    def run_job(self, bucket_name, image_key, gender, height, bbox=None):
+        """
+        Fetches an image from MinIO, predicts the 3D model and uploads it as model.obj next to the image.
+        The predicted SMPL parameters are uploaded next to it as params.npz.
+        A person bounding box hint (see validate_bbox_hint) replaces the object detection.
+        The obj is exported with vertex normals and shaded smooth, so it needs no post-processing.
+        :return: dict with the key and SHA-256 of the uploaded obj, the key of the SMPL parameters,
+        the predicted SMPL betas and the model version.
+        """
+        os.makedirs(DATA_DIR, exist_ok=True)
+        job_dir = tempfile.mkdtemp(dir=DATA_DIR)
+        image_dir = os.path.join(job_dir, "images")
+        save_dir = os.path.join(job_dir, "output")
+        os.makedirs(image_dir)
+        os.makedirs(save_dir)
+
+        try:
+            image_path = os.path.join(image_dir, os.path.basename(image_key))
+            client.fget_object(bucket_name, image_key, image_path)
+            print(f"Downloaded image to {image_path}")
+
+            bbox_hints = None
+            if bbox is not None:
+                bbox_hints = {os.path.basename(image_key): bbox}
+            predictions = self.predict(
+                image_dir, save_dir, gender, height, bbox_hints
+            )
+
+            # Uploaded straight from memory, without writing the obj to disk
+            prediction = predictions[os.path.basename(image_key)]
+            obj_data = prediction["mesh"]
+            upload_path = os.path.join(image_key.split("/")[0], "model.obj")
+            client.put_object(
+                bucket_name, upload_path, io.BytesIO(obj_data), len(obj_data)
+            )
+            digest = index_avatar(bucket_name, upload_path, obj_data)
+            print(f"Uploaded obj to {bucket_name}/{upload_path}")
+
+            params_data = prediction["params"]
+            params_path = os.path.join(image_key.split("/")[0], SMPL_PARAMS_FNAME)
+            client.put_object(
+                bucket_name, params_path, io.BytesIO(params_data), len(params_data)
+            )
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+        return {
+            "obj_key": upload_path,
+            "sha256": digest,
+            "params_key": params_path,
+            "betas": prediction["betas"],
+            "model_version": self.model_version,
+        }
+
+    def run_regenerate_job(
+        self, bucket_name, params_key, height=None, pose="predicted", mesh_format="obj"
+    ):
+        """
+        Fetches the SMPL parameters of a prediction from MinIO, regenerates its mesh and uploads it
+        next to the parameters as model_<pose>_<height in cm>cm.<format>, so model.obj and the
+        avatar index entries of other meshes stay valid. Takes milliseconds, no network is run.
+        :param height: height in meters, by default the height of the prediction.
+        :return: dict with the key of the uploaded mesh, its SHA-256 and the height.
+        """
+        response = client.get_object(bucket_name, params_key)
+        try:
+            params = load_smpl_params(response.read())
+        finally:
+            response.close()
+            response.release_conn()
+        if height is None:
+            height = params["height"]
+        height = validate_height(height)
+
+        mesh_data = self.regenerate(
+            params, height=height, pose=pose, mesh_format=mesh_format
+        )
+        upload_path = os.path.join(
+            os.path.dirname(params_key),
+            f"model_{pose}_{height * 100:g}cm.{mesh_format}",
+        )
+        client.put_object(
+            bucket_name, upload_path, io.BytesIO(mesh_data), len(mesh_data)
+        )
+        if mesh_format == "obj":
+            digest = index_avatar(bucket_name, upload_path, mesh_data)
+        else:
+            digest = hashlib.sha256(mesh_data).hexdigest()
+        print(f"Uploaded regenerated mesh to {bucket_name}/{upload_path}")
+
+        return {"mesh_key": upload_path, "sha256": digest, "height": height}
+
+
+class PredictRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the prediction service.
+    GET /health: readiness of the service, the loaded genders, the model version and the
+        statistics of the proxy representation cache.
+    POST /predict: {"bucket_name", "image_key", "gender", "height", optional "bbox"}
+        -> {"obj_key", "sha256", "params_key", "betas", "model_version"}
+    POST /regenerate: {"bucket_name", "params_key", optional "height", "pose", "format"}
+        -> {"mesh_key", "sha256", "height"}
+    """
+
+    service = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        self._send_json(
+            200,
+            {
+                "status": "ready",
+                "genders": list(self.service.gendered_models.keys()),
+                "model_version": self.service.model_version,
+                "proxy_rep_cache": self.service.proxy_rep_cache.stats(),
+            },
+        )
+
+    def do_POST(self):
+        if self.path not in ("/predict", "/regenerate"):
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = json.loads(self.rfile.read(length))
+            if self.path == "/regenerate":
+                result = self._regenerate(job)
+            else:
+                bbox = job.get("bbox")
+                if bbox is not None:
+                    bbox = validate_bbox_hint(bbox)
+                result = self.service.run_job(
+                    bucket_name=job["bucket_name"],
+                    image_key=job["image_key"],
+                    gender=job["gender"],
+                    height=validate_height(job["height"]),
+                    bbox=bbox,
+                )
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {"error": f"Invalid prediction job: {e}"})
+            return
+        except S3Error as e:
+            self._send_json(502, {"error": f"MinIO transfer failed: {e}"})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"Prediction failed: {e}"})
+            return
+
+        self._send_json(200, result)
+
+    def _regenerate(self, job):
+        height = job.get("height")
+        if height is not None:
+            height = validate_height(height)
+        pose = job.get("pose", "predicted")
+        if pose not in POSES:
+            raise ValueError(f"Invalid pose {pose}, expected one of {POSES}")
+        return self.service.run_regenerate_job(
+            bucket_name=job["bucket_name"],
+            params_key=job["params_key"],
+            height=height,
+            pose=pose,
+            mesh_format=job.get("format", "obj"),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", "-P", type=int, default=5000)
+    parser.add_argument(
+        "--pose_shape_weights_template",
+        type=str,
+        default="./model_files/poseMF_shapeGaussian_net_weights_{gender}.tar",
+        help="Checkpoint path with a {gender} placeholder.",
+    )
+    parser.add_argument("--pose_shape_cfg", type=str, default=None)
+    parser.add_argument(
+        "--pose2D_hrnet_weights",
+        "-W2D",
+        type=str,
+        default="./model_files/pose_hrnet_w48_384x288.pth",
+    )
+    parser.add_argument("--gpu", type=int, default=0)
+    parser.add_argument(
+        "--compile_edge_detector",
+        type=str,
+        default=None,
+        choices=["script", "compile"],
+        help="Compile the edge detector with TorchScript or torch.compile.",
+    )
+    parser.add_argument(
+        "--model_bundle",
+        type=str,
+        default=None,
+        help="Inference weight bundle written by pack_model_bundle.py, "
+        "replaces the weight and SMPL files.",
+    )
+    parser.add_argument(
+        "--proxy_rep_cache_mb",
+        type=int,
+        default=256,
+        help="Size budget of the in-memory cache of the object detector, HRNet and edge "
+        "detector outputs per image in MiB.",
+    )
+    args = parser.parse_args()
+
+    os.environ["CUDA_DEVICE_ORDER"] = "PCI_BUS_ID"  # see issue #152
+    os.environ["CUDA_VISIBLE_DEVICES"] = str(args.gpu)
+    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    print("\nDevice: {}".format(device))
+
+    PredictRequestHandler.service = PredictionService(
+        device=device,
+        pose2D_hrnet_weights_path=args.pose2D_hrnet_weights,
+        pose_shape_weights_template=args.pose_shape_weights_template,
+        pose_shape_cfg_path=args.pose_shape_cfg,
+        edge_detect_compile_mode=args.compile_edge_detector,
+        model_bundle_path=args.model_bundle,
+        proxy_rep_cache_bytes=args.proxy_rep_cache_mb * 2**20,
+    )
+
+    server = ThreadingHTTPServer((args.host, args.port), PredictRequestHandler)
+    print(f"\nServing predictions on {args.host}:{args.port}")
+    server.serve_forever()
@@ -147,18 +147,17 @@ def train_poseMF_shapeGaussian_net(pose_shape_model,
                                                  delta_z_range=pose_shape_cfg.TRAIN.SYNTH_DATA.AUGMENT.CAM.DELTA_Z_RANGE)
 
                     # Compute target vertices and joints
-                    target_smpl_output = smpl_model(body_pose=target_pose_rotmats,
-                                                    global_orient=target_glob_rotmats.unsqueeze(1),
-                                                    betas=target_shape,
-                                                    pose2rot=False)
+                    target_smpl_output = smpl_model.forward_cached(betas=target_shape,
+                                                                   body_pose=target_pose_rotmats,
+                                                                   global_orient=target_glob_rotmats.unsqueeze(1),
+                                                                   pose2rot=False)
                     target_vertices = target_smpl_output.vertices
                     target_joints_all = target_smpl_output.joints
                     target_joints_h36m = target_joints_all[:, ALL_JOINTS_TO_H36M_MAP, :]
                     target_joints_h36mlsp = target_joints_h36m[:, H36M_TO_J14, :]
 
-                    target_reposed_vertices = smpl_model(body_pose=torch.zeros_like(target_pose)[:, 3:],
-                                                         global_orient=torch.zeros_like(target_pose)[:, :3],
-                                                         betas=target_shape).vertices
+                    target_reposed_vertices = smpl_model.forward_cached(betas=target_shape,
+                                                                        return_joints=False).vertices
 
                     # ------------ INPUT PROXY REPRESENTATION GENERATION + 2D TARGET JOINTS ------------
                     # Pose targets were flipped such that they are right way up in 3D space - i.e. wrong way up when projected
@@ -284,9 +283,9 @@ def train_poseMF_shapeGaussian_net(pose_shape_model,
                                                                          pred_cam_wp)  # (bs, 17, 2)
 
                     with torch.no_grad():
-                        pred_reposed_smpl_output_mean = smpl_model(body_pose=torch.zeros_like(target_pose)[:, 3:],
-                                                                   global_orient=torch.zeros_like(target_pose)[:, :3],
-                                                                   betas=pred_shape_dist.loc)
+                        pred_reposed_smpl_output_mean = smpl_model.forward_cached(betas=pred_shape_dist.loc,
+                                                                                  return_joints=False,
+                                                                                  cache_shape=False)
                         pred_reposed_vertices_mean = pred_reposed_smpl_output_mean.vertices  # (bs, 6890, 3)
 
                     if 'samples' in criterion.loss_config.J2D_LOSS_ON:
@@ -391,7 +390,8 @@ def train_poseMF_shapeGaussian_net(pose_shape_model,
                          'best_epoch_val_metrics': best_epoch_val_metrics,
                          'model_state_dict': pose_shape_model.state_dict(),
                          'best_model_state_dict': best_model_wts,
-                         'optimiser_state_dict': optimiser.state_dict()}
+                         'optimiser_state_dict': optimiser.state_dict(),
+                         'analytic_svd': pose_shape_cfg.MODEL.ANALYTIC_SVD}
             torch.save(save_dict,
                        os.path.join(model_save_dir, 'epoch_{}'.format(str(epoch).zfill(3)) + '.tar'))
             print('Model saved! Best Val Metrics:\n',
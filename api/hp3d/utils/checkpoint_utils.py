@@ -26,8 +26,14 @@ def load_training_info_from_checkpoint(checkpoint, save_val_metrics):
     return current_epoch, best_epoch, best_model_wts, best_epoch_val_metrics
 
 
-
-
-
-
-
+def check_analytic_svd(pose_shape_cfg, trained_with_analytic_svd, weights_path):
+    """
+    MODEL.ANALYTIC_SVD gives the same singular values and mode rotations as torch.svd, but singular vectors of different
+    signs. The proper U and S of each joint are inputs to its children, so the poses predicted by weights trained with
+    torch.svd change (by up to ~0.3 in the rotation matrices of non-root joints). The flag is therefore only allowed with
+    weights trained with it, which is recorded under 'analytic_svd' in the checkpoints.
+    :param trained_with_analytic_svd: whether the weights were trained with MODEL.ANALYTIC_SVD
+    """
+    if pose_shape_cfg.MODEL.ANALYTIC_SVD and not trained_with_analytic_svd:
+        raise ValueError('MODEL.ANALYTIC_SVD is set, but the Distribution Predictor weights {} were trained with '
+                         'torch.svd and would predict different poses with it'.format(weights_path))
@@ -0,0 +1,198 @@
+import os
+import json
+import struct
+import numpy as np
+
+MESH_FORMATS = ('obj', 'ply', 'glb')
+
+# glTF 2.0 constants
+GLB_MAGIC = 0x46546C67  # 'glTF'
+GLB_CHUNK_JSON = 0x4E4F534A
+GLB_CHUNK_BIN = 0x004E4942
+GLTF_FLOAT = 5126
+GLTF_UNSIGNED_INT = 5125
+GLTF_ARRAY_BUFFER = 34962
+GLTF_ELEMENT_ARRAY_BUFFER = 34963
+GLTF_TRIANGLES = 4
+GLTF_POINTS = 0
+
+_mesh_writers = {}
+
+
+def compute_vertex_normals(vertices, faces):
+    """
+    Computes area-weighted per-vertex normals of a triangle mesh.
+    :param vertices: (num vertices, 3) numpy array of 3D vertices
+    :param faces: (num faces, 3) numpy array of vertex indices of each face.
+    :return: (num vertices, 3) numpy array of unit vertex normals.
+    """
+    triangles = vertices[faces]  # (num faces, 3, 3)
+    # Cross product magnitude is twice the face area, so larger faces contribute more
+    face_normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    # Sum the face normals of the first, second and third vertex of all faces, in that order
+    face_vertices = faces.T.ravel()
+    face_normals = np.tile(face_normals.astype(np.float64), (3, 1))
+    vertex_normals = np.stack([np.bincount(face_vertices, weights=face_normals[:, i], minlength=vertices.shape[0])
+                               for i in range(3)], axis=1)
+    norms = np.linalg.norm(vertex_normals, axis=1, keepdims=True)
+    return vertex_normals / np.maximum(norms, 1e-12)
+
+
+def get_mesh_writer(faces):
+    """
+    :param faces: (num faces, 3) numpy array, or None for a point cloud.
+    :return: the MeshWriter of the topology, created on first use.
+    """
+    key = None if faces is None else (faces.shape, faces.dtype.str, faces.tobytes())
+    if key not in _mesh_writers:
+        _mesh_writers[key] = MeshWriter(faces)
+    return _mesh_writers[key]
+
+
+class MeshWriter:
+    def __init__(self, faces):
+        """
+        Writes meshes of a fixed topology (e.g. SMPL) as OBJ, binary PLY or GLB. Everything which only depends on the
+        faces is encoded once here, and the vertices of each mesh are encoded in a single pass.
+        Use get_mesh_writer to share the writer of a topology.
+        :param faces: (num faces, 3) numpy array, each row contains ordered indices of vertices belonging to that face.
+        None for a point cloud.
+        """
+        self.faces = None if faces is None else np.asarray(faces, dtype=np.int64)
+        self.num_faces = 0 if faces is None else self.faces.shape[0]
+
+        if self.faces is not None:
+            obj_faces = (self.faces + 1).ravel().tolist()
+            self.obj_faces = (b'f %d %d %d\n' * self.num_faces) % tuple(obj_faces)
+            self.obj_faces_smooth = b's 1\n' + (b'f %d//%d %d//%d %d//%d\n' * self.num_faces) % tuple(
+                np.repeat(self.faces + 1, 2, axis=1).ravel().tolist())
+
+            ply_faces = np.empty(self.num_faces, dtype=[('num_vertices', 'u1'), ('vertex_indices', '<i4', (3,))])
+            ply_faces['num_vertices'] = 3
+            ply_faces['vertex_indices'] = self.faces
+            self.ply_faces = ply_faces.tobytes()
+
+            self.glb_indices = self.faces.astype('<u4').tobytes()
+        else:
+            self.obj_faces = self.obj_faces_smooth = self.ply_faces = self.glb_indices = b''
+
+    def encode_obj(self, vertices, smooth=False):
+        """
+        Same output as writing the mesh line by line with np.savetxt.
+        :param smooth: if True, writes per-vertex normals and the faces in a smoothing group, so the mesh is shaded
+        smooth without post-processing it in Blender.
+        """
+        num_vertices = vertices.shape[0]
+        data = [(b'v %f %f %f\n' * num_vertices) % tuple(vertices.ravel().tolist())]
+        if self.faces is not None and smooth:
+            normals = compute_vertex_normals(vertices, self.faces)
+            data.append((b'vn %.4f %.4f %.4f\n' * num_vertices) % tuple(normals.ravel().tolist()))
+            data.append(self.obj_faces_smooth)
+        else:
+            data.append(self.obj_faces)
+        return b''.join(data)
+
+    def encode_ply(self, vertices, smooth=False):
+        """
+        Binary little endian PLY with float32 vertices and, if smooth, vertex normals.
+        """
+        num_vertices = vertices.shape[0]
+        properties = ['x', 'y', 'z']
+        vertex_data = [vertices]
+        if self.faces is not None and smooth:
+            properties += ['nx', 'ny', 'nz']
+            vertex_data.append(compute_vertex_normals(vertices, self.faces))
+        header = ['ply', 'format binary_little_endian 1.0', 'element vertex {}'.format(num_vertices)]
+        header += ['property float {}'.format(name) for name in properties]
+        header += ['element face {}'.format(self.num_faces), 'property list uchar int vertex_indices', 'end_header']
+        vertex_data = np.concatenate(vertex_data, axis=1).astype('<f4')
+        return ('\n'.join(header) + '\n').encode('ascii') + vertex_data.tobytes() + self.ply_faces
+
+    def encode_glb(self, vertices, smooth=False):
+        """
+        Binary glTF 2.0 with a single mesh, float32 vertices, uint32 indices and, if smooth, vertex normals.
+        """
+        num_vertices = vertices.shape[0]
+        positions = np.ascontiguousarray(vertices, dtype='<f4')
+        buffer_views = []
+        accessors = []
+        binary_data = []
+
+        def add_accessor(data, target, accessor):
+            offset = sum(len(d) for d in binary_data)
+            buffer_views.append({'buffer': 0, 'byteOffset': offset, 'byteLength': len(data), 'target': target})
+            accessors.append(dict(accessor, bufferView=len(buffer_views) - 1))
+            binary_data.append(data)
+            return len(accessors) - 1
+
+        primitive = {'attributes': {}, 'mode': GLTF_TRIANGLES if self.faces is not None else GLTF_POINTS}
+        if self.faces is not None:
+            primitive['indices'] = add_accessor(self.glb_indices, GLTF_ELEMENT_ARRAY_BUFFER,
+                                                {'componentType': GLTF_UNSIGNED_INT,
+                                                 'count': self.num_faces * 3,
+                                                 'type': 'SCALAR'})
+        primitive['attributes']['POSITION'] = add_accessor(positions.tobytes(), GLTF_ARRAY_BUFFER,
+                                                           {'componentType': GLTF_FLOAT,
+                                                            'count': num_vertices,
+                                                            'type': 'VEC3',
+                                                            'min': positions.min(axis=0).tolist(),
+                                                            'max': positions.max(axis=0).tolist()})
+        if self.faces is not None and smooth:
+            normals = compute_vertex_normals(vertices, self.faces).astype('<f4')
+            primitive['attributes']['NORMAL'] = add_accessor(normals.tobytes(), GLTF_ARRAY_BUFFER,
+                                                             {'componentType': GLTF_FLOAT,
+                                                              'count': num_vertices,
+                                                              'type': 'VEC3'})
+        binary_data = b''.join(binary_data)  # All parts are multiples of 4 bytes long
+
+        gltf = {'asset': {'version': '2.0', 'generator': 'hp3d'},
+                'scene': 0,
+                'scenes': [{'nodes': [0]}],
+                'nodes': [{'mesh': 0}],
+                'meshes': [{'primitives': [primitive]}],
+                'buffers': [{'byteLength': len(binary_data)}],
+                'bufferViews': buffer_views,
+                'accessors': accessors}
+        json_data = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+        json_data += b' ' * (-len(json_data) % 4)  # Chunks are padded to 4 bytes
+
+        length = 12 + 8 + len(json_data) + 8 + len(binary_data)
+        return b''.join([struct.pack('<III', GLB_MAGIC, 2, length),
+                         struct.pack('<II', len(json_data), GLB_CHUNK_JSON), json_data,
+                         struct.pack('<II', len(binary_data), GLB_CHUNK_BIN), binary_data])
+
+    def encode(self, vertices, file_format='obj', smooth=False):
+        """
+        :param vertices: (num vertices, 3) numpy array of 3D vertices
+        :param file_format: one of MESH_FORMATS
+        :param smooth: write vertex normals, so the mesh is shaded smooth
+        :return: the encoded mesh as bytes, e.g. to upload it without a temporary file.
+        """
+        if file_format not in MESH_FORMATS:
+            raise ValueError('Unknown mesh format {}, expected one of {}'.format(file_format, MESH_FORMATS))
+        return getattr(self, 'encode_' + file_format)(vertices, smooth=smooth)
+
+    def write(self, out, vertices, file_format=None, smooth=False):
+        """
+        :param out: path, or binary file-like object such as io.BytesIO.
+        :param file_format: one of MESH_FORMATS, by default the extension of the path ('obj' for file-like objects).
+        :return: number of bytes written
+        """
+        is_path = isinstance(out, (str, os.PathLike))
+        if file_format is None:
+            file_format = os.path.splitext(os.fspath(out))[1][1:].lower() if is_path else 'obj'
+        data = self.encode(vertices, file_format=file_format, smooth=smooth)
+        if is_path:
+            with open(out, 'wb') as fp:
+                fp.write(data)
+        else:
+            out.write(data)
+        return len(data)
+
+
+def encode_mesh(vertices, faces, file_format='obj', smooth=False):
+    """
+    :return: the mesh encoded with the MeshWriter of the topology, see MeshWriter.encode.
+    """
+    return get_mesh_writer(faces).encode(vertices, file_format=file_format, smooth=smooth)
+
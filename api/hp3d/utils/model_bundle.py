@@ -0,0 +1,131 @@
+import pickle
+import hashlib
+import numpy as np
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+from smplx.utils import Struct
+
+BUNDLE_FORMAT = '1'
+SMPL_DATA_KEYS = ('v_template', 'shapedirs', 'posedirs', 'J_regressor', 'kintree_table', 'weights', 'f')
+SMPL_J_REGRESSOR_KEYS = ('J_regressor_extra', 'J_regressor_cocoplus', 'J_regressor_h36m')
+
+
+def load_smpl_data(smpl_path):
+    """
+    Reads the arrays of an SMPL model file which the SMPL model is built from.
+    :param smpl_path: path to a (chumpy-free) SMPL .pkl file
+    :return: dict of tensors, with float32 vertex data and int64 kinematic tree and faces
+    """
+    with open(smpl_path, 'rb') as smpl_file:
+        smpl_data = pickle.load(smpl_file, encoding='latin1')
+    tensors = {}
+    for key in SMPL_DATA_KEYS:
+        array = smpl_data[key]
+        if hasattr(array, 'toarray'):  # J_regressor is a scipy sparse matrix
+            array = array.toarray()
+        array = np.asarray(array)
+        dtype = torch.int64 if key in ('kintree_table', 'f') else torch.float32
+        tensors[key] = torch.as_tensor(array.astype(np.int64 if dtype == torch.int64 else np.float32))
+    return tensors
+
+
+def compute_bundle_version(tensors):
+    """
+    :param tensors: dict of tensors
+    :return: hash of the names, dtypes, shapes and contents of the tensors
+    """
+    sha256 = hashlib.sha256()
+    for key in sorted(tensors.keys()):
+        tensor = tensors[key].contiguous()
+        sha256.update('{}:{}:{}'.format(key, tensor.dtype, tuple(tensor.shape)).encode('utf-8'))
+        sha256.update(tensor.numpy().tobytes())
+    return sha256.hexdigest()[:16]
+
+
+def compute_files_version(file_paths):
+    """
+    Version hash of models loaded from separate files instead of a bundle.
+    :param file_paths: list of paths, e.g. of the weight files and config
+    :return: hash of the contents of the files, in the given order
+    """
+    sha256 = hashlib.sha256()
+    for file_path in file_paths:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(chunk)
+    return sha256.hexdigest()[:16]
+
+
+def save_model_bundle(bundle_path, tensors, metadata=None):
+    """
+    Writes inference tensors to a single safetensors file, together with their version hash.
+    :param tensors: dict of tensors, keys prefixed with the model they belong to, e.g. 'hrnet.'
+    :param metadata: dict of strings stored in the file header
+    :return: version hash of the bundle
+    """
+    # safetensors does not store tensors sharing memory
+    tensors = {key: tensor.detach().cpu().contiguous().clone() for key, tensor in tensors.items()}
+    version = compute_bundle_version(tensors)
+    metadata = dict(metadata or {}, format=BUNDLE_FORMAT, version=version)
+    save_file(tensors, bundle_path, metadata=metadata)
+    return version
+
+
+def build_from_state_dict(build_model, state_dict):
+    """
+    Builds a model on the meta device and assigns the tensors of the state dict to it, which skips the random
+    initialisation of weights that are overwritten anyway. Only for models whose tensors are all in their state dict.
+    :param build_model: function returning the model
+    """
+    with torch.device('meta'):
+        model = build_model()
+    model.load_state_dict(state_dict, assign=True)
+    return model
+
+
+class ModelBundle(object):
+    """
+    Inference weights of all hp3d models in a single safetensors file, written by pack_model_bundle.py.
+    The file is memory-mapped and a tensor is only read when a model is loaded from it, so a bundle with both genders
+    costs nothing for the gender not in use. Contains:
+        hrnet.*: HRNet state dict
+        detector.<name>.*: state dict of the torchvision person detector <name>
+        pose_shape.<gender>.*: distribution predictor state dict (without training state)
+        smpl.<gender>.*: SMPL model arrays, see load_smpl_data
+        smpl.J_regressor_extra/J_regressor_cocoplus/J_regressor_h36m: additional joint regressors
+    """
+    def __init__(self, bundle_path):
+        self.path = bundle_path
+        self.file = safe_open(bundle_path, framework='pt', device='cpu')
+        self.metadata = self.file.metadata() or {}
+        if self.metadata.get('format') != BUNDLE_FORMAT:
+            raise ValueError('Unsupported model bundle format {} in {}, expected {}'.format(self.metadata.get('format'),
+                                                                                            bundle_path,
+                                                                                            BUNDLE_FORMAT))
+        self.version = self.metadata['version']
+
+    def has(self, prefix):
+        return any(key.startswith(prefix + '.') for key in self.file.keys())
+
+    def state_dict(self, prefix):
+        """
+        :param prefix: model prefix, e.g. 'hrnet' or 'pose_shape.male'
+        :return: state dict of the model, without the prefix
+        """
+        if not self.has(prefix):
+            raise KeyError('No {} weights in model bundle {}, re-pack it with pack_model_bundle.py'.format(prefix, self.path))
+        return {key[len(prefix) + 1:]: self.file.get_tensor(key) for key in self.file.keys() if key.startswith(prefix + '.')}
+
+    def smpl_data_struct(self, gender):
+        """
+        :return: SMPL model data, to build the SMPL model with data_struct instead of reading the .pkl
+        """
+        smpl_data = self.state_dict('smpl.{}'.format(gender))
+        return Struct(**{key: smpl_data[key].numpy() for key in SMPL_DATA_KEYS})
+
+    def smpl_J_regressors(self):
+        """
+        :return: additional joint regressors of models.smpl_official.SMPL
+        """
+        return {key: self.file.get_tensor('smpl.' + key) for key in SMPL_J_REGRESSOR_KEYS}
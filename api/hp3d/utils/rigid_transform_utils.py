@@ -90,7 +90,7 @@ def rot6d_to_rotmat(x):
     a2 = x[:, :, 1]
     b1 = F.normalize(a1)  # Ensuring columns are unit vectors
     b2 = F.normalize(a2 - torch.einsum('bi,bi->b', b1, a2).unsqueeze(-1) * b1)  # Ensuring column 1 and column 2 are orthogonal with Gram-Schmidt orthogonalisation
-    b3 = torch.cross(b1, b2)
+    b3 = torch.cross(b1, b2, dim=1)
     return torch.stack((b1, b2, b3), dim=-1)
 
 
@@ -152,3 +152,130 @@ def quat_to_rotmat_numpy(quat):
                        2 * wz + 2 * xy, w2 - x2 + y2 - z2, 2 * yz - 2 * wx,
                        2 * xz - 2 * wy, 2 * wx + 2 * yz, w2 - x2 - y2 + z2], axis=1).reshape(B, 3, 3)
     return rotMat
+
+
+def _orthogonal_vector(w):
+    """
+    :param w: (B, 3) batch of unit vectors
+    :return: (B, 3) batch of unit vectors orthogonal to w
+    """
+    w0, w1, w2 = w[:, 0], w[:, 1], w[:, 2]
+    zeros = torch.zeros_like(w0)
+    use_w0 = (w0.abs() > w1.abs())[:, None]
+    u = torch.where(use_w0,
+                    torch.stack([-w2, zeros, w0], dim=1),
+                    torch.stack([zeros, w2, -w1], dim=1))
+    return F.normalize(u, dim=1)
+
+
+def _symmetric_3x3_eigenvector(A, eigenvalue):
+    """
+    Eigenvector of an eigenvalue with multiplicity 1, i.e. the largest cross product of the rows of A - eigenvalue * I.
+    :param A: (B, 3, 3) batch of symmetric matrices
+    :param eigenvalue: (B,)
+    :return: (B, 3) batch of unit eigenvectors
+    """
+    rows = A - eigenvalue[:, None, None] * torch.eye(3, dtype=A.dtype, device=A.device)
+    crosses = torch.stack([torch.cross(rows[:, 0], rows[:, 1], dim=1),
+                           torch.cross(rows[:, 0], rows[:, 2], dim=1),
+                           torch.cross(rows[:, 1], rows[:, 2], dim=1)], dim=1)  # (B, 3, 3)
+    squared_norms = (crosses ** 2).sum(dim=2)
+    largest = squared_norms.argmax(dim=1)
+    batch_idx = torch.arange(A.shape[0], device=A.device)
+    norm = squared_norms[batch_idx, largest].sqrt().clamp(min=torch.finfo(A.dtype).tiny)
+    return crosses[batch_idx, largest] / norm[:, None]
+
+
+def batch_symmetric_eig_3x3(A):
+    """
+    Closed-form eigendecomposition of a batch of symmetric 3x3 matrices, following
+    D. Eberly, "A Robust Eigensolver for 3x3 Symmetric Matrices".
+    The eigenvector of the most separated eigenvalue is found first, the second one in its orthogonal complement.
+    :param A: (B, 3, 3) batch of symmetric matrices
+    :return: eigenvalues (B, 3) in descending order and eigenvectors (B, 3, 3) in the columns of a rotation matrix.
+    """
+    # Scale to avoid overflow/underflow
+    scale = A.abs().amax(dim=(1, 2)).clamp(min=torch.finfo(A.dtype).tiny)
+    A = A / scale[:, None, None]
+    a00, a01, a02 = A[:, 0, 0], A[:, 0, 1], A[:, 0, 2]
+    a11, a12, a22 = A[:, 1, 1], A[:, 1, 2], A[:, 2, 2]
+
+    # Eigenvalues from the trigonometric solution of the characteristic polynomial of B = (A - q * I) / p
+    q = (a00 + a11 + a22) / 3.0
+    b00, b11, b22 = a00 - q, a11 - q, a22 - q
+    p = torch.sqrt(((b00 ** 2 + b11 ** 2 + b22 ** 2 + 2.0 * (a01 ** 2 + a02 ** 2 + a12 ** 2)) / 6.0).clamp(min=torch.finfo(A.dtype).tiny))
+    is_scaled_identity = p <= 8.0 * torch.finfo(A.dtype).eps
+    p = torch.where(is_scaled_identity, torch.ones_like(p), p)
+    det_B = (b00 * (b11 * b22 - a12 ** 2) - a01 * (a01 * b22 - a12 * a02) + a02 * (a01 * a12 - b11 * a02)) / p ** 3
+    half_det = (0.5 * det_B).clamp(-1.0 + 1e-12, 1.0 - 1e-12)  # Clamped away from +-1 to keep the gradient of acos finite
+    angle = torch.acos(half_det) / 3.0
+    beta2 = 2.0 * torch.cos(angle)
+    beta0 = 2.0 * torch.cos(angle + 2.0 * np.pi / 3.0)
+    beta1 = -(beta0 + beta2)
+    eigenvalues = q[:, None] + p[:, None] * torch.stack([beta2, beta1, beta0], dim=1)  # (B, 3) descending
+
+    # If half_det >= 0, the largest eigenvalue is the most separated one, otherwise the smallest
+    largest_first = (half_det >= 0.0)[:, None]
+    first = _symmetric_3x3_eigenvector(A, torch.where(largest_first[:, 0], eigenvalues[:, 0], eigenvalues[:, 2]))
+
+    # Middle eigenvector: null vector of (A - eigenvalue * I) restricted to the orthogonal complement (u, v) of first
+    u = _orthogonal_vector(first)
+    v = torch.cross(first, u, dim=1)
+    Au = torch.einsum('bij,bj->bi', A, u)
+    Av = torch.einsum('bij,bj->bi', A, v)
+    m00 = (u * Au).sum(dim=1) - eigenvalues[:, 1]
+    m01 = (u * Av).sum(dim=1)
+    m11 = (v * Av).sum(dim=1) - eigenvalues[:, 1]
+    use_row0 = m00.abs() >= m11.abs()
+    row_a = torch.where(use_row0, m00, m01)[:, None]
+    row_b = torch.where(use_row0, m01, m11)[:, None]
+    middle = row_b * u - row_a * v
+    middle_norm = middle.norm(dim=1, keepdim=True)
+    middle = torch.where(middle_norm > torch.finfo(A.dtype).eps,
+                         middle / middle_norm.clamp(min=torch.finfo(A.dtype).tiny),
+                         u)
+
+    eigenvectors = torch.where(largest_first[:, :, None],
+                               torch.stack([first, middle, torch.cross(first, middle, dim=1)], dim=2),
+                               torch.stack([torch.cross(middle, first, dim=1), middle, first], dim=2))
+    eigenvalues = eigenvalues * scale[:, None]
+
+    identity = torch.eye(3, dtype=A.dtype, device=A.device).expand_as(eigenvectors)
+    eigenvectors = torch.where(is_scaled_identity[:, None, None], identity, eigenvectors)
+    return eigenvalues, eigenvectors
+
+
+def batch_svd_3x3(M):
+    """
+    Closed-form SVD of a batch of 3x3 matrices, running on the device of the input without any host/device copies.
+    V and the singular values are given by the eigendecomposition of M^T M, U by a Gram-Schmidt orthogonalisation of MV.
+    Computed in double precision, as M^T M squares the condition number of M.
+    Returns the same as torch.svd (M = U diag(S) V^T, S in descending order), but the signs of the
+    singular vectors may differ from torch.svd.
+    :param M: (B, 3, 3) batch of matrices
+    :return: U (B, 3, 3), S (B, 3), V (B, 3, 3)
+    """
+    dtype = M.dtype
+    M = M.double()
+    eps = torch.finfo(M.dtype).eps
+    _, V = batch_symmetric_eig_3x3(torch.matmul(M.transpose(-1, -2), M))
+    MV = torch.matmul(M, V)  # (B, 3, 3), columns are S_i * U_i
+
+    S0 = MV[:, :, 0].norm(dim=1)
+    fallback = torch.zeros_like(MV[:, :, 0])
+    fallback[:, 0] = 1.0
+    U0 = torch.where((S0 > eps)[:, None], MV[:, :, 0] / S0.clamp(min=eps)[:, None], fallback)
+
+    U1 = MV[:, :, 1] - (U0 * MV[:, :, 1]).sum(dim=1, keepdim=True) * U0
+    S1 = U1.norm(dim=1)
+    U1 = torch.where((S1 > eps * S0.clamp(min=1.0))[:, None],
+                     U1 / S1.clamp(min=eps)[:, None],
+                     _orthogonal_vector(U0))
+
+    U2 = torch.cross(U0, U1, dim=1)
+    S2 = (U2 * MV[:, :, 2]).sum(dim=1)
+    U2 = torch.where((S2 < 0.0)[:, None], -U2, U2)
+
+    U = torch.stack([U0, U1, U2], dim=2)
+    S = torch.stack([S0, S1, S2.abs()], dim=1)
+    return U.to(dtype), S.to(dtype), V.to(dtype)
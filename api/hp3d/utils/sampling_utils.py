@@ -15,60 +15,83 @@ def bingham_sampling_for_matrix_fisher_torch(A,
                                              M_star=None,
                                              oversampling_ratio=8):
     """
-    Sampling from a Bingham distribution with 4x4 matrix parameter A.
+    Sampling from Bingham distributions with 4x4 matrix parameters A.
     Here we assume that A is a diagonal matrix (needed for matrix-Fisher sampling).
     Bing(A) is simulated by rejection sampling from ACG(I + 2A/b) (since ACG > Bingham everywhere).
-    Rejection sampling is batched + differentiable (using re-parameterisation trick).
+    Rejection sampling is batched over all distributions + differentiable (using re-parameterisation trick):
+    proposals for all distributions are drawn and accepted at once, and only the distributions with
+    less than num_samples accepted samples draw more proposals, until every distribution has num_samples samples.
+    Works on whatever device A is on.
 
     For further details, see: https://arxiv.org/pdf/1310.8110.pdf and
     https://github.com/tylee-fdcl/Matrix-Fisher-Distribution
 
-    :param A: (4,) tensor parameter of Bingham distribution on 3-sphere.
-        Represents the diagonal of a 4x4 diagonal matrix.
-    :param num_samples: scalar. Number of samples to draw.
-    :param Omega: (4,) Optional tensor parameter of ACG distribution on 3-sphere.
-    :param Gaussian_std: (4,) Optional tensor parameter (standard deviations) of diagonal Gaussian in R^4.
-    :param num_samples:
+    :param A: (..., 4) tensor parameters of Bingham distributions on 3-sphere.
+        Each represents the diagonal of a 4x4 diagonal matrix.
+    :param num_samples: scalar. Number of samples to draw from each distribution.
+    :param Omega: (..., 4) Optional tensor parameters of ACG distributions on 3-sphere.
+    :param Gaussian_std: (..., 4) Optional tensor parameters (standard deviations) of diagonal Gaussians in R^4.
     :param b: Hyperparameter for rejection sampling using envelope ACG distribution with
         Omega = I + 2A/b
-    :param oversampling_ratio: scalar. To make rejection sampling batched, we sample num_samples * oversampling_ratio,
-        then reject samples according to rejection criterion, and hopeffully the number of samples remaining is
-        > num_samples.
-    :return: samples: (num_samples, 4) and accept_ratio
+    :param oversampling_ratio: scalar. To make rejection sampling batched, we sample num_samples * oversampling_ratio
+        proposals per distribution, then reject samples according to rejection criterion, and hopefully the number of
+        samples remaining is > num_samples. Distributions that are still short draw oversampling_ratio times the number
+        of missing samples again.
+    :return: samples: (..., num_samples, 4) and accept_ratio: (...,) fraction of accepted proposals.
     """
-    assert A.shape == (4,)
+    assert A.shape[-1] == 4
     assert A.min() >= 0
+    batch_shape = A.shape[:-1]
+    device = A.device
 
     if Omega is None:
-        Omega = torch.ones(4, device=A.device) + 2*A/b  # Will sample from ACG(Omega) with Omega = I + 2A/b.
+        Omega = torch.ones_like(A) + 2*A/b  # Will sample from ACG(Omega) with Omega = I + 2A/b.
     if Gaussian_std is None:
         Gaussian_std = Omega ** (-0.5)  # Sigma^0.5 = (Omega^-1)^0.5 = Omega^-0.5
     if M_star is None:
         M_star = np.exp(-(4 - b) / 2) * ((4 / b) ** 2)  # Bound for rejection sampling: Bing(A) <= Mstar(b)ACG(I+2A/b)
 
-    samples_obtained = False
-    while not samples_obtained:
-        eps = torch.randn(num_samples * oversampling_ratio, 4, device=A.device).float()
-        y = Gaussian_std * eps
-        samples = y / torch.norm(y, dim=1, keepdim=True)  # (num_samples * oversampling_ratio, 4)
+    A = A.reshape(-1, 4)  # (num dists, 4)
+    Omega = Omega.reshape(-1, 4)
+    Gaussian_std = Gaussian_std.reshape(-1, 4)
+    num_dists = A.shape[0]
+
+    samples = torch.zeros(num_dists, num_samples, 4, device=device).float()
+    num_obtained = torch.zeros(num_dists, dtype=torch.long, device=device)
+    num_accepted = torch.zeros(num_dists, device=device)
+    num_proposed = torch.zeros(num_dists, device=device)
+    short_dists = torch.arange(num_dists, device=device)  # Distributions with less than num_samples accepted samples
+    num_proposals = num_samples * oversampling_ratio
+    while short_dists.shape[0] > 0:
+        eps = torch.randn(short_dists.shape[0], num_proposals, 4, device=device).float()
+        y = Gaussian_std[short_dists, None, :] * eps
+        proposals = y / torch.norm(y, dim=-1, keepdim=True)  # (num short dists, num proposals, 4)
 
         with torch.no_grad():
-            p_Bing_star = torch.exp(-torch.einsum('bn,n,bn->b', samples, A, samples))  # (num_samples * oversampling_ratio,)
-            p_ACG_star = torch.einsum('bn,n,bn->b', samples, Omega, samples) ** (-2)  # (num_samples * oversampling_ratio,)
+            p_Bing_star = torch.exp(-torch.einsum('dpn,dn,dpn->dp', proposals, A[short_dists], proposals))  # (num short dists, num proposals)
+            p_ACG_star = torch.einsum('dpn,dn,dpn->dp', proposals, Omega[short_dists], proposals) ** (-2)  # (num short dists, num proposals)
             # assert torch.all(p_Bing_star <= M_star * p_ACG_star + 1e-6)
 
-            w = torch.rand(num_samples * oversampling_ratio, device=A.device)
-            accept_vector = w < p_Bing_star / (M_star * p_ACG_star)  # (num_samples * oversampling_ratio,)
-            num_accepted = accept_vector.sum().item()
-        if num_accepted >= num_samples:
-            samples = samples[accept_vector, :]  # (num_accepted, 4)
-            samples = samples[:num_samples, :]  # (num_samples, 4)
-            samples_obtained = True
-            accept_ratio = num_accepted / num_samples * 4
-        else:
-            print('Failed sampling. {} samples accepted, {} samples required.'.format(num_accepted, num_samples))
+            w = torch.rand(short_dists.shape[0], num_proposals, device=device)
+            accept_mask = w < p_Bing_star / (M_star * p_ACG_star)  # (num short dists, num proposals)
+
+            # Accepted proposals fill the next free sample slots of their distribution, surplus ones are dropped
+            sample_idx = num_obtained[short_dists, None] + torch.cumsum(accept_mask, dim=1) - 1  # (num short dists, num proposals)
+            keep_mask = accept_mask & (sample_idx < num_samples)
+
+        dist_idx = short_dists[:, None].expand_as(keep_mask)
+        samples = samples.index_put((dist_idx[keep_mask], sample_idx[keep_mask]), proposals[keep_mask])
+
+        num_accepted[short_dists] += accept_mask.sum(dim=1)
+        num_proposed[short_dists] += num_proposals
+        num_obtained[short_dists] += keep_mask.sum(dim=1)
+        still_short = num_obtained[short_dists] < num_samples
+        short_dists = short_dists[still_short]
+        if short_dists.shape[0] > 0:
+            num_proposals = (num_samples - num_obtained[short_dists]).max().item() * oversampling_ratio
 
-    return samples, accept_ratio
+    accept_ratio = num_accepted / num_proposed
+    return samples.view(*batch_shape, num_samples, 4), accept_ratio.view(batch_shape)
 
 
 def pose_matrix_fisher_sampling_torch(pose_U,
@@ -102,7 +125,7 @@ def pose_matrix_fisher_sampling_torch(pose_U,
 
     # Proper SVD
     with torch.no_grad():
-        detU, detV = torch.det(pose_U.detach().cpu()).to(pose_U.device), torch.det(pose_V.detach().cpu()).to(pose_V.device)
+        detU, detV = torch.det(pose_U.detach()), torch.det(pose_V.detach())
     pose_U_proper = pose_U.clone()
     pose_S_proper = pose_S.clone()
     pose_V_proper = pose_V.clone()
@@ -124,19 +147,17 @@ def pose_matrix_fisher_sampling_torch(pose_U,
     Gaussian_std = Omega ** (-0.5)  # Sigma^0.5 = (Omega^-1)^0.5 = Omega^-0.5
     M_star = np.exp(-(4 - b) / 2) * ((4 / b) ** 2)  # Bound for rejection sampling: Bing(A) <= Mstar(b)ACG(I+2A/b)
 
-    pose_quat_samples_batch = torch.zeros(batch_size, num_samples, num_joints, 4, device=pose_U.device).float()
-    for i in range(batch_size):
-        for joint in range(num_joints):
-            quat_samples, accept_ratio = bingham_sampling_for_matrix_fisher_torch(A=bingham_A[i, joint, :],
-                                                                                  num_samples=num_samples,
-                                                                                  Omega=Omega[i, joint, :],
-                                                                                  Gaussian_std=Gaussian_std[i, joint, :],
-                                                                                  b=b,
-                                                                                  M_star=M_star,
-                                                                                  oversampling_ratio=oversampling_ratio)
-            pose_quat_samples_batch[i, :, joint, :] = quat_samples
-
-    pose_R_samples_batch = quat_to_rotmat(quat=pose_quat_samples_batch.view(-1, 4)).view(batch_size, num_samples, num_joints, 3, 3)
+    # Samples for all (batch, joint) distributions at once
+    pose_quat_samples_batch, accept_ratio = bingham_sampling_for_matrix_fisher_torch(A=bingham_A,
+                                                                                     num_samples=num_samples,
+                                                                                     Omega=Omega,
+                                                                                     Gaussian_std=Gaussian_std,
+                                                                                     b=b,
+                                                                                     M_star=M_star,
+                                                                                     oversampling_ratio=oversampling_ratio)  # (B, 23, num samples, 4)
+    pose_quat_samples_batch = pose_quat_samples_batch.transpose(1, 2).to(pose_U.device)  # (B, num samples, 23, 4)
+
+    pose_R_samples_batch = quat_to_rotmat(quat=pose_quat_samples_batch.reshape(-1, 4)).view(batch_size, num_samples, num_joints, 3, 3)
     pose_R_samples_batch = torch.matmul(pose_U_proper[:, None, :, :, :],
                                         torch.matmul(pose_R_samples_batch, pose_V_proper[:, None, :, :, :].transpose(dim0=-1, dim1=-2)))
 
@@ -176,13 +197,14 @@ def compute_vertex_uncertainties_by_poseMF_shapeGaussian_sampling(pose_U,
                                                             b=1.5,
                                                             oversampling_ratio=8)  # (1, num_samples, 23, 3, 3)
     if use_mean_shape:
-        shape_to_use = shape_distribution.loc.expand(num_samples, -1)  # (num_samples, num_shape_params)
+        shape_to_use = shape_distribution.loc  # (1, num_shape_params) - shaped template is shared by all pose samples
     else:
         shape_to_use = shape_distribution.sample([num_samples])[:, 0, :]  # (num_samples, num_shape_params) (batch_size = 1 is indexed out)
-    smpl_samples = smpl_model(body_pose=pose_sample_rotmats[0, :, :, :],
-                              global_orient=glob_rotmats.unsqueeze(1).expand(num_samples, -1, -1, -1),
-                              betas=shape_to_use,
-                              pose2rot=False)  # (num_samples, 6890, 3)
+    smpl_samples = smpl_model.forward_cached(betas=shape_to_use,
+                                             body_pose=pose_sample_rotmats[0, :, :, :],
+                                             global_orient=glob_rotmats.unsqueeze(1).expand(num_samples, -1, -1, -1),
+                                             pose2rot=False,
+                                             cache_shape=use_mean_shape)  # (num_samples, 6890, 3)
     vertices_samples = smpl_samples.vertices
     joints_samples = smpl_samples.joints
 
@@ -0,0 +1,44 @@
+import io
+import numpy as np
+
+SMPL_PARAMS_FNAME = 'params.npz'
+
+
+def encode_smpl_params(pose_rotmats, glob_rotmats, betas, betas_std, cam_wp, height, gender=None):
+    """
+    Encodes the predicted SMPL parameters of one image as compressed .npz, so meshes can be regenerated from them
+    without running the networks (see predict.regenerate_smpl_mesh).
+    :param pose_rotmats: (23, 3, 3) numpy array, body pose rotation matrices of the pose distribution mode.
+    :param glob_rotmats: (3, 3) numpy array, global orientation rotation matrix.
+    :param betas: (num betas,) numpy array, mean of the shape distribution.
+    :param betas_std: (num betas,) numpy array, standard deviation of the shape distribution.
+    :param cam_wp: (3,) numpy array, weak-perspective camera [s, tx, ty].
+    :param height: height in meters the predicted mesh was scaled to.
+    :param gender: gender of the SMPL model, or None if unknown.
+    :return: the .npz as bytes.
+    """
+    params = {'pose_rotmats': np.asarray(pose_rotmats, dtype=np.float32).reshape(23, 3, 3),
+              'glob_rotmats': np.asarray(glob_rotmats, dtype=np.float32).reshape(3, 3),
+              'betas': np.asarray(betas, dtype=np.float32).reshape(-1),
+              'betas_std': np.asarray(betas_std, dtype=np.float32).reshape(-1),
+              'cam_wp': np.asarray(cam_wp, dtype=np.float32).reshape(3),
+              'height': np.float64(height)}
+    if gender is not None:
+        params['gender'] = np.array(gender)
+    out = io.BytesIO()
+    np.savez_compressed(out, **params)
+    return out.getvalue()
+
+
+def load_smpl_params(source):
+    """
+    :param source: path, bytes or binary file-like object of a .npz written by encode_smpl_params.
+    :return: dict with the numpy arrays of encode_smpl_params, height as float and gender as str or None.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with np.load(source, allow_pickle=False) as npz:
+        params = {key: npz[key] for key in ('pose_rotmats', 'glob_rotmats', 'betas', 'betas_std', 'cam_wp')}
+        params['height'] = float(npz['height'])
+        params['gender'] = str(npz['gender']) if 'gender' in npz.files else None
+    return params
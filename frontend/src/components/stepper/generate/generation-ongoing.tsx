@@ -5,18 +5,32 @@ import {
 	CardFooter,
 	CardHeader,
 } from "@/components/ui/card";
+import useGenerationStore from "@/store/useGenerationStore";
+
+const stageLabels: Record<string, string> = {
+	queued: "Waiting in queue...",
+	predicting: "Predicting body shape and pose...",
+	uploading: "Preparing the 3D model...",
+};
 
 const GenerationOngoing = () => {
+	const { generationStage } = useGenerationStore();
+
 	return (
 		<div className="z-10 absolute inset-0 flex justify-center items-center bg-black/75">
 			<Card>
 				<CardHeader>
 					<h1 className="font-bold text-2xl text-center">Generation ongoing</h1>
 				</CardHeader>
-				<CardContent>
+				<CardContent className="flex flex-col items-center">
 					<span className="text-center">
 						This usually takes around 30 seconds.
 					</span>
+					{generationStage && stageLabels[generationStage] && (
+						<span className="text-center text-muted-foreground">
+							{stageLabels[generationStage]}
+						</span>
+					)}
 				</CardContent>
 				<CardFooter>
 					<div className="flex justify-center items-center w-full">
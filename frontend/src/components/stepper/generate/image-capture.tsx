@@ -21,11 +21,43 @@ import {
 import { generateSchema } from "@/schemas";
 import useImageStore from "@/store/useImageStore";
 import { CameraIcon, Info, Timer } from "lucide-react";
-import { useRef, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { UseFormReturn } from "react-hook-form";
 import Webcam from "react-webcam";
 import { z } from "zod";
 
+// Guide the person is framed in, [x1, y1, x2, y2] as fractions of the photo.
+// Sent as bounding box hint, so the person detection can be skipped.
+const GUIDE_BBOX = [0.3, 0.04, 0.7, 0.96];
+
+interface VideoFrameRect {
+	left: number;
+	top: number;
+	width: number;
+	height: number;
+}
+
+// Rectangle the video frame is drawn in, in pixels relative to the video's offset parent.
+// The video is letterboxed inside its element (object-scale-down, centered).
+const getVideoFrameRect = (video: HTMLVideoElement): VideoFrameRect | null => {
+	const { videoWidth, videoHeight, clientWidth, clientHeight } = video;
+	if (!videoWidth || !videoHeight) return null;
+
+	const scale = Math.min(
+		1,
+		clientWidth / videoWidth,
+		clientHeight / videoHeight,
+	);
+	const width = videoWidth * scale;
+	const height = videoHeight * scale;
+	return {
+		left: video.offsetLeft + (clientWidth - width) / 2,
+		top: video.offsetTop + (clientHeight - height) / 2,
+		width,
+		height,
+	};
+};
+
 interface ImageCaptureProps {
 	form: UseFormReturn<z.infer<typeof generateSchema>>;
 }
@@ -37,8 +69,31 @@ const ImageCapture = ({ form }: ImageCaptureProps) => {
 	const [isLoading, setIsLoading] = useState<boolean>(true);
 	const [timer, setTimer] = useState<number>(0);
 	const [countdown, setCountdown] = useState<number>(0);
+	const [videoFrameRect, setVideoFrameRect] = useState<VideoFrameRect | null>(
+		null,
+	);
 	const { setImage } = useImageStore();
 
+	// Keep the guide overlay on the drawn video frame, so it matches the bbox hint
+	useEffect(() => {
+		const video = webcamRef.current?.video;
+		if (isLoading || !video) return;
+
+		const updateVideoFrameRect = () =>
+			setVideoFrameRect(getVideoFrameRect(video));
+		updateVideoFrameRect();
+
+		const resizeObserver = new ResizeObserver(updateVideoFrameRect);
+		resizeObserver.observe(video);
+		video.addEventListener("loadedmetadata", updateVideoFrameRect);
+		video.addEventListener("resize", updateVideoFrameRect);
+		return () => {
+			resizeObserver.disconnect();
+			video.removeEventListener("loadedmetadata", updateVideoFrameRect);
+			video.removeEventListener("resize", updateVideoFrameRect);
+		};
+	}, [isLoading]);
+
 	// Functions
 	const handleUserMedia = () => {
 		setIsLoading(false);
@@ -81,6 +136,7 @@ const ImageCapture = ({ form }: ImageCaptureProps) => {
 
 				setImage(URL.createObjectURL(file));
 				form.setValue("image", file);
+				form.setValue("bbox", GUIDE_BBOX);
 				setCountdown(0);
 				setShowDialog(false);
 			}
@@ -121,6 +177,17 @@ const ImageCapture = ({ form }: ImageCaptureProps) => {
 					}}
 					onUserMedia={() => handleUserMedia()}
 				/>
+				{!isLoading && videoFrameRect && (
+					<div
+						className="absolute border-2 border-white/80 border-dashed rounded-md pointer-events-none"
+						style={{
+							left: videoFrameRect.left + GUIDE_BBOX[0] * videoFrameRect.width,
+							top: videoFrameRect.top + GUIDE_BBOX[1] * videoFrameRect.height,
+							width: (GUIDE_BBOX[2] - GUIDE_BBOX[0]) * videoFrameRect.width,
+							height: (GUIDE_BBOX[3] - GUIDE_BBOX[1]) * videoFrameRect.height,
+						}}
+					/>
+				)}
 				{countdown !== 0 && (
 					<span className="bottom-1/2 left-1/2 absolute drop-shadow-[0_1.2px_1.2px_rgba(0,0,0,0.8)] font-bold text-7xl text-white translate-y-1/2">
 						{countdown}
@@ -133,7 +200,7 @@ const ImageCapture = ({ form }: ImageCaptureProps) => {
 						</HoverCardTrigger>
 						<HoverCardContent>
 							<p className="font-bold">
-								Please ensure your entire body is visible in the photo.
+								Please stand inside the frame with your entire body visible.
 							</p>
 							<p>
 								For accurate generation, the image must include your full body
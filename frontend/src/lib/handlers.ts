@@ -110,6 +110,7 @@ export const handleImageUpload = (
 			}
 		};
 		form.setValue("image", file);
+		form.setValue("bbox", undefined);
 		reader.readAsDataURL(file);
 	}
 };
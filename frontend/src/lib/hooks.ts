@@ -1,3 +1,4 @@
+import { submitJob, waitForJob } from "@/lib/jobs";
 import { generateSchema, tryonSchema } from "@/schemas";
 import useErrorStore from "@/store/useErrorStore";
 import useFitObjStore from "@/store/useFitObjStore";
@@ -11,9 +12,9 @@ import { z } from "zod";
 
 export const useGenerateForm = () => {
 	const { gender, setGender, height, setHeight } = useFormStore();
-	const { setObj, setIsObjLoading } = useObjStore();
+	const { setObj, setAvatarId, setIsObjLoading } = useObjStore();
 	const { setFitObj } = useFitObjStore();
-	const { setIsGenerating } = useGenerationStore();
+	const { setIsGenerating, setGenerationStage } = useGenerationStore();
 	const { setGenerationError } = useErrorStore();
 
 	const form = useForm<z.infer<typeof generateSchema>>({
@@ -28,6 +29,7 @@ export const useGenerateForm = () => {
 	const onSubmit = async (values: z.infer<typeof generateSchema>) => {
 		try {
 			setObj(null);
+			setAvatarId(null);
 			setFitObj(null);
 			setGenerationError(null);
 
@@ -38,20 +40,35 @@ export const useGenerateForm = () => {
 			formData.append("image", values.image);
 			formData.append("gender", values.gender);
 			formData.append("height", String(values.height));
+			if (values.bbox) {
+				formData.append("bbox", values.bbox.join(","));
+			}
+			setGenerationStage(null);
 			setIsGenerating(true);
 			setIsObjLoading(true);
-			const response = await fetch("http://api.localhost/generate-3d-model", {
-				method: "POST",
-				body: formData,
-			});
-
-			if (!response.ok) {
-				throw new Error(`Error: ${response.status} - ${response.statusText}`);
+			const queuedJob = await submitJob("/generate-3d-model", formData);
+			const result = await waitForJob<{
+				obj: string;
+				avatar_id: string;
+				gender: "male" | "female";
+				height: number;
+				betas: number[];
+			}>(
+				queuedJob,
+				setGenerationStage
+			);
+
+			const objResponse = await fetch(result.obj);
+			if (!objResponse.ok) {
+				throw new Error(
+					`Error: ${objResponse.status} - ${objResponse.statusText}`
+				);
 			}
 
-			const obj = await response.text();
+			const obj = await objResponse.text();
 
 			setObj(obj);
+			setAvatarId(result.avatar_id);
 			setIsGenerating(false);
 			setIsObjLoading(false);
 		} catch (error) {
@@ -137,7 +154,7 @@ export const usePreviewFiles = () => {
 };
 
 export const useTryOnForm = () => {
-	const { obj } = useObjStore();
+	const { avatarId } = useObjStore();
 	const { setFitObj, setFitMtl, setIsFitObjLoading } = useFitObjStore();
 	const { gender, color } = useFormStore();
 	const { setTryOnError } = useErrorStore();
@@ -145,7 +162,7 @@ export const useTryOnForm = () => {
 	const form = useForm<z.infer<typeof tryonSchema>>({
 		resolver: zodResolver(tryonSchema),
 		defaultValues: {
-			obj: undefined,
+			avatarId: avatarId ?? undefined,
 			garment: undefined,
 			gender: gender,
 			size: "M",
@@ -155,15 +172,10 @@ export const useTryOnForm = () => {
 	});
 
 	useEffect(() => {
-		if (obj) {
-			const objBlob = new Blob([obj], { type: "application/octet-stream" });
-			const objFile = new File([objBlob], "model.obj", {
-				type: "application/octet-stream",
-			});
-
-			form.setValue("obj", objFile);
+		if (avatarId) {
+			form.setValue("avatarId", avatarId);
 		}
-	}, [obj, form]);
+	}, [avatarId, form]);
 
 	const onSubmit = async (values: z.infer<typeof tryonSchema>) => {
 		setFitObj(null);
@@ -171,22 +183,15 @@ export const useTryOnForm = () => {
 
 		try {
 			const formData = new FormData();
-			formData.append("obj", values.obj);
+			formData.append("avatar_id", values.avatarId);
 			formData.append("garment", values.garment);
 			formData.append("gender", values.gender);
 			formData.append("size", values.size);
 			formData.append("quality", String(values.quality));
 			formData.append("color", color);
 
-			const response = await fetch("http://api.localhost/try-on", {
-				method: "POST",
-				body: formData,
-			});
-
-			if (!response.ok)
-				throw new Error(`Error: ${response.status} - ${response.statusText}`);
-
-			const data = await response.json();
+			const queuedJob = await submitJob("/try-on", formData);
+			const data = await waitForJob<{ obj: string; mtl: string }>(queuedJob);
 			setFitObj(data.obj);
 			setFitMtl(data.mtl);
 		} catch (error) {
@@ -0,0 +1,65 @@
+const API_URL = "http://api.localhost";
+
+export interface Job<T> {
+	id: string;
+	kind: string;
+	status: "queued" | "running" | "done" | "failed";
+	stage: string;
+	result: T | null;
+	error: string | null;
+}
+
+interface QueuedJob {
+	job_id: string;
+	status: string;
+	status_url: string;
+	events_url: string;
+	result?: unknown;
+}
+
+export const submitJob = async (path: string, body: FormData) => {
+	const response = await fetch(`${API_URL}${path}`, {
+		method: "POST",
+		body: body,
+	});
+
+	if (!response.ok) {
+		throw new Error(`Error: ${response.status} - ${response.statusText}`);
+	}
+
+	return (await response.json()) as QueuedJob;
+};
+
+export const waitForJob = <T>(
+	queuedJob: QueuedJob,
+	onStage?: (stage: string) => void
+) =>
+	new Promise<T>((resolve, reject) => {
+		// Results served from a cache are returned as already finished jobs
+		if (queuedJob.status === "done") {
+			resolve(queuedJob.result as T);
+			return;
+		}
+
+		const events = new EventSource(`${API_URL}${queuedJob.events_url}`);
+
+		const handleJob = (event: MessageEvent) => {
+			const job = JSON.parse(event.data) as Job<T>;
+			onStage?.(job.stage);
+			if (job.status === "done") {
+				events.close();
+				resolve(job.result as T);
+			} else if (job.status === "failed") {
+				events.close();
+				reject(new Error(job.error ?? "Job failed"));
+			}
+		};
+
+		for (const status of ["queued", "running", "done", "failed"]) {
+			events.addEventListener(status, handleJob);
+		}
+		events.onerror = () => {
+			events.close();
+			reject(new Error("Lost connection to job events"));
+		};
+	});
@@ -16,19 +16,14 @@ export const generateSchema = z.object({
 			(file) => ACCEPTED_IMAGE_TYPES.includes(file?.type),
 			"Invalid image type. Only JPEG and PNG are accepted"
 		),
+	// Person bounding box [x1, y1, x2, y2] as fractions of the image size, set for captured photos
+	bbox: z.array(z.number().min(0).max(1)).length(4).optional(),
 });
 
 export const tryonSchema = z.object({
-	obj: z
-		.preprocess(
-			(val) => (val === undefined || val === null ? null : val),
-			z.instanceof(File).refine((file) => file.name.endsWith(".obj"), {
-				message: "Please upload a valid .obj file.",
-			})
-		)
-		.refine((val) => val !== null, {
-			message: "Please upload a file.",
-		}),
+	avatarId: z.string({
+		required_error: "Please generate a 3D model first.",
+	}),
 	garment: z.preprocess(
 		(val) => (val === undefined || val === null ? null : val),
 		z.enum(["t-shirt", "sweatshirt", "hoodie"], {
@@ -3,11 +3,15 @@ import { create } from "zustand";
 interface GenerationState {
 	isGenerating: boolean;
 	setIsGenerating: (isGenerating: boolean) => void;
+	generationStage: string | null;
+	setGenerationStage: (generationStage: string | null) => void;
 }
 
 const useGenerationStore = create<GenerationState>((set) => ({
 	isGenerating: false,
 	setIsGenerating: (isGenerating) => set({ isGenerating }),
+	generationStage: null,
+	setGenerationStage: (generationStage) => set({ generationStage }),
 }));
 
 export default useGenerationStore;
@@ -3,6 +3,8 @@ import { create } from "zustand";
 interface ObjState {
 	obj: string | null;
 	setObj: (obj: string | null) => void;
+	avatarId: string | null;
+	setAvatarId: (avatarId: string | null) => void;
 	isObjLoading: boolean;
 	setIsObjLoading: (isObjLoading: boolean) => void;
 }
@@ -10,6 +12,8 @@ interface ObjState {
 const useObjStore = create<ObjState>((set) => ({
 	obj: null,
 	setObj: (obj) => set({ obj }),
+	avatarId: null,
+	setAvatarId: (avatarId) => set({ avatarId }),
 	isObjLoading: false,
 	setIsObjLoading: (isObjLoading) => set({ isObjLoading }),
 }));